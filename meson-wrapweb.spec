@@ -38,6 +38,7 @@ mkdir -p %{buildroot}%{_sysconfdir}/nginx/conf.d/
 cp -a wrapweb/static %{buildroot}%{_datadir}/%{name}/
 install -Dpm 0644 files/wrapdb.cfg %{buildroot}%{_sysconfdir}/%{name}/wrapdb.cfg
 install -Dpm 0644 files/wrapdb.conf %{buildroot}%{_sysconfdir}/nginx/conf.d/%{name}.conf
+install -Dpm 0644 files/wrapdb-assets.conf %{buildroot}%{_sysconfdir}/nginx/%{name}-assets.conf
 install -Dpm 0644 files/wrapdb.ini %{buildroot}%{_sysconfdir}/uwsgi.d/%{name}.ini
 
 %files
@@ -48,10 +49,12 @@ install -Dpm 0644 files/wrapdb.ini %{buildroot}%{_sysconfdir}/uwsgi.d/%{name}.in
 %{python3_sitelib}/mesonwrap/
 %{python3_sitelib}/wrapweb/
 %{_datadir}/%{name}/
+%dir %attr(-,uwsgi,uwsgi) %{_sharedstatedir}/%{name}/
 %dir %{_sysconfdir}/%{name}/
 %config(noreplace) %{_sysconfdir}/%{name}/wrapdb.cfg
 %ghost %{_sysconfdir}/%{name}/wrapdb.key
 %config(noreplace) %{_sysconfdir}/nginx/conf.d/%{name}.conf
+%config(noreplace) %{_sysconfdir}/nginx/%{name}-assets.conf
 %config(noreplace) %attr(-,uwsgi,uwsgi)%{_sysconfdir}/uwsgi.d/%{name}.ini
 
 %changelog
@@ -0,0 +1,266 @@
+"""Content-addressed on-disk store of release assets.
+
+Blobs are stored once per sha256 digest and indexed by
+(project, branch, revision, label). The store is bounded by total size
+in bytes, least recently used blobs are evicted first. Blobs are served
+from memory-mapped files, so they do not occupy the Python heap and the
+page cache is shared by all processes.
+"""
+
+import collections.abc
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import time
+from typing import Hashable, Iterator, Optional, Tuple
+
+from mesonwrap import sqlitedb
+from mesonwrap import tempfile
+
+
+_log = logging.getLogger(__name__)
+INDEX_FILENAME = 'index.sqlite3'
+BLOBS_DIRNAME = 'blobs'
+CHUNK_SIZE = 64 * 1024
+BLOB_MODE = 0o644
+# Access time is persisted at most once per this many seconds per blob.
+ACCESS_RESOLUTION = 60
+_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS blobs (
+        digest TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        accessed REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed)',
+    '''CREATE TABLE IF NOT EXISTS refs (
+        project TEXT NOT NULL,
+        branch TEXT NOT NULL,
+        revision INTEGER NOT NULL,
+        label TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (project, branch, revision, label)
+    )''',
+    'CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest)',
+]
+
+AssetKey = Tuple[str, str, int, str]
+
+
+class Blob:
+    """Read-only bytes-like view of a stored file."""
+
+    def __init__(self, path: str, digest: str):
+        self.path = path
+        self.digest = digest
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b''  # empty files can not be mapped
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __bytes__(self) -> bytes:
+        return self._data[:]
+
+    def __getitem__(self, index):
+        return self._data[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Blob):
+            return self.digest == other.digest
+        return bytes(self) == other
+
+    def __iter__(self) -> 'BlobReader':
+        """Yields content in chunks, suitable for WSGI responses."""
+        return BlobReader(self._data)
+
+    def seekable(self) -> bool:
+        """Iterators seek, so ranges are read without preceding chunks."""
+        return True
+
+    def decode(self, *args, **kwargs) -> str:
+        return bytes(self).decode(*args, **kwargs)
+
+
+class BlobReader:
+    """Seekable iterator over chunks of blob content."""
+
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def __iter__(self) -> 'BlobReader':
+        return self
+
+    def __next__(self) -> bytes:
+        chunk = self._data[self._offset:self._offset + CHUNK_SIZE]
+        if not chunk:
+            raise StopIteration
+        self._offset += len(chunk)
+        return chunk
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._offset
+        elif whence == os.SEEK_END:
+            offset += len(self._data)
+        self._offset = max(offset, 0)
+        return self._offset
+
+    def tell(self) -> int:
+        return self._offset
+
+
+class BlobStore:
+
+    def __init__(self, directory: str, max_bytes: int, timer=time.time):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timer = timer
+        self._blobs = os.path.join(directory, BLOBS_DIRNAME)
+        self._index = os.path.join(directory, INDEX_FILENAME)
+        os.makedirs(self._blobs, exist_ok=True)
+        self._database = sqlitedb.Database(self._index, _SCHEMA)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        return self._database.connection
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self._blobs, digest[:2], digest)
+
+    def get(self, key: AssetKey) -> Optional[Blob]:
+        row = self._db.execute(
+            '''SELECT digest FROM refs WHERE project = ? AND branch = ?
+               AND revision = ? AND label = ?''', key).fetchone()
+        if row is None:
+            return None
+        digest, = row
+        try:
+            blob = Blob(self.path(digest), digest)
+        except FileNotFoundError:  # evicted concurrently
+            return None
+        now = self.timer()
+        self._db.execute(
+            'UPDATE blobs SET accessed = ? WHERE digest = ? AND accessed < ?',
+            (now, digest, now - ACCESS_RESOLUTION))
+        return blob
+
+    def put(self, key: AssetKey, data: bytes) -> Blob:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self._blobs,
+                                             delete=False) as f:
+                f.write(data)
+            # Readable by the front-end server sending blobs, see
+            # files/wrapdb-assets.conf.
+            os.chmod(f.name, BLOB_MODE)
+            os.replace(f.name, path)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                '''INSERT OR REPLACE INTO blobs (digest, size, accessed)
+                   VALUES (?, ?, ?)''', (digest, len(data), self.timer()))
+            db.execute(
+                '''INSERT OR REPLACE INTO refs
+                   (project, branch, revision, label, digest)
+                   VALUES (?, ?, ?, ?, ?)''', key + (digest,))
+            evicted = self._evict(db, keep=digest)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        for old in evicted:
+            try:
+                os.unlink(self.path(old))
+            except FileNotFoundError:
+                pass
+        return Blob(path, digest)
+
+    def _evict(self, db: sqlite3.Connection, keep: str) -> list:
+        total, = db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()
+        evicted = []
+        if total <= self.max_bytes:
+            return evicted
+        for digest, size in db.execute(
+                '''SELECT digest, size FROM blobs WHERE digest != ?
+                   ORDER BY accessed''', (keep,)).fetchall():
+            db.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+            db.execute('DELETE FROM refs WHERE digest = ?', (digest,))
+            evicted.append(digest)
+            total -= size
+            if total <= self.max_bytes:
+                break
+        return evicted
+
+    def size(self) -> int:
+        """Returns total size of stored blobs in bytes."""
+        total, = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()
+        return total
+
+    def mapping(self) -> 'BlobMapping':
+        return BlobMapping(self)
+
+
+class BlobMapping(collections.abc.MutableMapping):
+    """Mapping view of BlobStore, can be used in place of cachetools.Cache.
+
+    Keys are (project, branch, revision, label) tuples. Like
+    cachebackend.Backend it is thread-safe, and failures of the disk or
+    the index are logged and treated as misses and skipped stores.
+    """
+
+    thread_safe = True
+
+    def __init__(self, store: BlobStore):
+        self._store = store
+        self.maxsize = store.max_bytes
+
+    def __getitem__(self, key: Hashable) -> Blob:
+        try:
+            blob = self._store.get(tuple(key))
+        except (sqlite3.Error, OSError) as e:
+            _log.warning('blob store: get(%s) failed: %s', key, e)
+            raise KeyError(key) from e
+        if blob is None:
+            raise KeyError(key)
+        return blob
+
+    def __setitem__(self, key: Hashable, value: bytes) -> None:
+        try:
+            self._store.put(tuple(key), value)
+        except (sqlite3.Error, OSError) as e:
+            _log.warning('blob store: put(%s) failed: %s', key, e)
+
+    def __delitem__(self, key: Hashable) -> None:
+        cursor = self._store._db.execute(
+            '''DELETE FROM refs WHERE project = ? AND branch = ?
+               AND revision = ? AND label = ?''', tuple(key))
+        if not cursor.rowcount:
+            raise KeyError(key)
+
+    def _refs(self):
+        return self._store._db.execute(
+            'SELECT project, branch, revision, label FROM refs').fetchall()
+
+    def __iter__(self) -> Iterator[AssetKey]:
+        return iter(self._refs())
+
+    def __len__(self) -> int:
+        return len(self._refs())
+
+    def clear(self) -> None:
+        self._store._db.execute('DELETE FROM refs')
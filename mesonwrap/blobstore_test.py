@@ -0,0 +1,120 @@
+import os
+import unittest
+
+from mesonwrap import blobstore
+from mesonwrap import githubdb
+from mesonwrap import tempfile
+from mesonwrap import testing
+
+
+class BlobStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+        self.timer = testing.FakeTimer()
+
+    def store(self, max_bytes=100):
+        return blobstore.BlobStore(self._tmpdir.name, max_bytes=max_bytes,
+                                   timer=self.timer)
+
+    def test_put_get(self):
+        store = self.store()
+        store.put(('foo', '1.0', 1, 'patch.zip'), b'data')
+        blob = self.store().get(('foo', '1.0', 1, 'patch.zip'))
+        self.assertEqual(bytes(blob), b'data')
+        self.assertEqual(len(blob), 4)
+        self.assertEqual(blob, b'data')
+        self.assertIsNone(store.get(('foo', '1.0', 2, 'patch.zip')))
+
+    def test_readable_by_front_end(self):
+        umask = os.umask(0o077)  # stricter than any server's
+        try:
+            blob = self.store().put(('foo', '1.0', 1, 'patch.zip'), b'data')
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(blob.path).st_mode & 0o777, 0o644)
+
+    def test_empty(self):
+        store = self.store()
+        store.put(('foo', '1.0', 1, 'patch.zip'), b'')
+        self.assertEqual(bytes(store.get(('foo', '1.0', 1, 'patch.zip'))),
+                         b'')
+
+    def test_content_addressed(self):
+        store = self.store()
+        a = store.put(('foo', '1.0', 1, 'patch.zip'), b'data')
+        b = store.put(('bar', '1.0', 1, 'patch.zip'), b'data')
+        self.assertEqual(a.path, b.path)
+        self.assertEqual(store.size(), 4)
+
+    def test_chunks(self):
+        store = self.store(max_bytes=blobstore.CHUNK_SIZE * 3)
+        data = os.urandom(blobstore.CHUNK_SIZE * 2 + 1)
+        blob = store.put(('foo', '1.0', 1, 'patch.zip'), data)
+        chunks = list(blob)
+        self.assertEqual([len(chunk) for chunk in chunks],
+                         [blobstore.CHUNK_SIZE, blobstore.CHUNK_SIZE, 1])
+        self.assertEqual(b''.join(chunks), data)
+
+    def test_seek(self):
+        data = bytes(range(256)) * (blobstore.CHUNK_SIZE // 128)
+        blob = self.store(max_bytes=len(data)).put(
+            ('foo', '1.0', 1, 'patch.zip'), data)
+        self.assertTrue(blob.seekable())
+        reader = iter(blob)
+        reader.seek(blobstore.CHUNK_SIZE + 10)
+        self.assertEqual(next(reader), data[blobstore.CHUNK_SIZE + 10:])
+        self.assertEqual(reader.tell(), len(data))
+        with self.assertRaises(StopIteration):
+            next(reader)
+
+    def test_evict_lru(self):
+        store = self.store(max_bytes=10)
+        store.put(('a', '1', 1, 'l'), b'a' * 4)
+        self.timer.now += blobstore.ACCESS_RESOLUTION
+        store.put(('b', '1', 1, 'l'), b'b' * 4)
+        self.timer.now += blobstore.ACCESS_RESOLUTION
+        store.get(('a', '1', 1, 'l'))
+        self.timer.now += blobstore.ACCESS_RESOLUTION
+        c = store.put(('c', '1', 1, 'l'), b'c' * 4)
+        self.assertIsNotNone(store.get(('a', '1', 1, 'l')))
+        self.assertIsNone(store.get(('b', '1', 1, 'l')))
+        self.assertIsNotNone(store.get(('c', '1', 1, 'l')))
+        self.assertEqual(store.size(), 8)
+        self.assertEqual(len(os.listdir(os.path.dirname(c.path))), 1)
+
+    def test_mapping(self):
+        mapping = self.store().mapping()
+        mapping[('foo', '1.0', 1, 'patch.zip')] = b'data'
+        self.assertEqual(list(mapping), [('foo', '1.0', 1, 'patch.zip')])
+        self.assertEqual(mapping[('foo', '1.0', 1, 'patch.zip')], b'data')
+        del mapping[('foo', '1.0', 1, 'patch.zip')]
+        self.assertNotIn(('foo', '1.0', 1, 'patch.zip'), mapping)
+
+
+class GithubDBBlobStoreTest(testing.GithubTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+
+    def test_get_zip(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.downloads['https://dl/zip'] = b'zip contents'
+        githubdb.use_blob_store(
+            blobstore.BlobStore(self._tmpdir.name, max_bytes=100))
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'zip contents')
+        githubdb.use_blob_store(
+            blobstore.BlobStore(self._tmpdir.name, max_bytes=100))
+        blob = self.db.get_zip('foo', '1.0', 1)
+        self.assertIsInstance(blob, blobstore.Blob)
+        self.assertEqual(blob, b'zip contents')
+        self.assertEqual(len(self.requester.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
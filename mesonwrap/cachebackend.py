@@ -0,0 +1,406 @@
+"""Storage backends of caching.LockedCache.
+
+A backend is a mutable mapping which expires entries after ttl seconds and
+is bounded by the number of entries and, optionally, by the total size of
+the stored values in bytes. Values too large for the backend are rejected
+with ValueError, like cachetools caches do. Values are pickled once per
+store by backends keeping them out of process, in-process backends measure
+values other than bytes only if they are bounded in bytes.
+
+Backends are thread-safe, so caching.LockedCache accesses them without
+holding its lock. Failures of the storage, e.g. an unreachable memcached
+server or a locked SQLite database, are logged and counted: reads are
+answered as misses and failed writes are skipped, so that the caches
+degrade to fetching from GitHub.
+
+Backends:
+    memory: per-process, see MemoryBackend.
+    disk: SQLite database shared by all processes of a host,
+        see sharedcache.SharedMapping.
+    memcached: memcached server listening on a local socket,
+        see MemcachedBackend.
+"""
+
+import collections.abc
+import dataclasses
+import hashlib
+import logging
+import os
+import pickle
+import socket
+import threading
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+import cachetools
+
+
+MEMORY = 'memory'
+DISK = 'disk'
+MEMCACHED = 'memcached'
+KINDS = [MEMORY, DISK, MEMCACHED]
+
+_log = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class BackendStats:
+
+    gets: int = 0
+    misses: int = 0
+    sets: int = 0
+    deletes: int = 0
+    # Sizes of values read and written.
+    bytes_read: int = 0
+    bytes_written: int = 0
+    # Failed operations of the storage.
+    errors: int = 0
+
+
+def _len(value: Any) -> Optional[int]:
+    """Returns size of bytes-like value, None for values needing pickling."""
+    if (isinstance(value, (bytes, bytearray, memoryview)) or
+            hasattr(value, '__bytes__')):  # e.g. blobstore.Blob
+        return len(value)
+    return None
+
+
+def sizeof(value: Any) -> int:
+    """Returns size of value in bytes, as stored by out-of-process backends."""
+    size = _len(value)
+    if size is not None:
+        return size
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class Backend(collections.abc.MutableMapping):
+    """Cache storage, subclasses implement _get(), _set() and _delete()."""
+
+    thread_safe = True
+    # Storage failures handled as described in the module docstring.
+    errors: Tuple[type, ...] = ()
+    # Values are stored pickled, _set() receives them serialized.
+    pickled = False
+
+    def __init__(self, ttl: Optional[float] = None,
+                 maxsize: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.stats = BackendStats()
+        self._stats_lock = threading.Lock()
+
+    def _get(self, key: Hashable) -> Tuple[Any, int]:
+        """Returns (value, size), raises KeyError if missing or expired."""
+        raise NotImplementedError
+
+    def _set(self, key: Hashable, value: Any, data: Optional[bytes],
+             size: int) -> None:
+        """Stores value, data is the value pickled if the backend is."""
+        raise NotImplementedError
+
+    def _delete(self, key: Hashable) -> bool:
+        """Returns False if the key was missing."""
+        raise NotImplementedError
+
+    @property
+    def currsize(self) -> int:
+        """Returns size of stored values in bytes."""
+        raise NotImplementedError
+
+    def _failed(self, operation: str, key: Hashable,
+                error: BaseException) -> None:
+        _log.warning('%s: %s(%s) failed: %s', type(self).__name__,
+                     operation, key, error)
+        with self._stats_lock:
+            self.stats.errors += 1
+
+    def __getitem__(self, key: Hashable) -> Any:
+        try:
+            value, size = self._get(key)
+        except KeyError:
+            with self._stats_lock:
+                self.stats.gets += 1
+                self.stats.misses += 1
+            raise
+        except self.errors as e:
+            self._failed('get', key, e)
+            raise KeyError(key) from e
+        with self._stats_lock:
+            self.stats.gets += 1
+            self.stats.bytes_read += size
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        data = None
+        if self.pickled:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            size = _len(value)
+            if size is None:
+                size = len(data)  # same as sizeof()
+        elif self.max_bytes is not None:
+            size = sizeof(value)
+        else:
+            size = _len(value) or 0  # not measured, saves pickling
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise ValueError('value too large')
+        try:
+            self._set(key, value, data, size)
+        except self.errors as e:
+            self._failed('set', key, e)
+            return
+        with self._stats_lock:
+            self.stats.sets += 1
+            self.stats.bytes_written += size
+
+    def __delitem__(self, key: Hashable) -> None:
+        try:
+            deleted = self._delete(key)
+        except self.errors as e:
+            # The entry expires eventually, nothing else can be done.
+            self._failed('delete', key, e)
+            return
+        if not deleted:
+            raise KeyError(key)
+        with self._stats_lock:
+            self.stats.deletes += 1
+
+
+class MemoryBackend(Backend):
+    """Per-process LRU storage, expiring entries if ttl is set."""
+
+    def __init__(self, ttl: Optional[float] = None,
+                 maxsize: Optional[int] = None,
+                 max_bytes: Optional[int] = None):
+        super().__init__(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes)
+        self._lock = threading.Lock()
+        # Sizes are counted by cachetools if max_bytes is set,
+        # entries are bounded below.
+        limit = max_bytes if max_bytes is not None else maxsize
+        if limit is None:
+            limit = float('inf')
+        getsizeof = None
+        if max_bytes is not None:
+            getsizeof = self._sizeof
+        if ttl is not None:
+            self._cache = cachetools.TTLCache(maxsize=limit, ttl=ttl,
+                                              getsizeof=getsizeof)
+        else:
+            self._cache = cachetools.LRUCache(maxsize=limit,
+                                              getsizeof=getsizeof)
+
+    @staticmethod
+    def _sizeof(item: Tuple[Any, int]) -> int:
+        return item[1]
+
+    def _get(self, key: Hashable) -> Tuple[Any, int]:
+        with self._lock:
+            return self._cache[key]
+
+    def _set(self, key: Hashable, value: Any, data: Optional[bytes],
+             size: int) -> None:
+        with self._lock:
+            self._cache[key] = (value, size)
+            if self.maxsize is not None:
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem()
+
+    def _delete(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._cache.pop(key, None) is not None
+
+    @property
+    def currsize(self) -> int:
+        with self._lock:
+            return sum(size for _, size in self._cache.values())
+
+    def __iter__(self) -> Iterator[Hashable]:
+        with self._lock:
+            return iter(list(self._cache))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cache)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+class MemcachedError(OSError):
+    pass
+
+
+class MemcachedBackend(Backend):
+    """Storage in a memcached server, usually on a local socket.
+
+    Keys are hashed and prefixed with the cache name, values are pickled.
+    Memcached can not enumerate keys, so iteration is not supported and
+    clear() flushes the whole server. Use a server dedicated to wrapweb.
+    """
+
+    # Memcached interprets larger expiration times as Unix timestamps.
+    MAX_RELATIVE_TTL = 30 * 24 * 60 * 60
+    # MemcachedError and socket errors are OSError.
+    errors = (OSError, pickle.UnpicklingError, EOFError)
+    pickled = True
+
+    def __init__(self, address: str, name: str,
+                 ttl: Optional[float] = None,
+                 maxsize: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 timeout: float = 1.0):
+        """Creates backend.
+
+        Args:
+            address: path of Unix socket or host:port.
+        """
+        super().__init__(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes)
+        if ttl is not None and ttl > self.MAX_RELATIVE_TTL:
+            raise ValueError('ttl is too long for memcached', ttl)
+        self.address = address
+        self.name = name
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        if '/' in self.address:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+        else:
+            host, port = self.address.rsplit(':', 1)
+            sock = socket.create_connection((host, int(port)),
+                                            timeout=self.timeout)
+        return sock
+
+    @property
+    def _connection(self):
+        """Returns (socket, reader) owned by current thread and process."""
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            sock = self._connect()
+            self._local.connection = (sock, sock.makefile('rb'))
+            self._local.pid = pid
+        return self._local.connection
+
+    def _disconnect(self) -> None:
+        if getattr(self._local, 'pid', None) == os.getpid():
+            sock, reader = self._local.connection
+            reader.close()
+            sock.close()
+        self._local.pid = None
+
+    def _command(self, command: bytes, data: Optional[bytes] = None,
+                 reply=None):
+        """Sends command, returns reply(reader), first line by default."""
+        sock, reader = self._connection
+        request = command + b'\r\n'
+        if data is not None:
+            request += data + b'\r\n'
+        try:
+            sock.sendall(request)
+            if reply is None:
+                return self._line(reader)
+            return reply(reader)
+        except BaseException:
+            self._disconnect()  # the stream is out of sync
+            raise
+
+    @staticmethod
+    def _line(reader) -> bytes:
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise MemcachedError('Connection closed')
+        return line[:-2]
+
+    def _key(self, key: Hashable) -> bytes:
+        if isinstance(key, tuple):
+            key = tuple(key)  # drop cachetools hashkey type
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return f'wrapweb:{self.name}:{digest}'.encode('ascii')
+
+    def _read_value(self, reader) -> Optional[bytes]:
+        line = self._line(reader)
+        if line == b'END':
+            return None
+        if not line.startswith(b'VALUE '):
+            raise MemcachedError(line.decode('utf-8', 'replace'))
+        size = int(line.split()[3])
+        data = reader.read(size + 2)[:-2]
+        if self._line(reader) != b'END':
+            raise MemcachedError('Unexpected reply')
+        return data
+
+    def _get(self, key: Hashable) -> Tuple[Any, int]:
+        data = self._command(b'get ' + self._key(key),
+                             reply=self._read_value)
+        if data is None:
+            raise KeyError(key)
+        return pickle.loads(data), len(data)
+
+    def _set(self, key: Hashable, value: Any, data: Optional[bytes],
+             size: int) -> None:
+        exptime = int(-(-self.ttl // 1)) if self.ttl is not None else 0
+        reply = self._command(
+            b'set %s 0 %d %d' % (self._key(key), exptime, len(data)), data)
+        if reply == b'STORED':
+            return
+        if b'too large' in reply:
+            raise ValueError('value too large')
+        raise MemcachedError(reply.decode('utf-8', 'replace'))
+
+    def _delete(self, key: Hashable) -> bool:
+        reply = self._command(b'delete ' + self._key(key))
+        if reply not in (b'DELETED', b'NOT_FOUND'):
+            raise MemcachedError(reply.decode('utf-8', 'replace'))
+        return reply == b'DELETED'
+
+    def _stats(self, reader) -> dict:
+        stats = dict()
+        while True:
+            line = self._line(reader)
+            if line == b'END':
+                return stats
+            _, name, value = line.decode('utf-8').split(' ', 2)
+            stats[name] = value
+
+    @property
+    def currsize(self) -> int:
+        """Returns size of all values stored by the server."""
+        return int(self._command(b'stats', reply=self._stats)['bytes'])
+
+    def __iter__(self) -> Iterator[Hashable]:
+        raise TypeError('memcached keys can not be enumerated')
+
+    def __len__(self) -> int:
+        raise TypeError('memcached keys can not be counted')
+
+    def clear(self) -> None:
+        reply = self._command(b'flush_all')
+        if reply != b'OK':
+            raise MemcachedError(reply.decode('utf-8', 'replace'))
+
+
+def create(kind: str, name: str, ttl: Optional[float] = None,
+           maxsize: Optional[int] = None, max_bytes: Optional[int] = None,
+           shared=None, memcached_address: Optional[str] = None) -> Backend:
+    """Creates backend of the given kind.
+
+    Args:
+        shared: sharedcache.SharedCache, required by disk backend.
+        memcached_address: required by memcached backend.
+    """
+    if kind == MEMORY:
+        return MemoryBackend(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes)
+    if kind == DISK:
+        if shared is None:
+            raise ValueError('disk cache backend requires CACHE_DIR')
+        return shared.mapping(name, ttl=ttl, maxsize=maxsize,
+                              max_bytes=max_bytes)
+    if kind == MEMCACHED:
+        if not memcached_address:
+            raise ValueError('memcached cache backend requires an address')
+        return MemcachedBackend(memcached_address, name, ttl=ttl,
+                                maxsize=maxsize, max_bytes=max_bytes)
+    raise ValueError('Unknown cache backend', kind)
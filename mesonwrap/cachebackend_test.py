@@ -0,0 +1,227 @@
+import os
+import socketserver
+import sqlite3
+import threading
+import unittest
+from unittest import mock
+
+from mesonwrap import cachebackend
+from mesonwrap import sharedcache
+from mesonwrap import tempfile
+
+
+class FakeMemcached(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """Subset of memcached text protocol used by MemcachedBackend."""
+
+    daemon_threads = True
+    ITEM_SIZE_MAX = 1024
+
+    def __init__(self, path):
+        self.items = dict()
+        super().__init__(path, _MemcachedHandler)
+
+
+class _MemcachedHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        items = self.server.items
+        for line in self.rfile:
+            command, *args = line.split()
+            if command == b'get':
+                if args[0] in items:
+                    data = items[args[0]]
+                    self.wfile.write(b'VALUE %s 0 %d\r\n%s\r\n' % (
+                        args[0], len(data), data))
+                self.wfile.write(b'END\r\n')
+            elif command == b'set':
+                data = self.rfile.read(int(args[3]) + 2)[:-2]
+                if len(data) > self.server.ITEM_SIZE_MAX:
+                    self.wfile.write(
+                        b'SERVER_ERROR object too large for cache\r\n')
+                    continue
+                items[args[0]] = data
+                self.wfile.write(b'STORED\r\n')
+            elif command == b'delete':
+                found = items.pop(args[0], None) is not None
+                self.wfile.write(b'DELETED\r\n' if found
+                                 else b'NOT_FOUND\r\n')
+            elif command == b'flush_all':
+                items.clear()
+                self.wfile.write(b'OK\r\n')
+            elif command == b'stats':
+                size = sum(len(data) for data in items.values())
+                self.wfile.write(b'STAT bytes %d\r\nEND\r\n' % size)
+            else:
+                self.wfile.write(b'ERROR\r\n')
+
+
+class BackendTestMixin:
+
+    def backend(self, **kwargs) -> cachebackend.Backend:
+        raise NotImplementedError
+
+    def test_get_set_delete(self):
+        backend = self.backend()
+        backend[('foo', 1)] = [1, 2]
+        self.assertEqual(backend[('foo', 1)], [1, 2])
+        self.assertIsNone(backend.get('bar'))
+        del backend[('foo', 1)]
+        self.assertNotIn(('foo', 1), backend)
+        with self.assertRaises(KeyError):
+            del backend[('foo', 1)]
+        self.assertEqual(backend.stats.sets, 1)
+        self.assertEqual(backend.stats.deletes, 1)
+        self.assertEqual(backend.stats.gets, 3)
+        self.assertEqual(backend.stats.misses, 2)
+
+    def test_too_large(self):
+        backend = self.backend(max_bytes=100)
+        with self.assertRaises(ValueError):
+            backend['foo'] = b'x' * 101
+        backend['foo'] = b'x' * 100
+        self.assertEqual(backend.stats.bytes_written, 100)
+
+    def test_currsize(self):
+        backend = self.backend()
+        backend['foo'] = 'value'
+        self.assertGreater(backend.currsize, 0)
+
+    def test_pickled_once(self):
+        backend = self.backend(max_bytes=1000)
+        with mock.patch.object(cachebackend.pickle, 'dumps',
+                               wraps=cachebackend.pickle.dumps) as dumps:
+            backend['foo'] = 'value'
+        dumps.assert_called_once()
+        self.assertEqual(backend['foo'], 'value')
+
+
+class MemoryBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def backend(self, **kwargs):
+        return cachebackend.MemoryBackend(**kwargs)
+
+    def test_currsize(self):
+        backend = self.backend()
+        backend['foo'] = b'value'
+        backend['bar'] = 'value'  # not measured without max_bytes
+        self.assertEqual(backend.currsize, 5)
+        backend = self.backend(max_bytes=100)
+        backend['bar'] = 'value'
+        self.assertEqual(backend.currsize, cachebackend.sizeof('value'))
+
+    def test_pickled_once(self):
+        with mock.patch.object(cachebackend.pickle, 'dumps') as dumps:
+            self.backend()['foo'] = 'value'
+        dumps.assert_not_called()
+
+    def test_max_bytes(self):
+        backend = self.backend(max_bytes=200)
+        backend['a'] = b'a' * 100
+        backend['b'] = b'b' * 100
+        backend['c'] = b'c' * 100
+        self.assertEqual(sorted(backend), ['b', 'c'])
+        self.assertEqual(backend.currsize, 200)
+
+    def test_maxsize(self):
+        backend = self.backend(maxsize=2, max_bytes=1000)
+        for key in 'abc':
+            backend[key] = b'x'
+        self.assertEqual(sorted(backend), ['b', 'c'])
+
+
+class DiskBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+
+    def backend(self, **kwargs):
+        return cachebackend.create(
+            cachebackend.DISK, 'test',
+            shared=sharedcache.SharedCache(self._tmpdir.name), **kwargs)
+
+    def test_max_bytes(self):
+        backend = self.backend(max_bytes=500)
+        for key in 'abc':
+            backend[key] = b'x' * 200
+        self.assertEqual(sorted(backend), ['b', 'c'])
+        self.assertLessEqual(backend.currsize, 500)
+
+    def test_broken(self):
+        backend = self.backend()
+        backend['foo'] = 1
+        with sqlite3.connect(backend._store.path) as other:
+            other.execute('DROP TABLE entries')
+        other.close()
+        backend._memo.clear()
+        with self.assertLogs(cachebackend.__name__, 'WARNING'):
+            self.assertNotIn('foo', backend)  # miss
+            backend['bar'] = 2  # skipped
+        self.assertEqual(backend.stats.errors, 2)
+
+
+class MemcachedBackendTest(BackendTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+        self.address = os.path.join(self._tmpdir.name, 'memcached.sock')
+        self.server = FakeMemcached(self.address)
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  kwargs=dict(poll_interval=0.01),
+                                  daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def backend(self, **kwargs):
+        return cachebackend.create(cachebackend.MEMCACHED, 'test',
+                                   memcached_address=self.address, **kwargs)
+
+    def test_shared(self):
+        a = self.backend()
+        b = self.backend()
+        a['foo'] = 1
+        self.assertEqual(b['foo'], 1)
+        self.assertNotIn('foo', cachebackend.create(
+            cachebackend.MEMCACHED, 'other', memcached_address=self.address))
+
+    def test_server_too_large(self):
+        backend = self.backend()
+        with self.assertRaises(ValueError):
+            backend['foo'] = b'x' * 2000
+        backend['bar'] = 1  # connection is still usable
+        self.assertEqual(backend['bar'], 1)
+
+    def test_clear(self):
+        backend = self.backend()
+        backend['foo'] = 1
+        backend.clear()
+        self.assertNotIn('foo', backend)
+
+    def test_outage(self):
+        backend = cachebackend.create(
+            cachebackend.MEMCACHED, 'test',
+            memcached_address=os.path.join(self._tmpdir.name, 'down.sock'))
+        with self.assertLogs(cachebackend.__name__, 'WARNING'):
+            backend['foo'] = 1  # skipped
+            self.assertNotIn('foo', backend)
+            del backend['foo']
+        self.assertEqual(backend.stats.errors, 3)
+        self.assertEqual(backend.stats.sets, 0)
+
+
+class CreateTest(unittest.TestCase):
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            cachebackend.create('tape', 'test')
+
+    def test_disk_requires_directory(self):
+        with self.assertRaises(ValueError):
+            cachebackend.create(cachebackend.DISK, 'test')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,545 @@
+import concurrent.futures
+import contextlib
+import dataclasses
+import functools
+import logging
+import os
+import threading
+import time
+from typing import (Any, Callable, Hashable, Iterable, List, MutableMapping,
+                    Optional, Tuple)
+
+import cachetools
+
+
+_log = logging.getLogger(__name__)
+# Expired values are never served later than this many seconds after
+# their expiration, neither by background refreshes nor as fallbacks.
+MAX_STALE = 60 * 60
+# Replaced by tests.
+_timer = time.monotonic
+_MISSING = object()
+
+
+def guard(cache: MutableMapping, lock: threading.Lock):
+    """Returns context for accessing cache, never entered with lock held.
+
+    Thread-safe storage, e.g. cachebackend.Backend, is accessed without
+    the lock so that its network or disk I/O does not block other keys.
+    """
+    if getattr(cache, 'thread_safe', False):
+        return contextlib.nullcontext()
+    return lock
+
+
+@dataclasses.dataclass
+class CacheStats:
+
+    hits: int = 0
+    # GitHub confirmed the expired value with 304 Not Modified.
+    revalidations: int = 0
+    # The value was downloaded in full.
+    refetches: int = 0
+    # Expired value was served while being refreshed in background.
+    stale: int = 0
+    # Values recomputed by Refresher.
+    refreshes: int = 0
+    # Concurrent misses which waited for the computation of another caller.
+    coalesced: int = 0
+    # Last known value was served because computation failed.
+    fallbacks: int = 0
+    # Not found outcomes remembered by NegativeCache.
+    negatives: int = 0
+
+
+@dataclasses.dataclass
+class _Tracked:
+    """Refreshable entry, outlives its cache entry."""
+
+    call: Callable[[], Any]
+    accessed: float
+    stored: float
+    value: Any
+
+
+class _Flight:
+    """Computation of a value shared by concurrent callers."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error: Optional[BaseException] = None
+
+    def set_result(self, value: Any) -> None:
+        self._value = value
+        self._done.set()
+
+    def set_error(self, error: BaseException) -> None:
+        self._error = error
+        self._done.set()
+
+    def result(self) -> Any:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class LockedCache:
+
+    def __init__(self, name: str, cache: MutableMapping,
+                 refreshable: bool = False,
+                 fallback: Callable[[BaseException], bool] = None,
+                 is_missing: Callable[[BaseException], bool] = None,
+                 max_stale: float = MAX_STALE):
+        """Creates cache.
+
+        Args:
+            refreshable: entries are refreshed by Refresher.
+            fallback: errors for which the last known value is served,
+                only for refreshable caches.
+            is_missing: errors meaning the object does not exist anymore,
+                its last known value is forgotten.
+            max_stale: seconds after expiration the last known value may
+                still be served.
+        """
+        self.name = name
+        self.lock = threading.Lock()
+        self.cache = cache
+        self.stats = CacheStats()
+        self.refreshable = refreshable
+        self.fallback = fallback
+        self.is_missing = is_missing
+        self.max_stale = max_stale
+        # key -> _Tracked, only for refreshable caches
+        self._tracked = cachetools.LRUCache(maxsize=cache.maxsize)
+        # key -> _Flight, misses being computed
+        self._inflight = dict()
+        # Incremented whenever a stored value changes.
+        self.version = 0
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return getattr(self.cache, 'ttl', None)
+
+    def use(self, cache: MutableMapping) -> None:
+        """Replaces underlying storage, entries are not migrated."""
+        with self.lock:
+            self.cache = cache
+
+    def _servable(self, tracked: _Tracked) -> bool:
+        """Returns True if the last known value may be served."""
+        if self.ttl is None:
+            return True
+        return _timer() - tracked.stored <= self.ttl + self.max_stale
+
+    def _forget(self, key: Hashable, error: BaseException) -> bool:
+        """Forgets entry if error means it does not exist anymore."""
+        if self.is_missing is None or not self.is_missing(error):
+            return False
+        cache = self.cache
+        with guard(cache, self.lock):
+            cache.pop(key, None)
+        with self.lock:
+            if self._tracked.pop(key, None) is not None:
+                self.version += 1
+        return True
+
+    def _seen(self, tracked: _Tracked, value: Any) -> None:
+        """Notices value stored by another process, called locked."""
+        if tracked.value != value:
+            tracked.value = value
+            self.version += 1
+
+    def _store(self, key: Hashable, value: Any,
+               call: Callable[[], Any], requested: bool = True) -> None:
+        cache = self.cache
+        with guard(cache, self.lock):
+            try:
+                cache[key] = value
+            except ValueError:
+                pass  # value too large
+        with self.lock:
+            tracked = self._tracked.get(key)
+            if tracked is None or tracked.value != value:
+                self.version += 1
+            if self.refreshable:
+                now = _timer()
+                if tracked is not None:
+                    accessed = tracked.accessed
+                elif requested:
+                    accessed = now
+                else:
+                    accessed = float('-inf')
+                self._tracked[key] = _Tracked(
+                    call=call, accessed=accessed, stored=now, value=value)
+
+    def __call__(self, key=cachetools.keys.hashkey):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                k = key(*args, **kwargs)
+                call = functools.partial(func, *args, **kwargs)
+                leader = False
+                with self.lock:
+                    tracked = self._tracked.get(k)
+                    if tracked is not None:
+                        tracked.accessed = _timer()
+                        tracked.call = call
+                    cache = self.cache
+                with guard(cache, self.lock):
+                    value = cache.get(k, _MISSING)
+                with self.lock:
+                    if value is not _MISSING:
+                        self.stats.hits += 1
+                        if tracked is not None and tracked.value is not value:
+                            self._seen(tracked, value)
+                        return value
+                    refresher = _refresher
+                    if (tracked is not None and refresher is not None and
+                            self._servable(tracked)):
+                        self.stats.stale += 1
+                        refresher.schedule(self, k)
+                        return tracked.value
+                    flight = self._inflight.get(k)
+                    if flight is not None:
+                        self.stats.coalesced += 1
+                    else:
+                        flight = self._inflight[k] = _Flight()
+                        leader = True
+                if not leader:
+                    return flight.result()
+                try:
+                    try:
+                        value = call()
+                        self._store(k, value, call)
+                    except BaseException as e:
+                        self._forget(k, e)
+                        if (tracked is None or self.fallback is None or
+                                not self.fallback(e) or
+                                not self._servable(tracked)):
+                            flight.set_error(e)
+                            raise
+                        _log.warning('%s: serving last known value of %s: %s',
+                                     self.name, k, e)
+                        value = tracked.value
+                        with self.lock:
+                            self.stats.fallbacks += 1
+                    flight.set_result(value)
+                    return value
+                finally:
+                    with self.lock:
+                        del self._inflight[k]
+
+            def prime(value, *args, **kwargs):
+                """Stores value as if computed by func(*args, **kwargs).
+
+                Primed entries are not refreshed until requested.
+                """
+                self._store(key(*args, **kwargs), value,
+                            functools.partial(func, *args, **kwargs),
+                            requested=False)
+
+            def invalidate(*args, **kwargs):
+                self.invalidate(key(*args, **kwargs))
+            wrapper.prime = prime
+            wrapper.invalidate = invalidate
+            return wrapper
+        return decorator
+
+    def record(self, revalidated: bool) -> None:
+        """Accounts a fetch used to compute a cached value.
+
+        Args:
+            revalidated: True if the previous copy was confirmed as valid.
+        """
+        with self.lock:
+            if revalidated:
+                self.stats.revalidations += 1
+            else:
+                self.stats.refetches += 1
+
+    def due(self, margin: float, hot: float) -> List[Hashable]:
+        """Returns keys which expire within margin seconds.
+
+        Only keys requested during the last hot seconds are returned,
+        the rest is left to expire.
+        """
+        if not self.refreshable or self.ttl is None:
+            return []
+        now = _timer()
+        with self.lock:
+            return [key for key, tracked in self._tracked.items()
+                    if now - tracked.accessed <= hot and
+                    tracked.stored + self.ttl - margin <= now]
+
+    def refresh(self, key: Hashable) -> None:
+        with self.lock:
+            tracked = self._tracked.get(key)
+        if tracked is None:
+            return
+        try:
+            value = tracked.call()
+        except Exception as e:
+            if not self._forget(key, e):
+                raise
+            _log.info('%s: %s is gone: %s', self.name, key, e)
+            return
+        self._store(key, value, tracked.call)
+        with self.lock:
+            self.stats.refreshes += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Removes entry, forcing recomputation on the next request.
+
+        If Refresher is running the entry is refreshed in background,
+        the previous value is served meanwhile.
+        """
+        cache = self.cache
+        with guard(cache, self.lock):
+            cache.pop(key, None)
+        with self.lock:
+            self.version += 1
+            tracked = self._tracked.get(key)
+            refresher = _refresher
+            if tracked is None:
+                return
+            if refresher is None:
+                del self._tracked[key]
+                return
+        refresher.schedule(self, key)
+
+    def clear(self) -> None:
+        cache = self.cache
+        with guard(cache, self.lock):
+            cache.clear()
+        with self.lock:
+            self._tracked.clear()
+            self.stats = CacheStats()
+            self.version += 1
+
+
+class NegativeCache:
+    """Remembers calls which failed because the object does not exist.
+
+    Such calls are answered with a default value until the entry expires,
+    other errors propagate and are not remembered.
+    """
+
+    def __init__(self, name: str, cache: MutableMapping,
+                 is_missing: Callable[[BaseException], bool]):
+        self.name = name
+        self.lock = threading.Lock()
+        self.cache = cache
+        self.stats = CacheStats()
+        self.is_missing = is_missing
+        # Incremented whenever an entry is added or removed.
+        self.version = 0
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return getattr(self.cache, 'ttl', None)
+
+    def use(self, cache: MutableMapping) -> None:
+        """Replaces underlying storage, entries are not migrated."""
+        with self.lock:
+            self.cache = cache
+
+    def __call__(self, kind: str, default: Callable[[], Any] = lambda: None,
+                 key=cachetools.keys.hashkey):
+        """Decorates func, possibly already decorated by LockedCache.
+
+        Args:
+            kind: distinguishes functions sharing this cache.
+            default: returns the result of a call remembered as missing.
+        """
+        def decorator(func):
+            def missing_key(*args, **kwargs):
+                return (kind,) + tuple(key(*args, **kwargs))
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                k = missing_key(*args, **kwargs)
+                cache = self.cache
+                with guard(cache, self.lock):
+                    missing = cache.get(k)
+                if missing:
+                    with self.lock:
+                        self.stats.hits += 1
+                    return default()
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    if not self.is_missing(e):
+                        raise
+                    _log.info('%s: %s is missing: %s', self.name, k, e)
+                    cache = self.cache
+                    with guard(cache, self.lock):
+                        cache[k] = True
+                    with self.lock:
+                        self.stats.negatives += 1
+                        self.version += 1
+                    return default()
+
+            def prime(value, *args, **kwargs):
+                self.invalidate(missing_key(*args, **kwargs))
+                func.prime(value, *args, **kwargs)
+
+            def invalidate(*args, **kwargs):
+                self.invalidate(missing_key(*args, **kwargs))
+                if hasattr(func, 'invalidate'):
+                    func.invalidate(*args, **kwargs)
+            if hasattr(func, 'prime'):
+                wrapper.prime = prime
+            wrapper.invalidate = invalidate
+            return wrapper
+        return decorator
+
+    def invalidate(self, key: Hashable) -> None:
+        cache = self.cache
+        with guard(cache, self.lock):
+            removed = cache.pop(key, None) is not None
+        if removed:
+            with self.lock:
+                self.version += 1
+
+    def clear(self) -> None:
+        cache = self.cache
+        with guard(cache, self.lock):
+            cache.clear()
+        with self.lock:
+            self.stats = CacheStats()
+            self.version += 1
+
+
+class Refresher:
+    """Renews hot entries of refreshable caches before they expire.
+
+    While Refresher is running, requests for expired entries are answered
+    with the previous value and the entry is refreshed in background.
+    """
+
+    def __init__(self, caches: List[LockedCache], interval: float,
+                 margin: float, hot: float, workers: int,
+                 throttle: Callable[[], bool] = lambda: False):
+        """Creates refresher.
+
+        Args:
+            throttle: returns True while proactive refreshes and periodic
+                tasks should be postponed, e.g. to save GitHub rate limit.
+                Expired entries requested by users are still refreshed.
+        """
+        self._caches = caches
+        self.throttle = throttle
+        self.interval = interval
+        self.margin = margin
+        self.hot = hot
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='refresher')
+        self._lock = threading.Lock()
+        self._pending = set()
+        # [period, next run, func]
+        self._periodic: List[List] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='refresher')
+        self.pid = os.getpid()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def add_periodic(self, period: float, func: Callable[[], Any],
+                     delay: float = 0) -> None:
+        """Runs func in background after delay and then every period seconds.
+        """
+        with self._lock:
+            self._periodic.append(
+                [period, _timer() + delay if delay > 0 else float('-inf'),
+                 func])
+        if delay <= 0:
+            self.run_once()
+
+    def run_once(self) -> None:
+        if self.throttle():
+            _log.warning('refresher is throttled')
+            return
+        now = _timer()
+        with self._lock:
+            periodic = [task for task in self._periodic if task[1] <= now]
+            for task in periodic:
+                task[1] = now + task[0]
+        for _, _, func in periodic:
+            self._submit(('periodic', func), func)
+        for cache in self._caches:
+            for key in cache.due(self.margin, self.hot):
+                self.schedule(cache, key)
+
+    def schedule(self, cache: LockedCache, key: Hashable) -> None:
+        self._submit((cache.name, key), functools.partial(cache.refresh, key))
+
+    def _submit(self, pending_key: Hashable, func: Callable[[], Any]) -> None:
+        with self._lock:
+            if pending_key in self._pending:
+                return
+            self._pending.add(pending_key)
+        try:
+            self._executor.submit(self._call, pending_key, func)
+        except RuntimeError:  # executor is shut down
+            with self._lock:
+                self._pending.discard(pending_key)
+
+    def _call(self, pending_key: Hashable, func: Callable[[], Any]) -> None:
+        try:
+            func()
+        except Exception as e:
+            _log.error('refresh(%s): %s', pending_key, e)
+        finally:
+            with self._lock:
+                self._pending.discard(pending_key)
+
+
+_refresher: Optional[Refresher] = None
+_refresher_lock = threading.Lock()
+
+
+def start_refresher(caches: List[LockedCache], interval: float,
+                    margin: float, hot: float, workers: int,
+                    periodic: Iterable[
+                        Tuple[float, Callable[[], Any], float]] = (),
+                    throttle: Callable[[], bool] = lambda: False,
+                    ) -> Refresher:
+    """Starts refresher unless it is already running in this process.
+
+    Threads do not survive fork(), so a forked worker starts its own.
+
+    Args:
+        periodic: (period, func, delay) of tasks, see add_periodic().
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or _refresher.pid != os.getpid():
+            _refresher = Refresher(caches, interval=interval, margin=margin,
+                                   hot=hot, workers=workers,
+                                   throttle=throttle)
+            _refresher.start()
+            for period, func, delay in periodic:
+                _refresher.add_periodic(period, func, delay)
+        return _refresher
+
+
+def stop_refresher() -> None:
+    global _refresher
+    with _refresher_lock:
+        if _refresher is not None and _refresher.pid == os.getpid():
+            _refresher.stop()
+        _refresher = None
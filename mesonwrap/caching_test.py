@@ -0,0 +1,321 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import cachetools
+
+from mesonwrap import caching
+from mesonwrap import testing
+
+
+class LockedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = testing.FakeTimer()
+        patcher = mock.patch.object(caching, '_timer', self.timer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = caching.LockedCache(
+            'test', cachetools.TTLCache(maxsize=10, ttl=100),
+            refreshable=True)
+        self.values = iter(range(100))
+
+        @self.cache()
+        def compute(arg):
+            return (arg, next(self.values))
+        self.compute = compute
+
+    def refresher(self):
+        refresher = caching.Refresher([self.cache], interval=1, margin=10,
+                                      hot=1000, workers=1)
+        patcher = mock.patch.object(caching, '_refresher', refresher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(refresher.stop)
+        return refresher
+
+    def test_hit(self):
+        self.assertEqual(self.compute('a'), ('a', 0))
+        self.assertEqual(self.compute('a'), ('a', 0))
+        self.assertEqual(self.cache.stats.hits, 1)
+
+    def _concurrent(self, func, callers):
+        """Calls func concurrently, returns [(result, error)]."""
+        results = [None] * callers
+
+        def caller(i):
+            try:
+                results[i] = (func('a'), None)
+            except Exception as e:
+                results[i] = (None, e)
+        threads = [threading.Thread(target=caller, args=(i,))
+                   for i in range(callers)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 10
+        while (self.cache.stats.coalesced < callers - 1 and
+               time.monotonic() < deadline):
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_single_flight(self):
+        self.release = threading.Event()
+        calls = []
+
+        @self.cache()
+        def slow(arg):
+            calls.append(arg)
+            self.release.wait()
+            return [arg]
+        results = self._concurrent(slow, 5)
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(self.cache.stats.coalesced, 4)
+        self.assertEqual({id(value) for value, _ in results},
+                         {id(results[0][0])})
+
+    def test_single_flight_error(self):
+        self.release = threading.Event()
+        calls = []
+
+        @self.cache()
+        def failing(arg):
+            calls.append(arg)
+            self.release.wait()
+            raise ValueError(arg)
+        results = self._concurrent(failing, 3)
+        self.assertEqual(calls, ['a'])
+        for value, error in results:
+            self.assertIsInstance(error, ValueError)
+        with self.assertRaises(ValueError):
+            failing('a')  # errors are not cached
+        self.assertEqual(calls, ['a', 'a'])
+
+    def test_version(self):
+        self.compute('a')
+        version = self.cache.version
+        self.compute.prime(('a', 0), 'a')  # same value
+        self.assertEqual(self.cache.version, version)
+        self.compute.prime(('a', 1), 'a')
+        self.assertGreater(self.cache.version, version)
+        version = self.cache.version
+        self.compute.invalidate('a')
+        self.assertGreater(self.cache.version, version)
+
+    def test_version_shared_value(self):
+        self.compute('a')
+        version = self.cache.version
+        self.cache.cache[('a',)] = ('a', 0)  # equal copy
+        self.compute('a')
+        self.assertEqual(self.cache.version, version)
+        self.cache.cache[('a',)] = ('a', 10)  # stored by another process
+        self.assertEqual(self.compute('a'), ('a', 10))
+        self.assertGreater(self.cache.version, version)
+
+    def test_expired_without_refresher(self):
+        self.compute('a')
+        self.cache.cache.clear()  # expire
+        self.assertEqual(self.compute('a'), ('a', 1))
+        self.assertEqual(self.cache.stats.stale, 0)
+
+    def test_stale_while_revalidate(self):
+        refresher = self.refresher()
+        self.compute('a')
+        self.cache.cache.clear()  # expire
+        self.assertEqual(self.compute('a'), ('a', 0))
+        self.assertEqual(self.cache.stats.stale, 1)
+        refresher.stop()
+        self.assertEqual(self.compute('a'), ('a', 1))
+        self.assertEqual(self.cache.stats.refreshes, 1)
+
+    def test_due(self):
+        self.compute('a')
+        self.timer.now += 50
+        self.compute('b')
+        self.timer.now += 45
+        self.assertEqual(self.cache.due(margin=10, hot=1000), [('a',)])
+        self.assertEqual(self.cache.due(margin=10, hot=40), [])
+
+    def test_run_once(self):
+        refresher = self.refresher()
+        self.compute('a')
+        self.timer.now += 95
+        refresher.run_once()
+        refresher.stop()
+        self.assertEqual(self.compute('a'), ('a', 1))
+        self.assertEqual(self.cache.stats.refreshes, 1)
+        self.assertEqual(self.cache.due(margin=10, hot=1000), [])
+
+    def test_refresh_error_keeps_value(self):
+        refresher = self.refresher()
+        self.compute('a')
+        self.values = iter([])  # StopIteration on compute
+        self.cache.cache.clear()  # expire
+        refresher.run_once()
+        self.timer.now += 95
+        refresher.run_once()
+        refresher.stop()
+        self.assertEqual(self.compute('a'), ('a', 0))
+
+    def test_refresh_missing_forgets_value(self):
+        refresher = self.refresher()
+        self.cache.is_missing = lambda e: isinstance(e, StopIteration)
+        self.compute('a')
+        self.values = iter([])  # StopIteration on compute
+        self.cache.cache.clear()  # expire
+        version = self.cache.version
+        self.cache.refresh(('a',))
+        self.assertGreater(self.cache.version, version)
+        refresher.stop()
+        with self.assertRaises(StopIteration):
+            self.compute('a')
+
+    def test_max_stale(self):
+        self._patch_submit(self.refresher())
+        self.cache.max_stale = 50
+        self.compute('a')
+        self.cache.cache.clear()  # expire
+        self.timer.now += 140
+        self.assertEqual(self.compute('a'), ('a', 0))
+        self.timer.now += 20
+        self.assertEqual(self.compute('a'), ('a', 1))
+
+    def test_primed_not_due(self):
+        self.compute.prime(('a', 10), 'a')
+        self.assertEqual(self.compute('a'), ('a', 10))
+        self.timer.now += 95
+        self.assertEqual(self.cache.due(margin=10, hot=1000), [('a',)])
+        self.compute.prime(('b', 10), 'b')
+        self.timer.now += 95
+        self.assertNotIn(('b',), self.cache.due(margin=10, hot=1000))
+
+    def test_periodic(self):
+        refresher = self.refresher()
+        submit = self._patch_submit(refresher)
+        func = mock.Mock()
+        refresher.add_periodic(60, func)
+        refresher.run_once()
+        self.timer.now += 60
+        refresher.run_once()
+        self.assertEqual(submit.call_args_list,
+                         [mock.call(('periodic', func), func)] * 2)
+
+    def test_periodic_delay(self):
+        refresher = self.refresher()
+        submit = self._patch_submit(refresher)
+        func = mock.Mock()
+        refresher.add_periodic(60, func, delay=30)
+        submit.assert_not_called()
+        self.timer.now += 30
+        refresher.run_once()
+        submit.assert_called_once_with(('periodic', func), func)
+
+    def test_throttled(self):
+        refresher = self.refresher()
+        refresher.throttle = lambda: True
+        submit = self._patch_submit(refresher)
+        refresher.add_periodic(60, mock.Mock())
+        self.compute('a')
+        self.timer.now += 95
+        refresher.run_once()
+        submit.assert_not_called()
+
+    def test_fallback(self):
+        self.cache.fallback = lambda e: isinstance(e, StopIteration)
+        self.compute('a')
+        self.values = iter([])  # StopIteration on compute
+        self.cache.cache.clear()  # expire
+        self.assertEqual(self.compute('a'), ('a', 0))
+        self.assertEqual(self.cache.stats.fallbacks, 1)
+        with self.assertRaises(StopIteration):
+            self.compute('b')  # no previous value
+        self.timer.now += self.cache.ttl + self.cache.max_stale + 1
+        with self.assertRaises(StopIteration):
+            self.compute('a')  # too old
+
+    def test_fallback_other_error(self):
+        self.cache.fallback = lambda e: False
+        self.compute('a')
+        self.values = iter([])
+        self.cache.cache.clear()
+        with self.assertRaises(StopIteration):
+            self.compute('a')
+
+    def _patch_submit(self, refresher):
+        patcher = mock.patch.object(refresher, '_submit')
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_thread_safe_storage_unlocked(self):
+        lock = self.cache.lock
+        locked = []
+
+        class Storage(cachetools.TTLCache):
+            thread_safe = True
+
+            def __getitem__(self, key):
+                locked.append(lock.locked())
+                return super().__getitem__(key)
+
+            def __setitem__(self, key, value):
+                locked.append(lock.locked())
+                super().__setitem__(key, value)
+        self.cache.use(Storage(maxsize=10, ttl=100))
+        self.compute('a')
+        self.assertEqual(self.compute('a'), ('a', 0))
+        self.compute.invalidate('a')
+        self.assertEqual(locked, [False] * 3)
+
+    def test_not_refreshable(self):
+        cache = caching.LockedCache(
+            'test', cachetools.TTLCache(maxsize=10, ttl=100))
+        cache(key=lambda arg: arg)(lambda arg: arg)('a')
+        self.timer.now += 95
+        self.assertEqual(cache.due(margin=10, hot=1000), [])
+
+
+class NegativeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = caching.NegativeCache(
+            'missing', cachetools.TTLCache(maxsize=10, ttl=100),
+            is_missing=lambda e: isinstance(e, KeyError))
+        self.calls = []
+        self.errors = dict()
+
+        @self.cache('test', default=list)
+        def compute(arg):
+            self.calls.append(arg)
+            if arg in self.errors:
+                raise self.errors[arg]
+            return [arg]
+        self.compute = compute
+
+    def test_missing(self):
+        self.errors['a'] = KeyError('a')
+        self.assertEqual(self.compute('a'), [])
+        self.assertEqual(self.compute('a'), [])
+        self.assertEqual(self.calls, ['a'])
+        self.assertEqual(self.cache.stats.negatives, 1)
+        self.assertEqual(self.cache.stats.hits, 1)
+
+    def test_transient_not_cached(self):
+        self.errors['a'] = OSError('a')
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                self.compute('a')
+        self.assertEqual(self.calls, ['a', 'a'])
+
+    def test_invalidate(self):
+        self.errors['a'] = KeyError('a')
+        self.compute('a')
+        del self.errors['a']
+        self.compute.invalidate('a')
+        self.assertEqual(self.compute('a'), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ import typing
 
 from mesonwrap import wrapcreator
 from mesonwrap.tools import check_source
+from mesonwrap.tools import freeze
 from mesonwrap.tools import publisher
 from mesonwrap.tools import repoinit
 from mesonwrap.tools import reviewtool
@@ -87,6 +88,10 @@ class Command:
         """Unwatch mesonwrap repositories"""
         watching.unwatch(*self.args())
 
+    def command_freeze(self):
+        """Write static mirror of the API"""
+        freeze.main(*self.args())
+
     def command_check_source(self):
         """Check source archive"""
         check_source.main(*self.args())
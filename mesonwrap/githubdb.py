@@ -1,13 +1,25 @@
+import base64
+import dataclasses
+import datetime
 import logging
+import os
 import threading
-from typing import Iterable, List, Optional, Tuple
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import cachetools
 import github
 import requests
 
+from mesonwrap import blobstore
+from mesonwrap import cachebackend
+from mesonwrap import caching
+from mesonwrap import githubgraphql
+from mesonwrap import githubrest
 from mesonwrap import ini
 from mesonwrap import inventory
+from mesonwrap import nameindex
+from mesonwrap import sharedcache
 from mesonwrap import ticket
 from mesonwrap import version
 
@@ -15,52 +27,255 @@ from mesonwrap import version
 UPSTREAM_WRAP_LABEL = 'upstream.wrap'
 PATCH_ZIP_LABEL = 'patch.zip'
 CACHE_SIZE = 1000
+ASSET_CACHE_BYTES = 64 * 1024 * 1024  # per process, without blob store
 CACHE_TTL = 30 * 60   # 30 minutes
 METADATA_TTL = 24 * 60 * 60  # 1 day
-TICKETS_TTL = 5 * 60  # 5 minutes
+TICKETS_TTL = 60  # 1 minute, only updated tickets are fetched
+# Tickets are searched for in full once per this many seconds to forget
+# deleted and transferred issues, which are never reported as updated.
+TICKETS_RESYNC = 24 * 60 * 60  # 1 day
+# Incremental searches overlap the previous one by this long, so that
+# issues indexed late by GitHub search are not missed.
+TICKETS_OVERLAP = datetime.timedelta(minutes=5)
+# Nonexistent projects, releases, assets and metadata are remembered
+# for a short time, so that mistyped requests do not reach GitHub.
+MISSING_TTL = 60
+MISSING_CACHE_SIZE = 10 * CACHE_SIZE
 
 
 Version = Tuple[str, int]
 
 
+@dataclasses.dataclass(frozen=True)
+class AssetInfo:
+
+    url: str
+    size: int
+
+
+# label -> AssetInfo
+ReleaseAssets = Dict[str, AssetInfo]
+
+
+class AssetNotFound(KeyError):
+    pass
+
+
+def _is_not_found(error: BaseException) -> bool:
+    """Returns True for errors meaning the object does not exist.
+
+    Transient errors, including rate limits, return False.
+    """
+    if isinstance(error, AssetNotFound):
+        return True
+    if isinstance(error, github.GithubException):
+        return error.status in (404, 410)
+    if isinstance(error, requests.HTTPError):
+        return (error.response is not None and
+                error.response.status_code in (404, 410))
+    return False
+
+
 class Organization:
 
-    def __init__(self, pygithub: github.Github,
+    def __init__(self, pygithub: Union[github.Github,
+                                       Callable[[], github.Github]],
                  organization: str = 'mesonbuild'):
-        assert isinstance(pygithub, github.Github)
+        """Initialize Organization.
+
+        Args:
+            pygithub: PyGithub instance used by every thread, or a callable
+                creating one for each thread. PyGithub connections must not
+                be used by several threads at once.
+        """
         assert isinstance(organization, str)
-        self._gh = pygithub
+        if isinstance(pygithub, github.Github):
+            self._connect = lambda: pygithub
+        else:
+            self._connect = pygithub
         self._org = organization
+        self._local = threading.local()
 
-    def __call__(self):
-        return self._gh.get_organization(self._org)
+    @property
+    def name(self) -> str:
+        return self._org
 
     @property
-    def github(self):
-        return self._gh
+    def github(self) -> github.Github:
+        """Returns PyGithub instance of the current thread."""
+        local = self._local
+        # Forked processes inherit the thread local of the forking thread,
+        # but must not share its connection.
+        if getattr(local, 'pid', None) != os.getpid():
+            local.github = self._connect()
+            local.pid = os.getpid()
+        return local.github
+
+    def rest(self, caller: str) -> githubrest.Client:
+        """Returns REST client accounting requests to caller."""
+        return githubrest.Client(githubrest.requester(self.github),
+                                 _validators, _budget, caller)
 
     @property
     def inventory(self):
         return inventory.Inventory(self._org)
 
 
-class LockedCache:
+# global cache instances
+_repo = caching.LockedCache(
+    'repo', cachebackend.MemoryBackend(ttl=CACHE_TTL, maxsize=1),
+    refreshable=True, fallback=githubrest.is_rate_limit_error,
+    is_missing=_is_not_found)
+_release = caching.LockedCache(
+    'release',
+    cachebackend.MemoryBackend(ttl=CACHE_TTL, maxsize=CACHE_SIZE),
+    refreshable=True, fallback=githubrest.is_rate_limit_error,
+    is_missing=_is_not_found)
+_asset = caching.LockedCache(
+    'asset', cachebackend.MemoryBackend(maxsize=10 * CACHE_SIZE,
+                                        max_bytes=ASSET_CACHE_BYTES))
+# (project, branch, revision) -> ReleaseAssets, filled with release lists
+_asset_index = caching.LockedCache(
+    'asset_index', cachebackend.MemoryBackend(maxsize=10 * CACHE_SIZE))
+_metadata = caching.LockedCache(
+    'metadata',
+    cachebackend.MemoryBackend(ttl=METADATA_TTL, maxsize=CACHE_SIZE),
+    refreshable=True, fallback=githubrest.is_rate_limit_error,
+    is_missing=_is_not_found)
+_ticket = caching.LockedCache(
+    'ticket', cachebackend.MemoryBackend(ttl=TICKETS_TTL, maxsize=1),
+    refreshable=True, fallback=githubrest.is_rate_limit_error,
+    is_missing=_is_not_found)
+_caches = [_repo, _release, _asset, _asset_index, _metadata, _ticket]
+# Caches of the data project lists and pages are built from.
+_data_caches = [_repo, _release, _metadata, _ticket]
+_missing = caching.NegativeCache(
+    'missing', cachebackend.MemoryBackend(ttl=MISSING_TTL,
+                                          maxsize=MISSING_CACHE_SIZE),
+    is_missing=_is_not_found)
+# ETag/Last-Modified of every GitHub resource read, outlives cache entries
+_validators = githubrest.ValidatorStore()
+_budget = githubrest.Budget()
+_log = logging.getLogger(__name__)
 
-    def __init__(self, cache: cachetools.Cache):
-        self.lock = threading.Lock()
-        self.cache = cache
 
-    def __call__(self, **kwargs):
-        return cachetools.cached(cache=self.cache, lock=self.lock, **kwargs)
+def rate_limits() -> Dict[str, githubrest.Limit]:
+    return _budget.limits()
 
 
-# global cache instances
-_repo = LockedCache(cachetools.TTLCache(maxsize=1, ttl=CACHE_TTL))
-_release = LockedCache(cachetools.TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL))
-_asset = LockedCache(cachetools.LRUCache(maxsize=CACHE_SIZE))
-_metadata = LockedCache(cachetools.TTLCache(maxsize=CACHE_SIZE, ttl=METADATA_TTL))
-_ticket = LockedCache(cachetools.TTLCache(maxsize=1, ttl=TICKETS_TTL))
-_log = logging.getLogger(__name__)
+def budget_usage() -> Dict[str, githubrest.Usage]:
+    return _budget.usage()
+
+
+def _throttled() -> bool:
+    return _budget.throttled('core') or _budget.throttled('graphql')
+
+
+def cache_stats() -> Dict[str, caching.CacheStats]:
+    return {cache.name: dataclasses.replace(cache.stats)
+            for cache in _caches + [_missing]}
+
+
+def data_version() -> int:
+    """Returns number increasing whenever project data of this process changes.
+
+    Projects, releases, metadata and tickets count, assets and remembered
+    nonexistent objects do not. A value another process stored into a
+    shared backend counts when this process reads it, if it differs from
+    the value this process stored or read for the same key before.
+    """
+    return sum(cache.version for cache in _data_caches)
+
+
+def backend_stats() -> Dict[str, cachebackend.BackendStats]:
+    return {cache.name: dataclasses.replace(cache.cache.stats)
+            for cache in _caches + [_missing]
+            if isinstance(cache.cache, cachebackend.Backend)}
+
+
+def local_caches() -> List[str]:
+    """Returns names of caches kept in the memory of this process.
+
+    Invalidations, e.g. by the webhook, do not reach other processes.
+    """
+    return [cache.name for cache in _caches + [_missing]
+            if isinstance(cache.cache, cachebackend.MemoryBackend)]
+
+
+def use_backend(name: str, kind: str, max_bytes: Optional[int] = None,
+                **kwargs) -> None:
+    """Moves cache to a backend created by cachebackend.create().
+
+    TTL and number of entries are kept, entries are not migrated.
+    """
+    for cache in _caches + [_missing]:
+        if cache.name == name:
+            break
+    else:
+        raise ValueError('Unknown cache', name)
+    if max_bytes is None:
+        max_bytes = getattr(cache.cache, 'max_bytes', None)
+    cache.use(cachebackend.create(kind, name, ttl=cache.ttl,
+                                  maxsize=cache.cache.maxsize,
+                                  max_bytes=max_bytes, **kwargs))
+
+
+def use_shared_cache(shared: sharedcache.SharedCache) -> None:
+    """Moves all caches but assets to the store shared with other processes.
+
+    Assets are shared through use_blob_store().
+    """
+    for cache in _caches + [_missing]:
+        if cache is _asset:
+            continue
+        use_backend(cache.name, cachebackend.DISK, shared=shared)
+    _validators.use(shared.mapping('validators',
+                                   maxsize=githubrest.VALIDATORS_SIZE,
+                                   max_bytes=githubrest.VALIDATORS_BYTES))
+
+
+def use_blob_store(store: blobstore.BlobStore) -> None:
+    """Moves asset cache to memory-mapped files on disk."""
+    _asset.use(store.mapping())
+
+
+def start_refresher(interval: float, margin: float, hot: float,
+                    workers: int, periodic=()) -> caching.Refresher:
+    """Starts caching.Refresher for refreshable caches."""
+    return caching.start_refresher(_caches, interval=interval, margin=margin,
+                                   hot=hot, workers=workers,
+                                   periodic=periodic, throttle=_throttled)
+
+
+def set_ttl(cache_ttl: float, metadata_ttl: float) -> None:
+    """Replaces TTL of repository, release and metadata caches.
+
+    Existing entries are dropped, call before use_shared_cache().
+    """
+    _repo.use(cachebackend.MemoryBackend(ttl=cache_ttl, maxsize=1))
+    _release.use(cachebackend.MemoryBackend(ttl=cache_ttl,
+                                            maxsize=CACHE_SIZE))
+    _metadata.use(cachebackend.MemoryBackend(ttl=metadata_ttl,
+                                             maxsize=CACHE_SIZE))
+
+
+def set_missing_ttl(ttl: float, maxsize: int = MISSING_CACHE_SIZE) -> None:
+    """Replaces TTL and size of the cache of nonexistent objects.
+
+    Existing entries are dropped, call before use_shared_cache().
+    """
+    _missing.use(cachebackend.MemoryBackend(ttl=ttl, maxsize=maxsize))
+
+
+def clear_caches() -> None:
+    global _catalogue_loaded
+    _catalogue_loaded = None
+    for cache in _caches:
+        cache.clear()
+    _missing.clear()
+    _ticket_index.clear()
+    _validators.clear()
+    _budget.clear()
 
 
 def _cache_key(organization, *args, **kwargs):
@@ -70,71 +285,153 @@ def _cache_key(organization, *args, **kwargs):
 
 @_repo(key=_cache_key)
 def _repository_list(org: Organization):
-    return sorted([repo.name for repo in org().get_repos()
-                   if inventory.is_wrap_project_name(repo.name)])
+    rv = org.rest('repository_list').get_paginated(f'/orgs/{org.name}/repos')
+    _repo.record(rv.revalidated)
+    return nameindex.NameIndex(
+        repo['name'] for repo in rv.data
+        if inventory.is_wrap_project_name(repo['name']))
 
 
-def _get_versions(org: Organization, project: str) -> Iterable[Version]:
-    repo = org().get_repo(project)
-    for release in repo.get_releases():
-        dash = release.tag_name.rfind('-')
-        if dash == -1:
-            continue
-        version = release.tag_name[:dash]
-        revision = int(release.tag_name[dash + 1:])
-        yield (version, revision)
+def _parse_tag(tag_name: str) -> Optional[Version]:
+    dash = tag_name.rfind('-')
+    if dash == -1:
+        return None
+    try:
+        revision = int(tag_name[dash + 1:])
+    except ValueError:
+        return None
+    return (tag_name[:dash], revision)
+
+
+def _sort_versions(versions: Iterable[Optional[Version]]) -> List[Version]:
+    return sorted(filter(None, versions), key=version.version_key,
+                  reverse=True)
 
 
+def _parse_assets(release) -> ReleaseAssets:
+    return {asset['label']: AssetInfo(url=asset['browser_download_url'],
+                                      size=asset['size'])
+            for asset in release['assets']}
+
+
+def _get_versions(org: Organization, project: str) -> Iterable[Version]:
+    rv = org.rest('release_list').get_paginated(
+        f'/repos/{org.name}/{project}/releases')
+    _release.record(rv.revalidated)
+    for release in rv.data:
+        version = _parse_tag(release['tag_name'])
+        if version is not None:
+            _release_assets.prime(_parse_assets(release),
+                                  org, project, *version)
+        yield version
+
+
+@_missing('releases', default=list, key=_cache_key)
 @_release(key=_cache_key)
 def _release_list(org: Organization, project: str) -> List[Version]:
     assert isinstance(project, str)
-    iterator = _get_versions(org, project)
-    return sorted(iterator, key=version.version_key, reverse=True)
+    return _sort_versions(_get_versions(org, project))
 
 
+@_missing('release', default=dict, key=_cache_key)
+@_asset_index(key=_cache_key)
+def _release_assets(org: Organization, project: str, branch: str,
+                    revision: int) -> ReleaseAssets:
+    """Usually primed by release list fetches, see _get_versions()."""
+    rv = org.rest('release_assets').get(
+        f'/repos/{org.name}/{project}/releases/tags/{branch}-{revision}')
+    _asset_index.record(rv.revalidated)
+    return _parse_assets(rv.data)
+
+
+@_missing('asset', key=_cache_key)
 @_asset(key=_cache_key)
 def _get_asset(org: Organization,
-               project: str, branch: str, revision: int, label: str) -> bytes:
-    repo = org().get_repo(project)
-    release = repo.get_release(f'{branch}-{revision}')
-    for asset in release.get_assets():
-        if asset.label == label:
-            with requests.get(asset.browser_download_url) as rv:
-                rv.raise_for_status()
-                return rv.content
+               project: str, branch: str, revision: int,
+               label: str) -> Optional[Union[bytes, blobstore.Blob]]:
+    asset = _release_assets(org, project, branch, revision).get(label)
+    if asset is not None:
+        with requests.get(asset.url) as download:
+            download.raise_for_status()
+            _asset.record(revalidated=False)
+            return download.content
     _log.error('Asset not found project=%s branch=%s revision=%d label=%s',
                project, branch, revision, label)
-    raise KeyError('Asset not found', project, branch, revision, label)
+    raise AssetNotFound('Asset not found', project, branch, revision, label)
 
 
 def _get_wrap(org: Organization,
               project: str, branch: str, revision: int) -> Optional[str]:
     try:
         data = _get_asset(org, project, branch, revision, UPSTREAM_WRAP_LABEL)
-        return data.decode('utf-8')
+        return data.decode('utf-8') if data is not None else None
     except Exception as e:
+        if githubrest.is_rate_limit_error(e):
+            raise
         _log.error('get_wrap(%s, %s, %d): %s', project, branch, revision, e)
         return None
 
 
-def _get_zip(org: Organization,
-             project: str, branch: str, revision: int) -> Optional[bytes]:
+def _get_zip(org: Organization, project: str, branch: str,
+             revision: int) -> Optional[Union[bytes, blobstore.Blob]]:
     try:
         return _get_asset(org, project, branch, revision, PATCH_ZIP_LABEL)
     except Exception as e:
+        if githubrest.is_rate_limit_error(e):
+            raise
         _log.error('get_zip(%s, %s, %d): %s', project, branch, revision, e)
         return None
 
 
+@_missing('metadata', key=_cache_key)
 @_metadata(key=_cache_key)
 def _get_metadata(org: Organization, project: str) -> Optional[ini.WrapMeta]:
-    try:
-        repo = org().get_repo(project)
-        meta = repo.get_contents('metadata.wrap')
-        return WrapMeta.from_string(meta.content)
-    except Exception as e:
-        _log.error('get_metadata(%s): %s', project, e)
+    rv = org.rest('metadata').get(
+        f'/repos/{org.name}/{project}/contents/metadata.wrap')
+    _metadata.record(rv.revalidated)
+    content = base64.b64decode(rv.data['content']).decode('utf-8')
+    return ini.WrapMeta.from_string(content)
+
+
+# time.monotonic() of the last bulk load, inherited by forked processes
+_catalogue_loaded: Optional[float] = None
+
+
+def catalogue_age() -> Optional[float]:
+    """Returns seconds since the catalogue was loaded in bulk, if ever."""
+    if _catalogue_loaded is None:
         return None
+    return time.monotonic() - _catalogue_loaded
+
+
+def _load_catalogue(org: Organization) -> None:
+    start = time.monotonic()
+    names = []
+    for repo in githubgraphql.load_catalogue(
+            githubrest.requester(org.github), org.name, _budget):
+        if not inventory.is_wrap_project_name(repo.name):
+            continue
+        names.append(repo.name)
+        versions = []
+        for release in repo.releases:
+            version = _parse_tag(release.tag)
+            if version is None:
+                continue
+            versions.append(version)
+            _release_assets.prime(
+                {asset.label: AssetInfo(url=asset.url, size=asset.size)
+                 for asset in release.assets},
+                org, repo.name, *version)
+        _release_list.prime(_sort_versions(versions), org, repo.name)
+        _get_metadata.prime(
+            ini.WrapMeta.from_string(repo.metadata)
+            if repo.metadata is not None else None,
+            org, repo.name)
+    _repository_list.prime(nameindex.NameIndex(names), org)
+    global _catalogue_loaded
+    _catalogue_loaded = time.monotonic()
+    _log.info('Loaded %d projects in %.1fs',
+              len(names), time.monotonic() - start)
 
 
 def ticket_from_issue(issue: github.Issue) -> ticket.Ticket:
@@ -156,39 +453,118 @@ def ticket_from_issue(issue: github.Issue) -> ticket.Ticket:
         updated_at=str(issue.updated_at))
 
 
+class _TicketIndex:
+    """Open tickets of an organization, maintained incrementally.
+
+    After the initial search only issues updated since the previous sync
+    are searched for. Updated open issues replace their previous version,
+    closed ones are dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # url -> ticket.Ticket
+        self._tickets: Dict[str, ticket.Ticket] = dict()
+        # updated:>= qualifier value of the next incremental search
+        self._since: Optional[datetime.datetime] = None
+        self._resynced = float('-inf')
+        self._organization: Optional[str] = None
+
+    @staticmethod
+    def _query(inv: inventory.Inventory) -> List[str]:
+        query = [
+            'org:' + inv.organization,
+            'is:public',
+        ]
+        query.extend(
+            f'-repo:{project}'
+            for project in inv.restricted_projects
+            if project != inv.issue_tracker
+        )
+        return query
+
+    def sync(self, org: Organization) -> List[ticket.Ticket]:
+        with self._lock:
+            now = time.monotonic()
+            full = (self._since is None or
+                    self._organization != org.name or
+                    now - self._resynced >= TICKETS_RESYNC)
+            query = self._query(org.inventory)
+            if full:
+                query.append('is:open')
+                tickets = dict()
+            else:
+                since = self._since - TICKETS_OVERLAP
+                query.append('updated:>=' +
+                             since.strftime('%Y-%m-%dT%H:%M:%SZ'))
+                tickets = dict(self._tickets)
+            _budget.check('search')
+            # Issues carry the headers of the search page they were on.
+            headers = None
+            latest = None
+            try:
+                for issue in org.github.search_issues(' '.join(query)):
+                    if issue.raw_headers is not headers:
+                        headers = issue.raw_headers
+                        _budget.update(headers, 'tickets')
+                    if issue.state == 'closed':
+                        tickets.pop(issue.html_url, None)
+                    else:
+                        tickets[issue.html_url] = ticket_from_issue(issue)
+                    if latest is None or issue.updated_at > latest:
+                        latest = issue.updated_at
+            except github.GithubException as e:
+                _budget.update(e.headers or {}, 'tickets')
+                raise
+            if headers is None:
+                _budget.update({}, 'tickets')  # no results
+            if latest is not None:
+                # Issues seen again replace themselves, which is harmless.
+                self._since = latest
+            elif self._since is None:
+                self._since = datetime.datetime.now(datetime.timezone.utc)
+            if full:
+                self._resynced = now
+                self._organization = org.name
+            self._tickets = tickets
+            return sorted(tickets.values(),
+                          key=lambda r: (r.project.title, r.url))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tickets.clear()
+            self._since = None
+            self._resynced = float('-inf')
+
+
+_ticket_index = _TicketIndex()
+
+
 @_ticket(key=_cache_key)
 def _tickets(org: Organization) -> List[ticket.Ticket]:
-    inv = org.inventory
-    query = [
-        'org:' + inv.organization,
-        'is:open',
-        'is:public',
-    ]
-    query.extend(
-        f'-repo:{project}'
-        for project in inv.restricted_projects
-        if project != inv.issue_tracker
-    )
-    result = (ticket_from_issue(issue)
-              for issue in org.github.search_issues(' '.join(query)))
-    return sorted(result, key=lambda r: (r.project.title, r.url))
-
-
-# TODO implement caching
-# https://developer.github.com/v3/#conditional-requests
-# or just some cache with timeouts
+    return _ticket_index.sync(org)
+
+
 class GithubDB:
 
-    def __init__(self, pygithub: github.Github,
+    def __init__(self, pygithub: Union[github.Github,
+                                       Callable[[], github.Github]],
                  organization: str = 'mesonbuild'):
+        """Initialize GithubDB, see Organization for pygithub."""
         self._org = Organization(pygithub, organization)
 
     def close(self):
         pass
 
-    def name_search(self, text):
-        return sorted([repo for repo in _repository_list(self._org)
-                       if repo.startswith(text)])
+    @property
+    def organization(self) -> str:
+        return self._org.name
+
+    def name_search(self, text: str) -> List[str]:
+        return _repository_list(self._org).prefix(text)
+
+    def has_project(self, project: str) -> bool:
+        return project in _repository_list(self._org)
 
     def get_versions(self, project: str) -> List[Version]:
         return _release_list(self._org, project)
@@ -200,16 +576,87 @@ class GithubDB:
             return None
         return results[0]
 
-    # TODO consider redirect
     def get_wrap(self, project, branch, revision) -> Optional[str]:
         return _get_wrap(self._org, project, branch, revision)
 
-    # TODO consider redirect
-    def get_zip(self, project, branch, revision) -> Optional[bytes]:
+    def get_zip(self, project, branch,
+                revision) -> Optional[Union[bytes, blobstore.Blob]]:
         return _get_zip(self._org, project, branch, revision)
 
+    def get_asset(self, project: str, branch: str, revision: int,
+                  label: str) -> Optional[Union[bytes, blobstore.Blob]]:
+        """Returns asset content, a blob once it is in the blob store."""
+        try:
+            return _get_asset(self._org, project, branch, revision, label)
+        except Exception as e:
+            if githubrest.is_rate_limit_error(e):
+                raise
+            _log.error('get_asset(%s, %s, %d, %s): %s',
+                       project, branch, revision, label, e)
+            return None
+
+    def get_asset_info(self, project: str, branch: str, revision: int,
+                       label: str) -> Optional[AssetInfo]:
+        """Returns GitHub download URL and size of an asset."""
+        try:
+            return _release_assets(self._org, project, branch,
+                                   revision).get(label)
+        except Exception as e:  # transient, not cached
+            if githubrest.is_rate_limit_error(e):
+                raise
+            _log.error('get_asset_info(%s, %s, %d, %s): %s',
+                       project, branch, revision, label, e)
+            return None
+
     def get_metadata(self, project) -> Optional[ini.WrapMeta]:
-        return _get_metadata(self._org, project)
+        try:
+            return _get_metadata(self._org, project)
+        except Exception as e:  # transient, not cached
+            if githubrest.is_rate_limit_error(e):
+                raise
+            _log.error('get_metadata(%s): %s', project, e)
+            return None
 
     def get_tickets(self) -> List[ticket.Ticket]:
         return _tickets(self._org)
+
+    def invalidate_repository_list(self) -> None:
+        _repository_list.invalidate(self._org)
+
+    def invalidate_releases(self, project: str) -> None:
+        _release_list.invalidate(self._org, project)
+
+    def invalidate_release(self, project: str, tag: str) -> None:
+        """Forgets assets of a release which was edited or deleted."""
+        version = _parse_tag(tag)
+        if version is None:
+            return
+        _release_assets.invalidate(self._org, project, *version)
+        for label in [UPSTREAM_WRAP_LABEL, PATCH_ZIP_LABEL]:
+            _get_asset.invalidate(self._org, project, *version, label)
+
+    def invalidate_metadata(self, project: str) -> None:
+        _get_metadata.invalidate(self._org, project)
+
+    def load_catalogue(self) -> None:
+        """Fills project, release and metadata caches in bulk."""
+        _load_catalogue(self._org)
+
+    def catalogue_age(self) -> Optional[float]:
+        return catalogue_age()
+
+    def cache_stats(self) -> Dict[str, caching.CacheStats]:
+        return cache_stats()
+
+    def data_version(self) -> int:
+        return data_version()
+
+    def backend_stats(self) -> Dict[str, cachebackend.BackendStats]:
+        return backend_stats()
+
+    def rate_limits(self) -> Dict[str, githubrest.Limit]:
+        return rate_limits()
+
+    def budget_usage(self) -> Dict[str, githubrest.Usage]:
+        """Returns GitHub requests made by each caching function."""
+        return budget_usage()
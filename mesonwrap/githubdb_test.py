@@ -0,0 +1,329 @@
+import datetime
+import threading
+import time
+import unittest
+from unittest import mock
+
+import github
+
+from mesonwrap import caching
+from mesonwrap import githubdb
+from mesonwrap import githubgraphql
+from mesonwrap import testing
+
+
+class GithubDBTest(testing.GithubTestBase):
+
+    def test_name_search(self):
+        self.add_repos('foo', 'foobar', 'bar', 'meson')
+        self.assertEqual(self.db.name_search(''), ['bar', 'foo', 'foobar'])
+        self.assertEqual(self.db.name_search('foo'), ['foo', 'foobar'])
+        self.assertTrue(self.db.has_project('foo'))
+        self.assertFalse(self.db.has_project('meson'))
+
+    def test_get_versions(self):
+        self.add_releases('foo', ('1.2.3-1', {}), ('1.2.10-2', {}),
+                          ('nodash', {}))
+        self.assertEqual(self.db.get_versions('foo'),
+                         [('1.2.10', 2), ('1.2.3', 1)])
+        self.assertEqual(self.db.get_latest_version('foo'), ('1.2.10', 2))
+
+    def test_get_assets(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.UPSTREAM_WRAP_LABEL: 'https://dl/wrap',
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.downloads['https://dl/wrap'] = b'wrap contents'
+        self.downloads['https://dl/zip'] = b'zip contents'
+        self.assertEqual(self.db.get_wrap('foo', '1.0', 1), 'wrap contents')
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'zip contents')
+        self.assertIsNone(self.db.get_zip('foo', '1.0', 2))
+
+    def test_get_asset_info(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.assertEqual(
+            self.db.get_asset_info('foo', '1.0', 1, githubdb.PATCH_ZIP_LABEL),
+            githubdb.AssetInfo(url='https://dl/zip', size=0))
+        self.assertIsNone(self.db.get_asset_info(
+            'foo', '1.0', 1, githubdb.UPSTREAM_WRAP_LABEL))
+        self.assertIsNone(self.db.get_asset_info(
+            'foo', '1.0', 2, githubdb.PATCH_ZIP_LABEL))
+
+    def test_asset_index(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.downloads['https://dl/zip'] = b'zip contents'
+        self.db.get_versions('foo')
+        self.requester.requests.clear()
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'zip contents')
+        self.assertIsNone(self.db.get_wrap('foo', '1.0', 1))
+        self.assertEqual(self.requester.requests, [])
+
+    def test_invalidate(self):
+        self.add_repos('foo')
+        self.add_releases('foo', ('1.0-1', {}))
+        self.set_metadata('foo', '[metadata]\nhomepage = https://foo\n')
+        self.db.name_search('')
+        self.db.get_versions('foo')
+        self.db.get_metadata('foo')
+        self.add_repos('foo', 'bar')
+        self.add_releases('foo', ('1.0-1', {}), ('1.0-2', {}))
+        self.set_metadata('foo', '[metadata]\nhomepage = https://bar\n')
+        self.db.invalidate_repository_list()
+        self.db.invalidate_releases('foo')
+        self.db.invalidate_metadata('foo')
+        self.assertEqual(self.db.name_search(''), ['bar', 'foo'])
+        self.assertEqual(self.db.get_versions('foo'),
+                         [('1.0', 2), ('1.0', 1)])
+        self.assertEqual(self.db.get_metadata('foo').homepage, 'https://bar')
+
+    def test_invalidate_release(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.downloads['https://dl/zip'] = b'old'
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'old')
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip2',
+        }))
+        self.downloads['https://dl/zip2'] = b'new'
+        self.db.invalidate_release('foo', '1.0-1')
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'new')
+
+    def test_get_metadata(self):
+        self.set_metadata('foo', '[metadata]\nhomepage = https://foo\n')
+        meta = self.db.get_metadata('foo')
+        self.assertEqual(meta.homepage, 'https://foo')
+        self.assertIsNone(self.db.get_metadata('bar'))
+
+    def test_stats(self):
+        self.add_releases('foo', ('1.0-1', {}))
+        self.db.get_versions('foo')
+        self.db.get_versions('foo')
+        githubdb._release.cache.clear()  # expire
+        self.db.get_versions('foo')
+        self.add_releases('foo', ('1.0-1', {}), ('1.0-2', {}))
+        githubdb._release.cache.clear()  # expire
+        self.assertEqual(self.db.get_versions('foo'),
+                         [('1.0', 2), ('1.0', 1)])
+        stats = self.db.cache_stats()['release']
+        self.assertEqual(stats.hits, 1)
+        self.assertEqual(stats.revalidations, 1)
+        self.assertEqual(stats.refetches, 2)
+        self.assertEqual(self.requester.statuses(), [200, 304, 200])
+
+    def test_data_version(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.downloads['https://dl/zip'] = b'zip contents'
+        self.db.get_versions('foo')
+        version = self.db.data_version()
+        self.db.get_versions('typo')
+        self.db.get_metadata('typo')
+        self.db.get_zip('foo', '1.0', 1)
+        self.assertEqual(self.db.data_version(), version)
+        self.add_releases('foo', ('1.0-1', {}), ('1.0-2', {}))
+        self.db.invalidate_releases('foo')
+        self.db.get_versions('foo')
+        self.assertGreater(self.db.data_version(), version)
+
+    def test_missing_project(self):
+        self.assertEqual(self.db.get_versions('foo'), [])
+        self.assertIsNone(self.db.get_latest_version('foo'))
+        self.assertIsNone(self.db.get_metadata('foo'))
+        self.assertIsNone(self.db.get_zip('foo', '1.0', 1))
+        self.assertIsNone(self.db.get_zip('foo', '1.0', 1))
+        self.assertEqual(self.requester.statuses(), [404, 404, 404])
+        self.add_releases('foo', ('1.0-1', {}))
+        self.db.invalidate_releases('foo')
+        self.assertEqual(self.db.get_versions('foo'), [('1.0', 1)])
+
+    def test_deleted_project_refreshed(self):
+        self.add_releases('foo', ('1.0-1', {}))
+        self.db.get_versions('foo')
+        self.requester.delete(f'/repos/{self.ORGANIZATION}/foo/releases')
+        refresher = githubdb.start_refresher(interval=1000, margin=0,
+                                             hot=1000, workers=1)
+        self.addCleanup(caching.stop_refresher)
+        self.db.invalidate_releases('foo')
+        refresher.stop()
+        self.assertEqual(self.db.get_versions('foo'), [])
+
+    def test_missing_asset(self):
+        self.add_releases('foo', ('1.0-1', {}))
+        self.assertIsNone(self.db.get_wrap('foo', '1.0', 1))
+        self.assertIsNone(self.db.get_wrap('foo', '1.0', 1))
+        self.assertEqual(self.db.cache_stats()['missing'].negatives, 1)
+        self.assertEqual(self.db.cache_stats()['missing'].hits, 1)
+
+    def test_failed_download_not_cached(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.assertIsNone(self.db.get_zip('foo', '1.0', 1))
+        self.downloads['https://dl/zip'] = b'zip contents'
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'zip contents')
+
+    def test_use_backend(self):
+        githubdb.use_backend('release', 'memory', max_bytes=10000)
+        self.assertEqual(githubdb._release.cache.max_bytes, 10000)
+        self.assertEqual(githubdb._release.ttl, githubdb.CACHE_TTL)
+        self.add_releases('foo', ('1.0-1', {}))
+        self.db.get_versions('foo')
+        self.db.get_versions('foo')
+        stats = self.db.backend_stats()['release']
+        self.assertEqual((stats.gets, stats.sets), (2, 1))
+        with self.assertRaises(ValueError):
+            githubdb.use_backend('nonexistent', 'memory')
+
+    def test_rate_limited_serves_last_value(self):
+        self.add_releases('foo', ('1.0-1', {}))
+        self.set_metadata('foo', '[metadata]\nhomepage = https://foo\n')
+        self.db.get_versions('foo')
+        self.db.get_metadata('foo')
+        self.requester.remaining = 0
+        githubdb._release.cache.clear()  # expire
+        githubdb._metadata.cache.clear()  # expire
+        self.assertEqual(self.db.get_versions('foo'), [('1.0', 1)])
+        self.assertEqual(self.db.get_metadata('foo').homepage, 'https://foo')
+        with self.assertRaises(github.RateLimitExceededException):
+            self.db.get_metadata('bar')  # never fetched
+        self.assertEqual(self.db.cache_stats()['release'].fallbacks, 1)
+        self.assertEqual(self.db.rate_limits()['core'].remaining, 0)
+        # Exhausted budget is known, GitHub is not asked again.
+        self.assertEqual(self.requester.statuses(), [200, 200, 403])
+
+    def test_rate_limited_asset_not_missing(self):
+        self.add_releases('foo', ('1.0-1', {
+            githubdb.PATCH_ZIP_LABEL: 'https://dl/zip',
+        }))
+        self.requester.remaining = 0
+        for call in [self.db.get_wrap, self.db.get_zip]:
+            with self.assertRaises(github.RateLimitExceededException):
+                call('foo', '1.0', 1)
+        with self.assertRaises(github.RateLimitExceededException):
+            self.db.get_asset_info('foo', '1.0', 1, githubdb.PATCH_ZIP_LABEL)
+        self.assertEqual(self.db.cache_stats()['missing'].negatives, 0)
+
+    def test_budget_usage(self):
+        self.add_releases('foo', ('1.0-1', {}))
+        self.db.get_versions('foo')
+        githubdb._release.cache.clear()  # expire
+        self.db.get_versions('foo')
+        usage = self.db.budget_usage()
+        self.assertEqual(usage['release_list'].requests, 2)
+        self.assertEqual(usage['release_list'].revalidated, 1)
+
+    @mock.patch.object(githubgraphql, 'load_catalogue')
+    def test_load_catalogue(self, load_catalogue):
+        load_catalogue.return_value = [
+            githubgraphql.Repository(
+                name='foo',
+                releases=[
+                    githubgraphql.Release(tag='1.0-1', assets=[
+                        githubgraphql.Asset(label=githubdb.PATCH_ZIP_LABEL,
+                                            url='https://dl/zip', size=3),
+                    ]),
+                    githubgraphql.Release(tag='1.1-1', assets=[]),
+                ],
+                metadata='[metadata]\nhomepage = https://foo\n'),
+            githubgraphql.Repository(name='bar', releases=[], metadata=None),
+            githubgraphql.Repository(name='meson', releases=[],
+                                     metadata=None),
+        ]
+        self.db.load_catalogue()
+        self.assertEqual(self.db.name_search(''), ['bar', 'foo'])
+        self.assertEqual(self.db.get_versions('foo'),
+                         [('1.1', 1), ('1.0', 1)])
+        self.assertEqual(self.db.get_metadata('foo').homepage, 'https://foo')
+        self.assertIsNone(self.db.get_metadata('bar'))
+        self.downloads['https://dl/zip'] = b'zip'
+        self.assertEqual(self.db.get_zip('foo', '1.0', 1), b'zip')
+        self.assertEqual(self.requester.requests, [])
+        self.assertLess(githubdb.catalogue_age(), 60)
+
+
+class TicketsTest(testing.GithubTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.search = self._patch_object(github.Github, 'search_issues')
+
+    @staticmethod
+    def issue(number, state='open', minute=0, headers=None):
+        issue = mock.Mock(title=f'issue {number}', raw_headers=headers or {},
+                          html_url=f'https://github.com/issues/{number}',
+                          pull_request=None, state=state,
+                          created_at=datetime.datetime(2020, 1, 1),
+                          updated_at=datetime.datetime(2020, 1, 1, 0, minute))
+        issue.repository.name = 'foo'
+        issue.repository.html_url = 'https://github.com/foo'
+        issue.user.login = 'user'
+        issue.user.html_url = 'https://github.com/user'
+        return issue
+
+    def tickets(self):
+        githubdb._ticket.cache.clear()  # expire
+        return [t.title for t in self.db.get_tickets()]
+
+    def test_incremental(self):
+        self.search.return_value = [self.issue(1), self.issue(2, minute=5)]
+        self.assertEqual(self.tickets(), ['issue 1', 'issue 2'])
+        self.assertIn('is:open', self.search.call_args[0][0])
+        self.search.return_value = [self.issue(1, state='closed', minute=7),
+                                    self.issue(3, minute=8)]
+        self.assertEqual(self.tickets(), ['issue 2', 'issue 3'])
+        query = self.search.call_args[0][0]
+        self.assertIn('updated:>=2020-01-01T00:00:00Z', query)
+        self.assertNotIn('is:open', query)
+        self.search.return_value = []
+        self.assertEqual(self.tickets(), ['issue 2', 'issue 3'])
+        self.assertIn('updated:>=2020-01-01T00:03:00Z',
+                      self.search.call_args[0][0])
+
+    def test_resync(self):
+        self.search.return_value = [self.issue(1)]
+        self.tickets()
+        self.search.return_value = [self.issue(2)]
+        with mock.patch.object(githubdb.time, 'monotonic',
+                               return_value=time.monotonic() +
+                               githubdb.TICKETS_RESYNC):
+            self.assertEqual(self.tickets(), ['issue 2'])
+        self.assertIn('is:open', self.search.call_args[0][0])
+
+    def test_search_budget(self):
+        headers = {'x-ratelimit-resource': 'search',
+                   'x-ratelimit-limit': '30', 'x-ratelimit-remaining': '0',
+                   'x-ratelimit-reset': str(time.time() + 60)}
+        self.search.return_value = [self.issue(1, headers=headers),
+                                    self.issue(2, headers=headers)]
+        self.assertEqual(self.tickets(), ['issue 1', 'issue 2'])
+        self.assertEqual(githubdb.rate_limits()['search'].remaining, 0)
+        self.assertEqual(githubdb.budget_usage()['tickets'].requests, 1)
+        self.assertEqual(self.tickets(), ['issue 1', 'issue 2'])  # fallback
+        self.search.assert_called_once()
+
+
+class OrganizationTest(unittest.TestCase):
+
+    def test_github_per_thread(self):
+        org = githubdb.Organization(github.Github, 'mesonbuild')
+        self.assertIs(org.github, org.github)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(org.github))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], org.github)
+
+    def test_shared_github(self):
+        pygithub = github.Github()
+        org = githubdb.Organization(pygithub, 'mesonbuild')
+        self.assertIs(org.github, pygithub)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Bulk catalogue loading through GitHub GraphQL API.
+
+A single query returns a page of repositories together with their
+releases, release assets and metadata.wrap, replacing several REST round
+trips per project.
+"""
+
+import dataclasses
+from typing import Any, Dict, Iterator, List, Optional
+
+from mesonwrap import githubrest
+
+REPOSITORIES_PER_PAGE = 50
+RELEASES_PER_PAGE = 100
+ASSETS_PER_RELEASE = 10
+
+# GraphQL does not expose asset labels, map them from file names
+# given to assets by mesonwrap publish.
+_LABELS = {
+    '.wrap': 'upstream.wrap',
+    '.zip': 'patch.zip',
+}
+
+_RELEASES = '''
+releases(first: %d, after: $releasesCursor) {
+  pageInfo { hasNextPage endCursor }
+  nodes {
+    tagName
+    releaseAssets(first: %d) {
+      nodes { name downloadUrl size }
+    }
+  }
+}
+''' % (RELEASES_PER_PAGE, ASSETS_PER_RELEASE)
+
+_REPOSITORIES_QUERY = '''
+query($org: String!, $cursor: String, $releasesCursor: String) {
+  organization(login: $org) {
+    repositories(first: %d, after: $cursor,
+                 orderBy: {field: NAME, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        metadata: object(expression: "HEAD:metadata.wrap") {
+          ... on Blob { text }
+        }
+        %s
+      }
+    }
+  }
+}
+''' % (REPOSITORIES_PER_PAGE, _RELEASES)
+
+_RELEASES_QUERY = '''
+query($org: String!, $name: String!, $releasesCursor: String) {
+  repository(owner: $org, name: $name) {
+    %s
+  }
+}
+''' % _RELEASES
+
+
+@dataclasses.dataclass(frozen=True)
+class Asset:
+
+    label: str
+    url: str
+    size: int
+
+
+@dataclasses.dataclass(frozen=True)
+class Release:
+
+    tag: str
+    assets: List[Asset]
+
+
+@dataclasses.dataclass(frozen=True)
+class Repository:
+
+    name: str
+    releases: List[Release]
+    metadata: Optional[str]
+
+
+def _label(name: str) -> str:
+    for suffix, label in _LABELS.items():
+        if name.endswith(suffix):
+            return label
+    return name
+
+
+def _releases(connection: Dict[str, Any]) -> Iterator[Release]:
+    for node in connection['nodes']:
+        yield Release(
+            tag=node['tagName'],
+            assets=[Asset(label=_label(asset['name']),
+                          url=asset['downloadUrl'],
+                          size=asset['size'])
+                    for asset in node['releaseAssets']['nodes']])
+
+
+def _query(requester, budget: Optional[githubrest.Budget], query: str,
+           variables: Dict[str, Any]) -> Dict[str, Any]:
+    if budget is not None:
+        budget.check('graphql')
+    headers, data = requester.graphql_query(query, variables)
+    if budget is not None:
+        budget.update(headers, 'load_catalogue')
+    return data
+
+
+def _remaining_releases(requester, budget: Optional[githubrest.Budget],
+                        organization: str, name: str,
+                        connection: Dict[str, Any]) -> Iterator[Release]:
+    while connection['pageInfo']['hasNextPage']:
+        data = _query(requester, budget, _RELEASES_QUERY, {
+            'org': organization,
+            'name': name,
+            'releasesCursor': connection['pageInfo']['endCursor'],
+        })
+        connection = data['data']['repository']['releases']
+        yield from _releases(connection)
+
+
+def load_catalogue(requester, organization: str,
+                   budget: Optional[githubrest.Budget] = None,
+                   ) -> Iterator[Repository]:
+    """Yields all repositories of the organization.
+
+    Costs one query per REPOSITORIES_PER_PAGE repositories, plus one per
+    extra page of releases for projects with many releases.
+    """
+    cursor = None
+    while True:
+        data = _query(requester, budget, _REPOSITORIES_QUERY, {
+            'org': organization,
+            'cursor': cursor,
+            'releasesCursor': None,
+        })
+        repositories = data['data']['organization']['repositories']
+        for node in repositories['nodes']:
+            releases = list(_releases(node['releases']))
+            releases.extend(_remaining_releases(
+                requester, budget, organization, node['name'],
+                node['releases']))
+            metadata = node['metadata']
+            yield Repository(name=node['name'],
+                             releases=releases,
+                             metadata=metadata['text'] if metadata else None)
+        if not repositories['pageInfo']['hasNextPage']:
+            return
+        cursor = repositories['pageInfo']['endCursor']
@@ -0,0 +1,67 @@
+import unittest
+
+from mesonwrap import githubgraphql
+
+
+class FakeRequester:
+
+    def __init__(self, *responses):
+        self._responses = list(responses)
+        self.variables = []
+
+    def graphql_query(self, query, variables):
+        self.variables.append(variables)
+        return {}, {'data': self._responses.pop(0)}
+
+
+def page(nodes, cursor=None):
+    return dict(nodes=nodes,
+                pageInfo=dict(hasNextPage=cursor is not None,
+                              endCursor=cursor))
+
+
+def release(tag, *assets):
+    return dict(tagName=tag, releaseAssets=dict(nodes=[
+        dict(name=name, downloadUrl='https://dl/' + name, size=1)
+        for name in assets
+    ]))
+
+
+class LoadCatalogueTest(unittest.TestCase):
+
+    def test_load(self):
+        requester = FakeRequester(
+            dict(organization=dict(repositories=page([
+                dict(name='foo', metadata=dict(text='[metadata]'),
+                     releases=page([release('1.0-1', 'foo.wrap', 'foo.zip')],
+                                   cursor='r1')),
+            ], cursor='c1'))),
+            dict(repository=dict(releases=page([release('0.9-1')]))),
+            dict(organization=dict(repositories=page([
+                dict(name='bar', metadata=None, releases=page([])),
+            ]))),
+        )
+        repos = list(githubgraphql.load_catalogue(requester, 'mesonbuild'))
+        self.assertEqual(repos, [
+            githubgraphql.Repository(
+                name='foo',
+                releases=[
+                    githubgraphql.Release(tag='1.0-1', assets=[
+                        githubgraphql.Asset(label='upstream.wrap',
+                                            url='https://dl/foo.wrap',
+                                            size=1),
+                        githubgraphql.Asset(label='patch.zip',
+                                            url='https://dl/foo.zip',
+                                            size=1),
+                    ]),
+                    githubgraphql.Release(tag='0.9-1', assets=[]),
+                ],
+                metadata='[metadata]'),
+            githubgraphql.Repository(name='bar', releases=[], metadata=None),
+        ])
+        self.assertEqual(requester.variables[1]['releasesCursor'], 'r1')
+        self.assertEqual(requester.variables[2]['cursor'], 'c1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,256 @@
+"""Conditional GitHub REST requests.
+
+GitHub answers a request carrying a matching If-None-Match or
+If-Modified-Since validator with 304 Not Modified, which does not count
+against the rate limit. Client remembers validators and the last body of
+every resource it reads and revalidates them instead of refetching.
+
+https://developer.github.com/v3/#conditional-requests
+"""
+
+import dataclasses
+import json
+import threading
+import time
+from typing import Any, Dict, MutableMapping, Optional, Tuple
+
+import cachetools
+import github
+import requests
+
+from mesonwrap import caching
+
+
+VALIDATORS_SIZE = 10000
+# Bound of the stored bodies, measured as their JSON size.
+VALIDATORS_BYTES = 32 * 1024 * 1024
+PER_PAGE = 100
+# Background refreshes are suspended below this share of the rate limit.
+RESERVE = 0.25
+
+
+@dataclasses.dataclass(frozen=True)
+class Response:
+
+    data: Any
+    # True if GitHub confirmed the previously stored data is still valid.
+    revalidated: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class _Entry:
+
+    etag: Optional[str]
+    last_modified: Optional[str]
+    next_url: Optional[str]
+    data: Any
+    # Length of the JSON body.
+    size: int = 0
+
+
+class ValidatorStore:
+    """Thread-safe LRU mapping URL to its validators and last body.
+
+    Bodies of list resources are large, so the store is bounded by their
+    total size rather than by the number of URLs.
+    """
+
+    def __init__(self, max_bytes: int = VALIDATORS_BYTES):
+        self._lock = threading.Lock()
+        self._entries = cachetools.LRUCache(
+            maxsize=max_bytes, getsizeof=lambda entry: max(entry.size, 1))
+
+    def use(self, entries: MutableMapping) -> None:
+        """Replaces underlying storage, entries are not migrated."""
+        with self._lock:
+            self._entries = entries
+
+    def get(self, url: str) -> Optional[_Entry]:
+        entries = self._entries
+        with caching.guard(entries, self._lock):
+            return entries.get(url)
+
+    def put(self, url: str, entry: _Entry) -> None:
+        entries = self._entries
+        with caching.guard(entries, self._lock):
+            entries[url] = entry
+
+    def clear(self) -> None:
+        entries = self._entries
+        with caching.guard(entries, self._lock):
+            entries.clear()
+
+
+class BudgetExhausted(github.RateLimitExceededException):
+    """Raised instead of sending a request which would be rejected."""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    if isinstance(error, github.RateLimitExceededException):
+        return True
+    return isinstance(error, github.GithubException) and error.status == 429
+
+
+@dataclasses.dataclass
+class Limit:
+
+    limit: int
+    remaining: int
+    reset: float  # seconds since epoch
+
+
+@dataclasses.dataclass
+class Usage:
+
+    requests: int = 0
+    # Requests answered with 304 Not Modified, free against the rate limit.
+    revalidated: int = 0
+
+
+class Budget:
+    """Tracks GitHub rate limit and its usage by calling function.
+
+    GitHub reports the limit of each resource (core, graphql, search)
+    in X-RateLimit-* headers of every response.
+    """
+
+    def __init__(self, reserve: float = RESERVE, timer=time.time):
+        self.reserve = reserve
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._limits: Dict[str, Limit] = dict()
+        self._usage: Dict[str, Usage] = dict()
+
+    def update(self, headers: Dict[str, str], caller: str,
+               revalidated: bool = False) -> None:
+        with self._lock:
+            usage = self._usage.setdefault(caller, Usage())
+            usage.requests += 1
+            if revalidated:
+                usage.revalidated += 1
+            if 'x-ratelimit-remaining' not in headers:
+                return
+            resource = headers.get('x-ratelimit-resource', 'core')
+            self._limits[resource] = Limit(
+                limit=int(headers.get('x-ratelimit-limit', 0)),
+                remaining=int(headers['x-ratelimit-remaining']),
+                reset=float(headers.get('x-ratelimit-reset', 0)))
+
+    def _current(self, resource: str) -> Optional[Limit]:
+        limit = self._limits.get(resource)
+        if limit is None or limit.reset <= self._timer():
+            return None  # unknown or already reset
+        return limit
+
+    def check(self, resource: str = 'core') -> None:
+        """Raises BudgetExhausted if requests would be rejected."""
+        with self._lock:
+            limit = self._current(resource)
+            if limit is not None and limit.remaining <= 0:
+                raise BudgetExhausted(
+                    403, {'message': f'{resource} budget exhausted until '
+                                     f'{time.ctime(limit.reset)}'}, {})
+
+    def throttled(self, resource: str = 'core') -> bool:
+        """Returns True if non-essential requests should be postponed."""
+        with self._lock:
+            limit = self._current(resource)
+            return (limit is not None and
+                    limit.remaining < limit.limit * self.reserve)
+
+    def limits(self) -> Dict[str, Limit]:
+        with self._lock:
+            return {resource: dataclasses.replace(limit)
+                    for resource, limit in self._limits.items()}
+
+    def usage(self) -> Dict[str, Usage]:
+        with self._lock:
+            return {caller: dataclasses.replace(usage)
+                    for caller, usage in self._usage.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._limits.clear()
+            self._usage.clear()
+
+
+def requester(pygithub: github.Github):
+    """Returns PyGithub Requester of pygithub."""
+    try:
+        return pygithub.requester
+    except AttributeError:  # PyGithub < 2.0
+        return pygithub._Github__requester
+
+
+def _next_url(link: Optional[str]) -> Optional[str]:
+    if not link:
+        return None
+    for item in requests.utils.parse_header_links(link):
+        if item.get('rel') == 'next':
+            return item['url']
+    return None
+
+
+def _decode(output: str) -> Any:
+    if not output:
+        return None
+    return json.loads(output)
+
+
+class Client:
+
+    def __init__(self, requester, store: ValidatorStore, budget: Budget,
+                 caller: str):
+        self._requester = requester
+        self._store = store
+        self._budget = budget
+        self._caller = caller
+
+    def _request(self, url: str) -> Tuple[_Entry, bool]:
+        entry = self._store.get(url)
+        headers: Dict[str, str] = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        self._budget.check()
+        status, response_headers, output = self._requester.requestJson(
+            'GET', url, headers=headers)
+        self._budget.update(response_headers, self._caller,
+                            revalidated=status == 304)
+        if status == 304 and entry is not None:
+            return entry, True
+        if status >= 400 or status == 304:
+            raise self._requester.createException(
+                status, response_headers, _decode(output))
+        entry = _Entry(etag=response_headers.get('etag'),
+                       last_modified=response_headers.get('last-modified'),
+                       next_url=_next_url(response_headers.get('link')),
+                       data=_decode(output),
+                       size=len(output or ''))
+        try:
+            self._store.put(url, entry)
+        except ValueError:
+            pass  # body too large
+        return entry, False
+
+    def get(self, url: str) -> Response:
+        entry, revalidated = self._request(url)
+        return Response(data=entry.data, revalidated=revalidated)
+
+    def get_paginated(self, url: str) -> Response:
+        """Fetches and concatenates all pages of a list resource.
+
+        Every page is revalidated separately, the result is revalidated
+        only if none of the pages has changed.
+        """
+        url += ('&' if '?' in url else '?') + f'per_page={PER_PAGE}'
+        data = []
+        revalidated = True
+        while url:
+            entry, page_revalidated = self._request(url)
+            revalidated = revalidated and page_revalidated
+            data.extend(entry.data)
+            url = entry.next_url
+        return Response(data=data, revalidated=revalidated)
@@ -0,0 +1,150 @@
+import unittest
+
+import github
+
+from mesonwrap import githubrest
+from mesonwrap import testing
+
+
+class ClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.requester = testing.FakeRequester()
+        self.store = githubrest.ValidatorStore()
+        self.budget = githubrest.Budget()
+        self.client = githubrest.Client(self.requester, self.store,
+                                        self.budget, 'test')
+
+    def test_get(self):
+        self.requester.set('/a', dict(x=1))
+        rv = self.client.get('/a')
+        self.assertEqual(rv.data, dict(x=1))
+        self.assertFalse(rv.revalidated)
+
+    def test_revalidate(self):
+        self.requester.set('/a', dict(x=1))
+        self.client.get('/a')
+        rv = self.client.get('/a')
+        self.assertEqual(rv.data, dict(x=1))
+        self.assertTrue(rv.revalidated)
+        self.assertEqual(self.requester.statuses(), [200, 304])
+
+    def test_changed(self):
+        self.requester.set('/a', dict(x=1))
+        self.client.get('/a')
+        self.requester.set('/a', dict(x=2))
+        rv = self.client.get('/a')
+        self.assertEqual(rv.data, dict(x=2))
+        self.assertFalse(rv.revalidated)
+
+    def test_store_bounded_by_bytes(self):
+        self.client = githubrest.Client(
+            self.requester, githubrest.ValidatorStore(max_bytes=100),
+            self.budget, 'test')
+        self.requester.set('/a', 'x' * 40)
+        self.requester.set('/b', 'x' * 40)
+        self.requester.set('/c', 'x' * 40)
+        self.requester.set('/large', 'x' * 200)
+        for url in ['/a', '/b', '/large', '/a', '/c']:
+            self.client.get(url)
+        self.assertFalse(self.client.get('/large').revalidated)
+        self.assertTrue(self.client.get('/a').revalidated)
+        self.assertFalse(self.client.get('/b').revalidated)  # evicted
+
+    def test_not_found(self):
+        with self.assertRaises(github.UnknownObjectException):
+            self.client.get('/a')
+
+    def test_paginated(self):
+        self.requester.set('/a', [1, 2], next_url='/a?page=2')
+        self.requester.set('/a?page=2', [3])
+        rv = self.client.get_paginated('/a')
+        self.assertEqual(rv.data, [1, 2, 3])
+        self.assertFalse(rv.revalidated)
+        rv = self.client.get_paginated('/a')
+        self.assertEqual(rv.data, [1, 2, 3])
+        self.assertTrue(rv.revalidated)
+
+    def test_paginated_one_page_changed(self):
+        self.requester.set('/a', [1, 2], next_url='/a?page=2')
+        self.requester.set('/a?page=2', [3])
+        self.client.get_paginated('/a')
+        self.requester.set('/a?page=2', [4])
+        rv = self.client.get_paginated('/a')
+        self.assertEqual(rv.data, [1, 2, 4])
+        self.assertFalse(rv.revalidated)
+        self.assertEqual(self.requester.statuses(), [200, 200, 304, 200])
+
+    def test_budget_usage(self):
+        self.requester.set('/a', dict(x=1))
+        self.client.get('/a')
+        self.client.get('/a')
+        self.assertEqual(self.budget.usage(),
+                         dict(test=githubrest.Usage(requests=2,
+                                                    revalidated=1)))
+
+    def test_budget_limits(self):
+        self.requester.remaining = 10
+        self.requester.set('/a', dict(x=1))
+        self.client.get('/a')
+        self.assertEqual(self.budget.limits(), dict(core=githubrest.Limit(
+            limit=5000, remaining=9, reset=self.requester.reset)))
+
+    def test_rate_limit_exceeded(self):
+        self.requester.remaining = 0
+        self.requester.set('/a', dict(x=1))
+        with self.assertRaises(github.RateLimitExceededException):
+            self.client.get('/a')
+        # The budget now knows it is exhausted, no request is sent.
+        with self.assertRaises(githubrest.BudgetExhausted):
+            self.client.get('/a')
+        self.assertEqual(self.requester.statuses(), [403])
+
+
+class BudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = testing.FakeTimer()
+        self.budget = githubrest.Budget(reserve=0.25, timer=self.timer)
+
+    def _update(self, remaining, resource='core', reset=2000):
+        self.budget.update({'x-ratelimit-limit': '100',
+                            'x-ratelimit-remaining': str(remaining),
+                            'x-ratelimit-reset': str(reset),
+                            'x-ratelimit-resource': resource}, 'test')
+
+    def test_unknown(self):
+        self.budget.check()
+        self.assertFalse(self.budget.throttled())
+
+    def test_throttled(self):
+        self._update(remaining=25)
+        self.assertFalse(self.budget.throttled())
+        self._update(remaining=24)
+        self.assertTrue(self.budget.throttled())
+        self.assertFalse(self.budget.throttled('graphql'))
+        self.budget.check()
+
+    def test_exhausted(self):
+        self._update(remaining=0, resource='graphql')
+        self.budget.check('core')
+        with self.assertRaises(githubrest.BudgetExhausted):
+            self.budget.check('graphql')
+
+    def test_reset(self):
+        self._update(remaining=0, reset=2000)
+        self.timer.now = 2000
+        self.budget.check()
+        self.assertFalse(self.budget.throttled())
+
+    def test_is_rate_limit_error(self):
+        self.assertTrue(githubrest.is_rate_limit_error(
+            githubrest.BudgetExhausted(403, {}, {})))
+        self.assertTrue(githubrest.is_rate_limit_error(
+            github.GithubException(429, {}, {})))
+        self.assertFalse(githubrest.is_rate_limit_error(
+            github.UnknownObjectException(404, {}, {})))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -107,6 +107,13 @@ class IniFile(metaclass=_IniMeta):
         self._cfg.write(sio)
         return sio.getvalue()
 
+    def __eq__(self, other) -> bool:
+        if type(self) is not type(other):
+            return NotImplemented
+        return self.write_string() == other.write_string()
+
+    __hash__ = None
+
     def has(self, attr: str) -> bool:
         # TODO: Python 3.8 make positional only
         return getattr(self, 'has_' + attr)
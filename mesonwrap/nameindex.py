@@ -0,0 +1,53 @@
+"""Sorted index of project names answering prefix queries."""
+
+import bisect
+from typing import Iterable, Iterator, List
+
+
+class NameIndex:
+    """Immutable sorted set of names.
+
+    Prefix queries cost O(log n) plus the size of the result, membership
+    tests are O(1).
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._names = sorted(set(names))
+        self._set = frozenset(self._names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._set
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, NameIndex):
+            return self._names == other._names
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'NameIndex({self._names!r})'
+
+    def __getstate__(self):
+        return self._names
+
+    def __setstate__(self, names: List[str]):
+        self._names = names
+        self._set = frozenset(names)
+
+    def names(self) -> List[str]:
+        """Returns all names, sorted."""
+        return list(self._names)
+
+    def prefix(self, text: str) -> List[str]:
+        """Returns sorted names starting with text."""
+        if not text:
+            return list(self._names)
+        start = bisect.bisect_left(self._names, text)
+        # Every name starting with text sorts before text + U+10FFFF.
+        end = bisect.bisect_left(self._names, text + '\U0010ffff', lo=start)
+        return self._names[start:end]
@@ -0,0 +1,32 @@
+import pickle
+import unittest
+
+from mesonwrap import nameindex
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = nameindex.NameIndex(['foobar', 'bar', 'foo', 'fop', 'f'])
+
+    def test_prefix(self):
+        self.assertEqual(self.index.prefix(''),
+                         ['bar', 'f', 'foo', 'foobar', 'fop'])
+        self.assertEqual(self.index.prefix('foo'), ['foo', 'foobar'])
+        self.assertEqual(self.index.prefix('fo'), ['foo', 'foobar', 'fop'])
+        self.assertEqual(self.index.prefix('z'), [])
+        self.assertEqual(self.index.prefix('a'), [])
+
+    def test_contains(self):
+        self.assertIn('foo', self.index)
+        self.assertNotIn('fo', self.index)
+        self.assertEqual(len(self.index), 5)
+
+    def test_pickle(self):
+        index = pickle.loads(pickle.dumps(self.index))
+        self.assertEqual(index, self.index)
+        self.assertIn('foo', index)
+
+
+if __name__ == '__main__':
+    unittest.main()
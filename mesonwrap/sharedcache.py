@@ -0,0 +1,185 @@
+"""Cache shared by all processes of a host.
+
+Entries are kept in an SQLite database, so every wrapweb worker, including
+restarted and newly forked ones, sees values computed by any other worker.
+"""
+
+import ast
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable, Iterator, Optional, Tuple
+
+import cachetools
+
+from mesonwrap import cachebackend
+from mesonwrap import sqlitedb
+
+
+FILENAME = 'cache.sqlite3'
+MEMO_SIZE = 1000
+_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS entries (
+        cache TEXT NOT NULL,
+        key TEXT NOT NULL,
+        stamp INTEGER NOT NULL,
+        stored REAL NOT NULL,
+        expires REAL,
+        value BLOB NOT NULL,
+        PRIMARY KEY (cache, key)
+    )''',
+    'CREATE INDEX IF NOT EXISTS entries_stored ON entries (cache, stored)',
+]
+
+
+def _encode_key(key: Hashable) -> str:
+    if isinstance(key, tuple):
+        key = tuple(key)  # drop cachetools hashkey type
+    return repr(key)
+
+
+def _decode_key(key: str) -> Hashable:
+    return ast.literal_eval(key)
+
+
+class SharedCache:
+
+    def __init__(self, directory: str, timer=time.time):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, FILENAME)
+        self.timer = timer
+        self._database = sqlitedb.Database(self.path, _SCHEMA)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Returns connection owned by current thread and process."""
+        return self._database.connection
+
+    def mapping(self, name: str, ttl: Optional[float] = None,
+                maxsize: Optional[int] = None,
+                max_bytes: Optional[int] = None) -> 'SharedMapping':
+        return SharedMapping(self, name, ttl, maxsize, max_bytes)
+
+
+class SharedMapping(cachebackend.Backend):
+    """Mapping view of a single named cache in SharedCache.
+
+    Unpickled values are memoized until another process replaces them,
+    so repeated lookups return the same object.
+    """
+
+    errors = (sqlite3.Error, pickle.UnpicklingError, EOFError)
+    pickled = True
+
+    def __init__(self, store: SharedCache, name: str,
+                 ttl: Optional[float], maxsize: Optional[int],
+                 max_bytes: Optional[int] = None):
+        super().__init__(ttl=ttl, maxsize=maxsize, max_bytes=max_bytes)
+        self._store = store
+        self.name = name
+        # key -> (stamp, value, size)
+        self._memo = cachetools.LRUCache(maxsize=maxsize or MEMO_SIZE)
+        self._memo_lock = threading.Lock()
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        return self._store.connection
+
+    def _get(self, key: Hashable) -> Tuple[Any, int]:
+        k = _encode_key(key)
+        with self._memo_lock:
+            memo = self._memo.get(k)
+        row = self._db.execute(
+            '''SELECT stamp, expires,
+                      CASE WHEN stamp = ? THEN NULL ELSE value END
+               FROM entries WHERE cache = ? AND key = ?''',
+            (memo[0] if memo else None, self.name, k)).fetchone()
+        if row is None:
+            with self._memo_lock:
+                self._memo.pop(k, None)
+            raise KeyError(key)
+        stamp, expires, value = row
+        if expires is not None and expires <= self._store.timer():
+            with self._memo_lock:
+                self._memo.pop(k, None)
+            raise KeyError(key)
+        if memo is not None and memo[0] == stamp:
+            return memo[1], memo[2]
+        size = len(value)
+        value = pickle.loads(value)
+        with self._memo_lock:
+            self._memo[k] = (stamp, value, size)
+        return value, size
+
+    def _set(self, key: Hashable, value: Any, data: Optional[bytes],
+             size: int) -> None:
+        k = _encode_key(key)
+        now = self._store.timer()
+        stamp = random.getrandbits(63)
+        expires = now + self.ttl if self.ttl is not None else None
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                '''INSERT OR REPLACE INTO entries
+                   (cache, key, stamp, stored, expires, value)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (self.name, k, stamp, now, expires, data))
+            db.execute('DELETE FROM entries WHERE cache = ? AND expires <= ?',
+                       (self.name, now))
+            if self.maxsize is not None:
+                db.execute(
+                    '''DELETE FROM entries WHERE cache = ? AND key IN (
+                           SELECT key FROM entries WHERE cache = ?
+                           ORDER BY stored DESC LIMIT -1 OFFSET ?)''',
+                    (self.name, self.name, self.maxsize))
+            if self.max_bytes is not None:
+                db.execute(
+                    '''DELETE FROM entries WHERE cache = ? AND key IN (
+                           SELECT key FROM (
+                               SELECT key, SUM(LENGTH(value)) OVER (
+                                   ORDER BY stored DESC) AS total
+                               FROM entries WHERE cache = ?)
+                           WHERE total > ?)''',
+                    (self.name, self.name, self.max_bytes))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        with self._memo_lock:
+            self._memo[k] = (stamp, value, len(data))
+
+    def _delete(self, key: Hashable) -> bool:
+        k = _encode_key(key)
+        with self._memo_lock:
+            self._memo.pop(k, None)
+        cursor = self._db.execute(
+            'DELETE FROM entries WHERE cache = ? AND key = ?', (self.name, k))
+        return cursor.rowcount > 0
+
+    @property
+    def currsize(self) -> int:
+        total, = self._db.execute(
+            '''SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries
+               WHERE cache = ?''', (self.name,)).fetchone()
+        return total
+
+    def _keys(self):
+        return self._db.execute(
+            '''SELECT key FROM entries WHERE cache = ?
+               AND (expires IS NULL OR expires > ?)''',
+            (self.name, self._store.timer())).fetchall()
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter([_decode_key(k) for k, in self._keys()])
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def clear(self) -> None:
+        with self._memo_lock:
+            self._memo.clear()
+        self._db.execute('DELETE FROM entries WHERE cache = ?', (self.name,))
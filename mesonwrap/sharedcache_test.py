@@ -0,0 +1,92 @@
+import unittest
+
+from mesonwrap import githubdb
+from mesonwrap import sharedcache
+from mesonwrap import tempfile
+from mesonwrap import testing
+
+
+class SharedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+        self.timer = testing.FakeTimer()
+
+    def store(self):
+        """Returns new store, as if opened by another process."""
+        return sharedcache.SharedCache(self._tmpdir.name, timer=self.timer)
+
+    def test_shared(self):
+        a = self.store().mapping('cache')
+        b = self.store().mapping('cache')
+        a['key'] = [1, 2]
+        self.assertEqual(b['key'], [1, 2])
+        b['key'] = [3]
+        self.assertEqual(a['key'], [3])
+        del a['key']
+        self.assertNotIn('key', b)
+
+    def test_names(self):
+        store = self.store()
+        store.mapping('a')['key'] = 1
+        self.assertNotIn('key', store.mapping('b'))
+
+    def test_tuple_keys(self):
+        a = self.store().mapping('cache')
+        a[('foo', 1)] = 'x'
+        self.assertEqual(a[('foo', 1)], 'x')
+        self.assertEqual(list(a), [('foo', 1)])
+
+    def test_memoized(self):
+        a = self.store().mapping('cache')
+        b = self.store().mapping('cache')
+        a['key'] = [1]
+        value = b['key']
+        self.assertIs(b['key'], value)
+
+    def test_ttl(self):
+        a = self.store().mapping('cache', ttl=10)
+        a['key'] = 'value'
+        self.timer.now += 9
+        self.assertEqual(a['key'], 'value')
+        self.timer.now += 1
+        self.assertNotIn('key', a)
+        self.assertEqual(len(a), 0)
+
+    def test_maxsize(self):
+        a = self.store().mapping('cache', maxsize=2)
+        for i in range(3):
+            self.timer.now += 1
+            a[i] = i
+        self.assertCountEqual(a, [1, 2])
+
+    def test_clear(self):
+        a = self.store().mapping('cache')
+        a['key'] = 'value'
+        self.store().mapping('cache').clear()
+        self.assertEqual(len(a), 0)
+
+
+class GithubDBSharedCacheTest(testing.GithubTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+
+    def use_new_store(self):
+        githubdb.use_shared_cache(
+            sharedcache.SharedCache(self._tmpdir.name))
+
+    def test_warm_after_restart(self):
+        self.add_releases('foo', ('1.0-1', {}))
+        self.use_new_store()
+        self.assertEqual(self.db.get_versions('foo'), [('1.0', 1)])
+        self.use_new_store()
+        self.assertEqual(self.db.get_versions('foo'), [('1.0', 1)])
+        self.assertEqual(self.requester.statuses(), [200])
+
+
+if __name__ == '__main__':
+    unittest.main()
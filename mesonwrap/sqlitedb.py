@@ -0,0 +1,37 @@
+"""SQLite databases shared by all processes of a host."""
+
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+# Seconds to wait for locks held by other processes.
+TIMEOUT = 30
+
+
+class Database:
+    """SQLite database in WAL mode, connected once per thread and process.
+
+    Connections are in autocommit mode, transactions are explicit.
+    """
+
+    def __init__(self, path: str, schema: Iterable[str]):
+        self.path = path
+        self._local = threading.local()
+        # Do not keep this connection, it must not be inherited by fork().
+        with sqlite3.connect(path, timeout=TIMEOUT) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in schema:
+                conn.execute(statement)
+        conn.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Returns connection owned by current thread and process."""
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.connection = sqlite3.connect(
+                self.path, timeout=TIMEOUT, isolation_level=None)
+            self._local.connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.pid = pid
+        return self._local.connection
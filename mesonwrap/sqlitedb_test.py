@@ -0,0 +1,37 @@
+import os
+import threading
+import unittest
+
+from mesonwrap import sqlitedb
+from mesonwrap import tempfile
+
+
+class DatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+        self.db = sqlitedb.Database(
+            os.path.join(self._tmpdir.name, 'test.sqlite3'),
+            ['CREATE TABLE IF NOT EXISTS t (v INTEGER)'])
+
+    def test_connection_per_thread(self):
+        conn = self.db.connection
+        self.assertIs(self.db.connection, conn)
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(self.db.connection))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_schema_and_wal(self):
+        conn = self.db.connection
+        conn.execute('INSERT INTO t VALUES (1)')  # autocommit
+        self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone(),
+                         ('wal',))
+        self.assertEqual(conn.execute('SELECT v FROM t').fetchall(), [(1,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import base64
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+import unittest
+from unittest import mock
+import urllib.parse
+
+import github
+
+from mesonwrap import githubdb
+from mesonwrap import githubrest
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRequester:
+    """In-memory GitHub REST API honoring conditional requests."""
+
+    def __init__(self):
+        # url -> (headers, body)
+        self._resources: Dict[str, Tuple[Dict[str, str], str]] = dict()
+        # (url, status) of every request
+        self.requests: List[Tuple[str, int]] = []
+        # Simulated core rate limit, not reported if None.
+        self.remaining: Optional[int] = None
+        self.limit = 5000
+        self.reset = 2 ** 32
+
+    @staticmethod
+    def _normalize(url: str) -> str:
+        parts = urllib.parse.urlsplit(url)
+        query = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query)
+                 if k != 'per_page']
+        url = parts.path
+        if query:
+            url += '?' + urllib.parse.urlencode(query)
+        return url
+
+    def set(self, url: str, data: Any, next_url: Optional[str] = None):
+        body = json.dumps(data)
+        headers = {'etag': '"' + hashlib.sha1(body.encode()).hexdigest() + '"'}
+        if next_url:
+            headers['link'] = f'<https://api.github.com{next_url}>; rel="next"'
+        self._resources[self._normalize(url)] = (headers, body)
+
+    def delete(self, url: str):
+        del self._resources[self._normalize(url)]
+
+    def requestJson(self, verb, url, parameters=None, headers=None,
+                    input=None):
+        assert verb == 'GET'
+        url = self._normalize(url)
+        if self.remaining is not None:
+            return self._limited(url, headers)
+        return self._request(url, headers)
+
+    def _limited(self, url, headers):
+        if self.remaining <= 0:
+            self.requests.append((url, 403))
+            return 403, self._rate_limit_headers(), json.dumps(
+                {'message': 'API rate limit exceeded'})
+        status, response_headers, body = self._request(url, headers)
+        if status != 304:
+            self.remaining -= 1
+        response_headers.update(self._rate_limit_headers())
+        return status, response_headers, body
+
+    def _rate_limit_headers(self) -> Dict[str, str]:
+        return {'x-ratelimit-limit': str(self.limit),
+                'x-ratelimit-remaining': str(self.remaining),
+                'x-ratelimit-reset': str(self.reset),
+                'x-ratelimit-resource': 'core'}
+
+    def _request(self, url, headers):
+        if url not in self._resources:
+            self.requests.append((url, 404))
+            return 404, {}, json.dumps({'message': 'Not Found'})
+        response_headers, body = self._resources[url]
+        etag = response_headers['etag']
+        if headers and headers.get('If-None-Match') == etag:
+            self.requests.append((url, 304))
+            return 304, dict(response_headers), ''
+        self.requests.append((url, 200))
+        return 200, dict(response_headers), body
+
+    createException = github.Requester.Requester.createException
+
+    def statuses(self) -> List[int]:
+        return [status for _, status in self.requests]
+
+
+class GithubTestBase(unittest.TestCase):
+
+    ORGANIZATION = 'mesonbuild'
+
+    def _patch_object(self, module, name, *args, **kwargs):
+        patcher = mock.patch.object(module, name, *args, **kwargs)
+        obj = patcher.start()
+        self.addCleanup(patcher.stop)
+        return obj
+
+    def setUp(self):
+        super().setUp()
+        githubdb.clear_caches()
+        self.addCleanup(githubdb.clear_caches)
+        self._save_storage()
+        self.requester = FakeRequester()
+        self._patch_object(githubrest, 'requester',
+                           return_value=self.requester)
+        self.downloads: Dict[str, bytes] = dict()
+        self._patch_object(githubdb.requests, 'get',
+                           side_effect=self._download)
+        self.db = githubdb.GithubDB(github.Github(), self.ORGANIZATION)
+
+    def _save_storage(self):
+        """Restores cache storage replaced by the test."""
+        previous = [(cache, cache.cache)
+                    for cache in githubdb._caches + [githubdb._missing]]
+        previous_validators = githubdb._validators._entries
+
+        def restore():
+            for cache, storage in previous:
+                cache.use(storage)
+            githubdb._validators.use(previous_validators)
+        self.addCleanup(restore)
+
+    def _download(self, url, **kwargs):
+        rv = mock.MagicMock()
+        rv.__enter__.return_value = rv
+        if url in self.downloads:
+            rv.content = self.downloads[url]
+        else:
+            rv.raise_for_status.side_effect = OSError(404, url)
+        return rv
+
+    def add_repos(self, *names: str):
+        self.requester.set(f'/orgs/{self.ORGANIZATION}/repos',
+                           [dict(name=name) for name in names])
+
+    def add_releases(self, project: str, *releases):
+        """Adds releases given as (tag, {label: browser_download_url})."""
+        self.requester.set(
+            f'/repos/{self.ORGANIZATION}/{project}/releases',
+            [self._release(tag, assets) for tag, assets in releases])
+        for tag, assets in releases:
+            self.requester.set(
+                f'/repos/{self.ORGANIZATION}/{project}/releases/tags/{tag}',
+                self._release(tag, assets))
+
+    @staticmethod
+    def _release(tag, assets):
+        return dict(tag_name=tag,
+                    assets=[dict(label=label, browser_download_url=url,
+                                 size=0)
+                            for label, url in assets.items()])
+
+    def set_metadata(self, project: str, content: str):
+        self.requester.set(
+            f'/repos/{self.ORGANIZATION}/{project}/contents/metadata.wrap',
+            dict(content=base64.b64encode(content.encode()).decode()))
@@ -0,0 +1,213 @@
+"""Writes a static mirror of the WrapDB API.
+
+Every response of the /v1 API is written to a directory tree mirroring the
+URL layout, so that nginx can serve WrapDB without wrapweb, see
+files/wrapdb-mirror.conf. As /v1/projects/<project> is both a response
+and a prefix of other URLs, JSON responses are written to index.json in
+the directory named by their URL. Wraps and zips are written to files
+named by their URL. Name queries are written for every prefix of a
+project name; v1/query/byname/index.json holds the empty result served for
+other prefixes.
+
+Responses are produced by the wrapweb application itself, so the mirror
+is identical to the API. Re-runs only rewrite changed responses, release
+assets are never changed and are not downloaded again. Files of deleted
+projects and releases are removed. Every file is replaced atomically, so a
+failed run leaves a mirror of complete files, each either from the previous
+run or from the failed one; stale files are kept until a run succeeds.
+"""
+
+import argparse
+import concurrent.futures
+import dataclasses
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import flask
+import github
+import requests
+
+from mesonwrap import tempfile
+from mesonwrap.tools import environment
+from wrapweb import APP
+from wrapweb import api
+
+
+INDEX = 'index.json'
+ROOT = 'v1'
+BYNAME = '/v1/query/byname'
+# Mirror files are served by a web server running as another user.
+FILE_MODE = 0o644
+
+
+class FreezeError(Exception):
+    pass
+
+
+@dataclasses.dataclass
+class FreezeStats:
+
+    written: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+
+def _prefixes(names: Iterable[str]) -> List[str]:
+    return sorted({name[:i] for name in names
+                   for i in range(1, len(name) + 1)})
+
+
+class Freezer:
+
+    def __init__(self, app: flask.Flask, directory: str, workers: int = 8):
+        self.app = app
+        self.directory = directory
+        self.workers = workers
+        self.stats = FreezeStats()
+        self._lock = threading.Lock()
+        # Relative paths of the files of the current mirror.
+        self._paths: Set[str] = set()
+        self._local = threading.local()
+
+    @property
+    def _client(self):
+        """Returns test client owned by current thread."""
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.app.test_client()
+        return self._local.client
+
+    def _get(self, url: str) -> Optional[bytes]:
+        """Returns response body, None if there is no such entry."""
+        rv = self._client.get(url)
+        if rv.status_code == 404:
+            return None
+        if rv.status_code != 200:
+            raise FreezeError('Unexpected response', url, rv.status_code)
+        return rv.data
+
+    def _path(self, url: str, json: bool) -> str:
+        """Returns path relative to the mirror directory."""
+        path = url.lstrip('/')
+        if json:
+            path += '/' + INDEX
+        return os.path.join(*path.split('/'))
+
+    def _keep(self, path: str) -> None:
+        with self._lock:
+            self._paths.add(path)
+
+    def _write(self, path: str, data: bytes) -> None:
+        self._keep(path)
+        path = os.path.join(self.directory, path)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    with self._lock:
+                        self.stats.unchanged += 1
+                    return
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Never let a partially written file be served.
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                         prefix='.', delete=False) as f:
+            f.write(data)
+        os.chmod(f.name, FILE_MODE)
+        os.replace(f.name, path)
+        with self._lock:
+            self.stats.written += 1
+
+    def freeze_json(self, url: str) -> Optional[bytes]:
+        data = self._get(url)
+        if data is not None:
+            self._write(self._path(url, json=True), data)
+        return data
+
+    def freeze_asset(self, url: str) -> None:
+        path = self._path(url, json=False)
+        if os.path.exists(os.path.join(self.directory, path)):
+            self._keep(path)
+            with self._lock:
+                self.stats.unchanged += 1
+            return
+        data = self._get(url)
+        if data is not None:  # releases may lack assets
+            self._write(path, data)
+
+    def freeze_project(self, project: str, info: Dict[str, Any]) -> None:
+        self.freeze_json(f'/v1/projects/{project}')
+        self.freeze_json(f'/v1/query/get_latest/{project}')
+        for version in info['versions']:
+            prefix = (f'/v1/projects/{project}/{version["branch"]}/'
+                      f'{version["revision"]}')
+            self.freeze_asset(prefix + '/get_wrap')
+            self.freeze_asset(prefix + '/get_zip')
+
+    def freeze_unmatched(self, names: Iterable[str]) -> None:
+        """Writes the name query result for prefixes matching no project."""
+        # Longer than every name, so a prefix of none.
+        prefix = 'x' * (max(map(len, names), default=0) + 1)
+        data = self._get(f'{BYNAME}/{prefix}')
+        if data is None:
+            raise FreezeError('Name query is not available')
+        self._write(self._path(BYNAME, json=True), data)
+
+    def _remove_stale(self) -> None:
+        root = os.path.join(self.directory, ROOT)
+        for dirpath, _, filenames in os.walk(root, topdown=False):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if os.path.relpath(path, self.directory) not in self._paths:
+                    os.unlink(path)
+                    self.stats.removed += 1
+            if dirpath != root and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+    def run(self) -> FreezeStats:
+        self._paths.clear()
+        self.freeze_json('/v1/projects')
+        data = self.freeze_json('/v1/catalogue')
+        if data is None:
+            raise FreezeError('Catalogue is not available')
+        catalogue = flask.json.loads(data)['projects']
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as exe:
+            futures = [exe.submit(self.freeze_project, project, info)
+                       for project, info in catalogue.items()]
+            futures.extend(
+                exe.submit(self.freeze_json, f'{BYNAME}/{prefix}')
+                for prefix in _prefixes(catalogue))
+            futures.append(exe.submit(self.freeze_unmatched, catalogue))
+            for future in concurrent.futures.as_completed(futures):
+                future.result()  # failures keep the previous mirror
+        self._remove_stale()
+        return self.stats
+
+
+def main(prog, args):
+    parser = argparse.ArgumentParser(prog)
+    parser.add_argument('directory')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--github-token')
+    parser.add_argument('--github-token-env', action='store_true')
+    args = parser.parse_args(args)
+    if args.github_token:
+        APP.config['GITHUB_TOKEN'] = args.github_token
+    if args.github_token_env:
+        APP.config['GITHUB_TOKEN'] = environment.Config().github_token
+    # Assets must be sent by wrapweb to be written.
+    APP.config.update(ASSET_REDIRECT=False, ASSET_SENDFILE=None,
+                      CACHE_REFRESH=False)
+    try:
+        with APP.app_context():
+            api._connect().load_catalogue()
+        stats = Freezer(APP, args.directory, args.workers).run()
+    except FreezeError as e:
+        print('Freeze failed:', *e.args, file=sys.stderr)
+        sys.exit(1)
+    except (github.GithubException, requests.RequestException) as e:
+        print('Freeze failed:', e, file=sys.stderr)
+        sys.exit(1)
+    print(f'{stats.written} written, {stats.unchanged} unchanged, '
+          f'{stats.removed} removed')
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import json
+import os
+import unittest
+
+import github
+
+from mesonwrap import tempfile
+from mesonwrap.tools import freeze
+from wrapweb import api
+from wrapweb import testing
+
+
+class FreezerTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+
+    def setUp(self):
+        super().setUp()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmpdir.cleanup)
+        self.database.add('foo', '1.2.3', 1, 'wrap', b'zip')
+
+    def freeze(self):
+        return freeze.Freezer(self.app, self._tmpdir.name, workers=2).run()
+
+    def path(self, *parts):
+        return os.path.join(self._tmpdir.name, 'v1', *parts)
+
+    def read(self, *parts):
+        with open(self.path(*parts), 'rb') as f:
+            return f.read()
+
+    def test_layout(self):
+        self.freeze()
+        self.assertEqual(
+            json.loads(self.read('projects', freeze.INDEX))['projects'],
+            ['foo'])
+        self.assertIn('foo', json.loads(
+            self.read('catalogue', freeze.INDEX))['projects'])
+        self.assertEqual(json.loads(
+            self.read('projects', 'foo', freeze.INDEX))['name'], 'foo')
+        self.assertEqual(json.loads(
+            self.read('query', 'get_latest', 'foo', freeze.INDEX))['branch'],
+            '1.2.3')
+        for prefix in ['f', 'fo', 'foo']:
+            self.assertEqual(json.loads(self.read(
+                'query', 'byname', prefix, freeze.INDEX))['projects'],
+                ['foo'])
+        self.assertEqual(json.loads(self.read(
+            'query', 'byname', freeze.INDEX)),
+            dict(output='ok', projects=[]))
+        self.assertEqual(
+            self.read('projects', 'foo', '1.2.3', '1', 'get_wrap'), b'wrap')
+        zip_path = ('projects', 'foo', '1.2.3', '1', 'get_zip')
+        self.assertEqual(self.read(*zip_path), b'zip')
+        self.assertEqual(os.stat(self.path(*zip_path)).st_mode & 0o777,
+                         freeze.FILE_MODE)
+
+    def test_unchanged(self):
+        written = self.freeze().written
+        stats = self.freeze()
+        self.assertEqual(stats.written, 0)
+        self.assertEqual(stats.unchanged, written)
+        self.assertEqual(stats.removed, 0)
+
+    def test_stale_removed(self):
+        self.freeze()
+        self.database.add('bar', '1.0', 1, 'wrap', b'zip')
+        del self.database._projects['foo']
+        stats = self.freeze()
+        self.assertGreater(stats.removed, 0)
+        self.assertFalse(os.path.exists(self.path('projects', 'foo')))
+        self.assertFalse(
+            os.path.exists(self.path('query', 'byname', 'f')))
+        self.assertEqual(
+            self.read('projects', 'bar', '1.0', '1', 'get_zip'), b'zip')
+
+    def test_github_error_reported(self):
+        connect = self._patch_object(api, '_connect')
+        connect.return_value.load_catalogue.side_effect = (
+            github.RateLimitExceededException(403, {}, {}))
+        stderr = io.StringIO()
+        with self.assertRaises(SystemExit) as cm, \
+                contextlib.redirect_stderr(stderr):
+            freeze.main('freeze', [self._tmpdir.name])
+        self.assertEqual(cm.exception.code, 1)
+        self.assertIn('Freeze failed', stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 import argparse
+import logging
+import os
 
 from mesonwrap.tools import environment
 from wrapweb import APP
+from wrapweb import api
+from wrapweb import prefork
 
 
 def main(prog, args):
@@ -11,12 +15,31 @@ def main(prog, args):
     parser.add_argument('--secret-key')
     parser.add_argument('--github-token')
     parser.add_argument('--github-token-env', action='store_true')
+    parser.add_argument('--production', action='store_true',
+                        help='serve with preforked workers, reload on SIGHUP')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes in production mode')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='threads per worker in production mode')
+    parser.add_argument('--keepalive', type=float,
+                        default=prefork.KEEPALIVE_TIMEOUT,
+                        help='seconds idle connections are kept open')
+    parser.add_argument('--no-warm', dest='warm', action='store_false',
+                        help='do not load the catalogue before forking')
     args = parser.parse_args(args)
     for opt in ['secret_key', 'github_token']:
         if getattr(args, opt):
             APP.config[opt.upper()] = getattr(args, opt)
     if args.github_token_env:
         APP.config['GITHUB_TOKEN'] = environment.Config().github_token
-    APP.run(host=args.host,
-            port=args.port,
-            debug=True)
+    if not args.production:
+        APP.run(host=args.host,
+                port=args.port,
+                debug=True)
+        return
+    logging.basicConfig(level=logging.INFO)
+    prefork.serve(APP, args.host, args.port,
+                  workers=args.workers,
+                  threads=args.threads,
+                  keepalive=args.keepalive,
+                  warm=(lambda: api.warm_caches(APP)) if args.warm else None)
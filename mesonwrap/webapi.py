@@ -120,6 +120,13 @@ class _APIClient:
     def fetch_v1_projects(self) -> JSON:
         return self.fetch_json('/v1/projects')
 
+    def fetch_v1_catalogue(self) -> Optional[JSON]:
+        """Returns None if the server does not provide the catalogue."""
+        rv = self._http.get('/v1/catalogue')
+        if rv.status_code == 404:
+            return None
+        return self.interpret(rv)
+
     def fetch_v1_project(self, project: str) -> JSON:
         self._check_part(project, 'project name')
         return self.fetch_json('/v1/projects/' + project)
@@ -224,20 +231,33 @@ class Version:
 
 class Project:
 
-    def __init__(self, api: _APIClient, name: str):
+    def __init__(self, api: _APIClient, name: str,
+                 info: Optional[JSON] = None):
+        """Initialize Project.
+
+        Args:
+            info: optional catalogue entry of the project,
+                  saves fetching versions and metadata.
+        """
         self._api = api
         self.name = name
+        self.__info = info
         self.__version_ids = None
         self.__versions_called = False
         self.__versions = dict()
         self.__latest = None
 
+    @property
+    def _info(self) -> JSON:
+        if self.__info is None:
+            self.__info = self._api.fetch_v1_project(self.name)
+        return self.__info
+
     @property
     def _version_ids(self):
         if self.__version_ids is None:
-            js = self._api.fetch_v1_project(self.name)
             self.__version_ids = dict()
-            for version in js['versions']:
+            for version in self._info['versions']:
                 ver = version['branch']
                 rev = int(version['revision'])
                 if ver not in self.__version_ids:
@@ -245,6 +265,10 @@ class Project:
                 self.__version_ids[ver].add(rev)
         return self.__version_ids
 
+    @property
+    def metadata(self) -> Dict[str, str]:
+        return self._info.get('metadata', {})
+
     def _get_version(self, ver):
         if ver not in self.__versions:
             self.__versions[ver] = Version(self._api, self, ver)
@@ -260,7 +284,9 @@ class Project:
 
     def query_latest(self) -> Revision:
         if self.__latest is None:
-            js = self._api.query_v1_get_latest(self.name)
+            js = (self.__info or {}).get('latest')
+            if js is None:
+                js = self._api.query_v1_get_latest(self.name)
             ver = js['branch']
             rev = js['revision']
             self.__latest = self._get_version(ver)._get_revision(rev)
@@ -272,6 +298,7 @@ class ProjectSet:
     def __init__(self, api):
         self._api = api
         self.__project_names = None
+        self.__catalogue = None
         self.__projects_called = False
         self.__projects = dict()
 
@@ -281,14 +308,25 @@ class ProjectSet:
             self.__project_names = self._api.fetch_v1_projects()['projects']
         return self.__project_names
 
+    def _load_catalogue(self) -> None:
+        """Loads all projects in one request if the server supports it."""
+        js = self._api.fetch_v1_catalogue()
+        if js is not None:
+            self.__catalogue = js['projects']
+            self.__project_names = sorted(self.__catalogue)
+
     def _get_project(self, name):
         if name not in self.__projects:
-            self.__projects[name] = Project(self._api, name)
+            info = None
+            if self.__catalogue is not None:
+                info = self.__catalogue.get(name)
+            self.__projects[name] = Project(self._api, name, info)
         return self.__projects[name]
 
     @property
     def _projects(self):
         if not self.__projects_called:
+            self._load_catalogue()
             for name in self._project_names:
                 self._get_project(name)
             self.__projects_called = True
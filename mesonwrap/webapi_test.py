@@ -0,0 +1,86 @@
+import json
+import unittest
+
+from mesonwrap import webapi
+
+
+class FakeResponse:
+
+    def __init__(self, status_code: int, data):
+        self.status_code = status_code
+        self.reason = 'OK' if status_code == 200 else 'Error'
+        self.content = json.dumps(data).encode('utf-8')
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+
+class FakeHTTPClient(webapi.AbstractHTTPClient):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url):
+        self.requests.append(url)
+        if url not in self.responses:
+            return FakeResponse(404, {'output': 'notok', 'error': 'Missing'})
+        return FakeResponse(200, dict(output='ok', **self.responses[url]))
+
+
+class ProjectSetTest(unittest.TestCase):
+
+    FOO = {
+        'versions': [{'branch': '1.0.0', 'revision': 2},
+                     {'branch': '1.0.0', 'revision': 1}],
+        'latest': {'branch': '1.0.0', 'revision': 2},
+        'metadata': {'description': 'Foo library'},
+    }
+
+    def projects(self, responses):
+        self.http = FakeHTTPClient(responses)
+        return webapi.WebAPI(http_client=self.http).projects()
+
+    def test_catalogue(self):
+        projects = self.projects({
+            '/v1/catalogue': {'projects': {'foo': self.FOO}},
+        })
+        self.assertEqual([project.name for project in projects], ['foo'])
+        foo = projects['foo']
+        self.assertEqual(list(foo.versions), ['1.0.0'])
+        self.assertEqual(foo.versions['1.0.0'].latest.revision, 2)
+        self.assertEqual(foo.query_latest().revision, 2)
+        self.assertEqual(foo.metadata, {'description': 'Foo library'})
+        self.assertEqual(self.http.requests, ['/v1/catalogue'])
+
+    def test_without_catalogue(self):
+        projects = self.projects({
+            '/v1/projects': {'projects': ['foo']},
+            '/v1/projects/foo': {'name': 'foo',
+                                 'versions': self.FOO['versions'],
+                                 'metadata': self.FOO['metadata']},
+        })
+        self.assertIn('foo', projects)
+        self.assertEqual(projects['foo'].versions['1.0.0'].latest.revision, 2)
+        self.assertEqual(self.http.requests, [
+            '/v1/projects', '/v1/catalogue', '/v1/projects/foo'])
+
+    def test_contains_uses_project_list(self):
+        projects = self.projects({
+            '/v1/projects': {'projects': ['foo']},
+            '/v1/catalogue': {'projects': {'foo': self.FOO}},
+        })
+        self.assertIn('foo', projects)
+        self.assertEqual(len(projects), 1)
+        self.assertEqual(self.http.requests, ['/v1/projects'])
+
+
+if __name__ == '__main__':
+    unittest.main()
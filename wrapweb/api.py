@@ -12,20 +12,138 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import dataclasses
+import functools
+import hashlib
+import hmac
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
 import flask
+from flask import blueprints
 import github
 
+from mesonwrap import blobstore
 from mesonwrap import githubdb
+from mesonwrap import sharedcache
 from wrapweb import flaskutil
+from wrapweb import httpcache
 from wrapweb import jsonstatus
+from wrapweb import queries
 
 BP = flask.Blueprint('api', __name__)
+_validators = httpcache.ValidatorCache()
+_bodies = httpcache.BodyCache()
+
+
+_log = logging.getLogger(__name__)
+SENDFILE_HEADERS = {
+    'x-accel-redirect': 'X-Accel-Redirect',
+    'x-sendfile': 'X-Sendfile',
+}
+
+
+def _asset_dir(config) -> Optional[str]:
+    asset_dir = config.get('ASSET_STORE_DIR')
+    if not asset_dir and config.get('CACHE_DIR'):
+        asset_dir = os.path.join(config['CACHE_DIR'], 'assets')
+    return asset_dir
+
+
+@BP.record_once
+def _configure(setup: blueprints.BlueprintSetupState):
+    config = setup.app.config
+    sendfile = config.get('ASSET_SENDFILE')
+    if sendfile and sendfile not in SENDFILE_HEADERS:
+        raise ValueError('Unknown ASSET_SENDFILE', sendfile)
+    if config.get('CACHE_TTL') or config.get('METADATA_TTL'):
+        githubdb.set_ttl(config.get('CACHE_TTL') or githubdb.CACHE_TTL,
+                         config.get('METADATA_TTL') or githubdb.METADATA_TTL)
+    if config.get('MISSING_TTL'):
+        githubdb.set_missing_ttl(
+            config['MISSING_TTL'],
+            config.get('MISSING_CACHE_SIZE') or githubdb.MISSING_CACHE_SIZE)
+    cache_dir = config.get('CACHE_DIR')
+    shared = None
+    if cache_dir:
+        shared = sharedcache.SharedCache(cache_dir)
+        githubdb.use_shared_cache(shared)
+    asset_dir = _asset_dir(config)
+    if asset_dir:
+        githubdb.use_blob_store(blobstore.BlobStore(
+            asset_dir, max_bytes=config['ASSET_STORE_BYTES']))
+    limits = config.get('CACHE_BACKEND_BYTES') or {}
+    for name, kind in (config.get('CACHE_BACKENDS') or {}).items():
+        githubdb.use_backend(name, kind, max_bytes=limits.get(name),
+                             shared=shared,
+                             memcached_address=config.get('MEMCACHED_ADDRESS'))
+    local = githubdb.local_caches()
+    if config.get('GITHUB_WEBHOOK_SECRET') and local:
+        _log.warning('GitHub webhook invalidates only the caches of the '
+                     'process receiving it, other processes serve %s until '
+                     'they expire; set CACHE_DIR or CACHE_BACKENDS to share '
+                     'them', ', '.join(local))
+
+
+@BP.before_app_request
+def _start_refresher():
+    config = flask.current_app.config
+    if config.get('CACHE_REFRESH'):
+        periodic = []
+        interval = config['CACHE_PRELOAD_INTERVAL']
+        if interval:
+            # Workers forked after warm_caches() do not load it again.
+            age = githubdb.catalogue_age()
+            delay = interval - age if age is not None else 0
+            periodic.append((interval, _connect().load_catalogue, delay))
+        githubdb.start_refresher(interval=config['CACHE_REFRESH_INTERVAL'],
+                                 margin=config['CACHE_REFRESH_MARGIN'],
+                                 hot=config['CACHE_REFRESH_HOT'],
+                                 workers=config['CACHE_REFRESH_WORKERS'],
+                                 periodic=periodic)
+
+
+@BP.errorhandler(github.RateLimitExceededException)
+def _rate_limited(err):
+    # Raised only when no previously fetched value is available.
+    return jsonstatus.error(503, 'GitHub rate limit exceeded, retry later')
+
+
+# (pid, token) -> GithubDB
+_connections: Dict[Tuple[int, str], githubdb.GithubDB] = dict()
+_connections_lock = threading.Lock()
+
+
+def _connect() -> githubdb.GithubDB:
+    """Returns GithubDB shared by all requests of this process.
+
+    HTTP connections to GitHub are kept between requests, one per thread,
+    but not inherited by forked processes.
+    """
+    token = flask.current_app.config['GITHUB_TOKEN']
+    key = (os.getpid(), token)
+    with _connections_lock:
+        db = _connections.get(key)
+        if db is None:
+            db = _connections[key] = githubdb.GithubDB(
+                functools.partial(github.Github, token))
+        return db
+
+
+def warm_caches(app: flask.Flask) -> None:
+    """Loads the catalogue into the caches of this process.
+
+    Called before forking workers, which then share the loaded caches.
+    """
+    with app.app_context():
+        _connect().load_catalogue()
 
 
 @flaskutil.appcontext_var(BP)
 def _database():
-    gh = github.Github(flask.current_app.config['GITHUB_TOKEN'])
-    return githubdb.GithubDB(gh)
+    return _connect()
 
 
 @_database.teardown
@@ -33,59 +151,249 @@ def _close_connection(db):
     db.close()
 
 
+def _cached(immutable: bool = False, compress: bool = False,
+            ranges: bool = False):
+    """Adds ETag and Cache-Control to responses of an API view.
+
+    Bodies of compressed views are kept encoded per data version.
+    """
+    def decorator(view):
+        return httpcache.cached(
+            _validators,
+            data_version=lambda: _database().data_version(),
+            max_age=lambda: flask.current_app.config.get(
+                'API_MAX_AGE', httpcache.MAX_AGE),
+            immutable=immutable,
+            endpoint=f'{BP.name}.{view.__name__}',
+            bodies=_bodies if compress else None,
+            ranges=ranges)(view)
+    return decorator
+
+
 @BP.route('/v1/query/byname/<project>', methods=['GET'])
+@_cached()
 def name_query(project):
-    return jsonstatus.ok(projects=_database().name_search(project))
+    return jsonstatus.ok(
+        projects=queries.project_names(_database(), prefix=project))
 
 
 @BP.route('/v1/query/get_latest/<project>', methods=['GET'])
+@_cached()
 def get_latest(project):
-    latest = _database().get_latest_version(project)
+    latest = queries.latest_version(_database(), project)
     if latest is None:
         return jsonstatus.error(404, 'No such project')
-    return jsonstatus.ok(branch=latest[0], revision=latest[1])
+    return jsonstatus.ok(**latest.to_json())
 
 
 @BP.route('/v1/projects')
+@_cached(compress=True)
 def get_projectlist():
-    return jsonstatus.ok(projects=_database().name_search(''))
+    return jsonstatus.ok(projects=queries.project_names(_database()))
 
 
 @BP.route('/v1/projects/<project>')
+@_cached(compress=True)
 def get_project_info(project):
-    metadata = _database().get_metadata(project)
-    matches = _database().get_versions(project)
-    if not matches:
-        projects = _database().name_search(project)
-        if project not in projects:
-            return jsonstatus.error(404, 'No such project')
+    info = queries.project(_database(), project)
+    if info is None:
+        return jsonstatus.error(404, 'No such project')
+    if not info.versions:
         return jsonstatus.ok(versions=[])
-    md = dict()
-    if metadata is not None:
-        for field in ['homepage', 'description']:
-            if metadata.has(field):
-                md[field] = getattr(metadata, field)
-    versions = [{'branch': i[0], 'revision': i[1]} for i in matches]
-    return jsonstatus.ok(name=project, metadata=md, versions=versions)
+    return jsonstatus.ok(name=info.name, metadata=info.metadata,
+                         versions=[v.to_json() for v in info.versions])
 
 
-@BP.route('/v1/projects/<project>/<branch>/<int:revision>/get_wrap')
-def get_wrap(project, branch, revision):
-    result = _database().get_wrap(project, branch, revision)
-    if result is None:
+@BP.route('/v1/catalogue')
+@_cached(compress=True)
+def get_catalogue():
+    """Returns versions, latest version and metadata of every project.
+
+    Versions are sorted, latest first. Built once per data version.
+    """
+    projects = dict()
+    for info in queries.catalogue(_database()):
+        projects[info.name] = {
+            'versions': [v.to_json() for v in info.versions],
+            'latest': info.latest.to_json() if info.latest else None,
+            'metadata': info.metadata,
+        }
+    return jsonstatus.ok(projects=projects)
+
+
+@dataclasses.dataclass
+class DeliveryStats:
+
+    # Assets served by redirecting to GitHub.
+    redirects: int = 0
+    # Assets sent by wrapweb.
+    proxied: int = 0
+    # Assets from the asset store sent by the front-end server.
+    offloaded: int = 0
+
+
+_delivery_stats = DeliveryStats()
+_delivery_stats_lock = threading.Lock()
+
+
+def delivery_stats() -> DeliveryStats:
+    with _delivery_stats_lock:
+        return dataclasses.replace(_delivery_stats)
+
+
+def _delivered(how: str) -> None:
+    """Counts delivered asset, how is a field of DeliveryStats."""
+    with _delivery_stats_lock:
+        setattr(_delivery_stats, how, getattr(_delivery_stats, how) + 1)
+
+
+def _redirect_url(project: str, branch: str, revision: int,
+                  label: str) -> Optional[str]:
+    """Returns GitHub URL to redirect to or None to send asset directly."""
+    config = flask.current_app.config
+    if not config.get('ASSET_REDIRECT'):
+        return None
+    agent = flask.request.headers.get('User-Agent', '')
+    if any(excluded in agent
+           for excluded in config.get('ASSET_REDIRECT_EXCLUDED_AGENTS', [])):
+        return None
+    info = _database().get_asset_info(project, branch, revision, label)
+    # Small assets cost less than the extra round trip of a redirect.
+    if info is None or info.size < config.get('ASSET_REDIRECT_MIN_SIZE', 0):
+        return None
+    return info.url
+
+
+def _redirect(url: str) -> flask.Response:
+    _delivered('redirects')
+    return flask.redirect(url, code=302)
+
+
+def _sendfile(asset, mimetype: str) -> Optional[flask.Response]:
+    """Returns response handing the stored asset to the front-end server.
+
+    Returns None to send the asset by wrapweb, e.g. before the asset
+    reaches the asset store.
+    """
+    config = flask.current_app.config
+    header = SENDFILE_HEADERS.get(config.get('ASSET_SENDFILE'))
+    if header is None or not isinstance(asset, blobstore.Blob):
+        return None
+    resp = flask.Response(mimetype=mimetype)
+    if header == 'X-Sendfile':
+        resp.headers[header] = os.path.abspath(asset.path)
+    else:
+        path = os.path.relpath(asset.path, _asset_dir(config) or '/')
+        if path.startswith(os.pardir):
+            return None
+        prefix = config.get('ASSET_SENDFILE_PREFIX', '/_assets/')
+        resp.headers[header] = prefix + path.replace(os.sep, '/')
+        # Blobs may be evicted, nginx must not cache the redirect.
+        resp.headers['X-Accel-Expires'] = '0'
+    resp.set_etag(asset.digest)
+    _delivered('offloaded')
+    return resp
+
+
+def _send_asset(project: str, branch: str, revision: int, label: str,
+                mimetype: str) -> flask.Response:
+    url = _redirect_url(project, branch, revision, label)
+    if url is not None:
+        return _redirect(url)
+    asset = _database().get_asset(project, branch, revision, label)
+    if asset is None:
         return jsonstatus.error(404, 'No such entry')
-    resp = flask.make_response(result)
-    resp.mimetype = 'text/plain'
+    resp = _sendfile(asset, mimetype)
+    if resp is not None:
+        return resp
+    _delivered('proxied')
+    # Memory-mapped blobs are streamed in chunks, ranges are seeked to.
+    resp = flask.Response(asset, mimetype=mimetype)
+    resp.content_length = len(asset)
+    # blobstore.Blob digest is the sha256 of the content
+    resp.set_etag(getattr(asset, 'digest', None) or
+                  httpcache.etag(bytes(asset)))
     return resp
 
 
+@BP.route('/v1/projects/<project>/<branch>/<int:revision>/get_wrap')
+@_cached(immutable=True, ranges=True)
+def get_wrap(project, branch, revision):
+    return _send_asset(project, branch, revision,
+                       githubdb.UPSTREAM_WRAP_LABEL, mimetype='text/plain')
+
+
 @BP.route('/v1/projects/<project>/<branch>/<int:revision>/get_zip')
+@_cached(immutable=True, ranges=True)
 def get_zip(project, branch, revision):
-    result = _database().get_zip(project, branch, revision)
-    if result is None:
-        return jsonstatus.error(404, 'No such entry')
-    resp = flask.make_response(result)
-    resp.mimetype = 'application/zip'
-    resp.headers['Content-Disposition'] = (
-        f'attachment; filename={project}-{branch}-{revision}-wrap.zip')
+    resp = _send_asset(project, branch, revision, githubdb.PATCH_ZIP_LABEL,
+                       mimetype='application/zip')
+    if resp.status_code == 200:
+        resp.headers['Content-Disposition'] = (
+            f'attachment; filename={project}-{branch}-{revision}-wrap.zip')
     return resp
+
+
+def _signature_error():
+    secret = flask.current_app.config.get('GITHUB_WEBHOOK_SECRET')
+    if not secret:
+        return jsonstatus.error(404, 'Webhooks are not configured')
+    signature = flask.request.headers.get('X-Hub-Signature-256', '')
+    expected = 'sha256=' + hmac.new(secret.encode('utf-8'),
+                                    flask.request.get_data(),
+                                    hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature, expected):
+        return jsonstatus.error(403, 'Invalid signature')
+    return None
+
+
+def _touches_metadata(payload) -> bool:
+    for commit in payload.get('commits', []):
+        for change in ['added', 'modified', 'removed']:
+            if 'metadata.wrap' in commit.get(change, []):
+                return True
+    return False
+
+
+@BP.route('/v1/hooks/github', methods=['POST'])
+def github_hook():
+    error = _signature_error()
+    if error is not None:
+        return error
+    event = flask.request.headers.get('X-GitHub-Event')
+    payload = flask.request.get_json(force=True)
+    if event == 'ping':
+        return jsonstatus.ok(invalidated=[])
+    db = _database()
+    repository = payload.get('repository', {})
+    if repository.get('owner', {}).get('login') != db.organization:
+        return jsonstatus.error(400, 'Unknown organization')
+    project = repository['name']
+    invalidated = []
+    if event == 'release':
+        db.invalidate_releases(project)
+        invalidated.append('releases')
+        if payload.get('action') in ['edited', 'deleted', 'unpublished']:
+            db.invalidate_release(project, payload['release']['tag_name'])
+            invalidated.append('assets')
+    elif event == 'push':
+        if _touches_metadata(payload):
+            db.invalidate_metadata(project)
+            invalidated.append('metadata')
+    elif event == 'repository':
+        db.invalidate_repository_list()
+        invalidated.append('repositories')
+        # A created repository may be remembered as missing.
+        if payload.get('action') in ['created', 'deleted', 'renamed',
+                                     'archived']:
+            projects = [project]
+            if payload.get('action') == 'renamed':
+                projects.append(payload['changes']['repository']['name']
+                                ['from'])
+            for name in projects:
+                db.invalidate_releases(name)
+                db.invalidate_metadata(name)
+            invalidated.extend(['releases', 'metadata'])
+    else:
+        return jsonstatus.error(400, 'Unsupported event')
+    return jsonstatus.ok(project=project, invalidated=invalidated)
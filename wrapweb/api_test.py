@@ -1,5 +1,16 @@
+import gzip
+import hashlib
+import hmac
+import json
+import tempfile
+import threading
 import unittest
+from unittest import mock
 
+import flask
+import github
+
+from mesonwrap import blobstore
 from wrapweb import api
 from wrapweb import testing
 
@@ -55,6 +66,445 @@ class ApiTest(testing.TestBase):
         rv = self.client.get('/v1/projects/foo/1.2.3/1/get_zip')
         self.assertEqual(rv.status_code, 200)
         self.assertEqual(rv.data, b'some data')
+        self.assertEqual(rv.content_length, 9)
+
+    def test_rate_limited(self):
+        with mock.patch.object(self.database, 'get_latest_version',
+                               side_effect=github.RateLimitExceededException(
+                                   403, {}, {})):
+            rv = self.client.get('/v1/query/get_latest/foo')
+        self.assertNotOk(rv, 503)
+
+    def test_rate_limited_asset(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        with mock.patch.object(self.database, 'get_asset',
+                               side_effect=github.RateLimitExceededException(
+                                   403, {}, {})):
+            for call in ['get_wrap', 'get_zip']:
+                rv = self.client.get(f'/v1/projects/foo/1.2.3/1/{call}')
+                self.assertNotOk(rv, 503)
+
+
+class ConcurrentLookupTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+
+    def setUp(self):
+        super().setUp()
+        self.database.add('foo', '1.2.3', 1, '', b'')
+
+    def test_concurrent(self):
+        # Passes only if all lookups of the request run at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait(method):
+            def wrapper(*args):
+                barrier.wait()
+                return method(*args)
+            return wrapper
+        for name in ['get_metadata', 'get_versions']:
+            self._patch_object(self.database, name,
+                               wait(getattr(self.database, name)))
+        rv = self.client.get('/v1/projects/foo')
+        self.assertOk(rv)
+        self.assertEqual(rv.get_json()['versions'],
+                         [{'branch': '1.2.3', 'revision': 1}])
+
+    def test_sequential(self):
+        self.app.config['API_LOOKUP_WORKERS'] = 0
+        threads = set()
+
+        def get_versions(project):
+            threads.add(threading.get_ident())
+            return []
+        self._patch_object(self.database, 'get_versions', get_versions)
+        self.assertOk(self.client.get('/v1/projects/foo'))
+        self.assertEqual(threads, {threading.get_ident()})
+
+    def test_error(self):
+        self._patch_object(self.database, 'get_versions',
+                           side_effect=github.RateLimitExceededException(
+                               403, {}, {}))
+        rv = self.client.get('/v1/projects/foo')
+        self.assertNotOk(rv, 503)
+
+
+class CatalogueTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+
+    def test_catalogue(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        self.database.add('foo', '1.2.3', 2, '', b'')
+        self.database.add('bar', '1.0.0', 1, '', b'')
+        self.database.set_metadata('foo', description='Foo library')
+        rv = self.client.get('/v1/catalogue')
+        self.assertOk(rv)
+        projects = rv.get_json()['projects']
+        self.assertEqual(sorted(projects), ['bar', 'foo'])
+        self.assertEqual(projects['foo']['versions'], [
+            {'branch': '1.2.3', 'revision': 1},
+            {'branch': '1.2.3', 'revision': 2},
+        ])
+        self.assertEqual(projects['foo']['latest'],
+                         {'branch': '1.2.3', 'revision': 1})
+        self.assertEqual(projects['foo']['metadata'],
+                         {'description': 'Foo library'})
+        self.assertEqual(projects['bar']['metadata'], {})
+
+    def test_cached(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        etag = self.client.get('/v1/catalogue').headers['ETag']
+        with mock.patch.object(self.database, 'get_versions') as versions:
+            rv = self.client.get('/v1/catalogue')
+        versions.assert_not_called()
+        self.assertEqual(rv.headers['ETag'], etag)
+
+
+class CacheHeadersTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+
+    def test_get_zip(self):
+        self.database.add('foo', '1.2.3', 1, '', b'some data')
+        url = '/v1/projects/foo/1.2.3/1/get_zip'
+        rv = self.client.get(url)
+        etag = hashlib.sha256(b'some data').hexdigest()
+        self.assertEqual(rv.headers['ETag'], f'"{etag}"')
+        self.assertIn('immutable', rv.headers['Cache-Control'])
+        rv = self.client.get(url, headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.data, b'')
+        self.database.add('bar', '1.2.3', 1, '', b'')  # new data version
+        with mock.patch.object(self.database, 'get_asset') as get_asset:
+            rv = self.client.get(url,
+                                 headers={'If-None-Match': f'"{etag}"'})
+        self.assertEqual(rv.status_code, 304)
+        get_asset.assert_not_called()
+
+    def test_not_modified_without_database(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        rv = self.client.get('/v1/projects')
+        self.assertEqual(rv.headers['Cache-Control'], 'public, max-age=60')
+        etag = rv.headers['ETag']
+        with mock.patch.object(self.database, 'name_search') as name_search:
+            rv = self.client.get('/v1/projects',
+                                 headers={'If-None-Match': etag})
+        self.assertEqual(rv.status_code, 304)
+        self.assertEqual(rv.headers['ETag'], etag)
+        name_search.assert_not_called()
+
+    def test_changed(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        etag = self.client.get('/v1/projects').headers['ETag']
+        self.database.add('bar', '1.2.3', 1, '', b'')
+        rv = self.client.get('/v1/projects', headers={'If-None-Match': etag})
+        self.assertOk(rv)
+        self.assertNotEqual(rv.headers['ETag'], etag)
+
+    def test_errors_not_cached(self):
+        rv = self.client.get('/v1/projects/foo')
+        self.assertNotOk(rv, 404)
+        self.assertNotIn('ETag', rv.headers)
+
+
+class CompressionTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+
+    def setUp(self):
+        super().setUp()
+        for i in range(100):
+            self.database.add(f'project{i}', '1.2.3', 1, '', b'')
+
+    def test_gzip(self):
+        plain = self.client.get('/v1/projects')
+        self.assertIsNone(plain.content_encoding)
+        rv = self.client.get('/v1/projects',
+                             headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(rv.content_encoding, 'gzip')
+        self.assertIn('Accept-Encoding', rv.vary)
+        self.assertEqual(gzip.decompress(rv.data), plain.data)
+        self.assertNotEqual(rv.headers['ETag'], plain.headers['ETag'])
+
+    def test_serialized_once(self):
+        self.client.get('/v1/projects')
+        with mock.patch.object(self.database, 'name_search') as name_search:
+            rv = self.client.get('/v1/projects',
+                                 headers={'Accept-Encoding': 'gzip'})
+        name_search.assert_not_called()
+        self.assertEqual(rv.content_encoding, 'gzip')
+        rv = self.client.get('/v1/projects', headers={
+            'Accept-Encoding': 'gzip', 'If-None-Match': rv.headers['ETag']})
+        self.assertEqual(rv.status_code, 304)
+
+    def test_changed(self):
+        self.client.get('/v1/projects')
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        rv = self.client.get('/v1/projects')
+        self.assertIn('foo', rv.get_json()['projects'])
+
+
+class RangeTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+    URL = '/v1/projects/foo/1.2.3/1/get_zip'
+    DATA = bytes(range(256)) * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.database.add('foo', '1.2.3', 1, 'wrap', self.DATA)
+        self.etag = hashlib.sha256(self.DATA).hexdigest()
+
+    def use_blob_store(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.database.blobs = blobstore.BlobStore(tmpdir.name,
+                                                  max_bytes=len(self.DATA))
+
+    def test_full(self):
+        rv = self.client.get(self.URL)
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(rv.content_length, len(self.DATA))
+        self.assertEqual(rv.data, self.DATA)
+
+    def test_range(self):
+        rv = self.client.get(self.URL, headers={'Range': 'bytes=100000-'})
+        self.assertEqual(rv.status_code, 206)
+        self.assertEqual(rv.headers['Content-Range'],
+                         f'bytes 100000-{len(self.DATA) - 1}/{len(self.DATA)}')
+        self.assertEqual(rv.data, self.DATA[100000:])
+
+    def test_range_from_blob_store(self):
+        self.use_blob_store()
+        rv = self.client.get(self.URL, headers={'Range': 'bytes=70000-70009'})
+        self.assertEqual(rv.status_code, 206)
+        self.assertEqual(rv.content_length, 10)
+        self.assertEqual(rv.data, self.DATA[70000:70010])
+
+    def test_if_range(self):
+        self.use_blob_store()
+        rv = self.client.get(self.URL, headers={
+            'Range': 'bytes=10-', 'If-Range': f'"{self.etag}"'})
+        self.assertEqual(rv.status_code, 206)
+        self.assertEqual(rv.data, self.DATA[10:])
+        rv = self.client.get(self.URL, headers={
+            'Range': 'bytes=10-', 'If-Range': '"changed"'})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.data, self.DATA)
+
+    def test_unsatisfiable(self):
+        rv = self.client.get(self.URL, headers={
+            'Range': f'bytes={len(self.DATA)}-'})
+        self.assertEqual(rv.status_code, 416)
+
+    def test_wrap(self):
+        rv = self.client.get('/v1/projects/foo/1.2.3/1/get_wrap',
+                             headers={'Range': 'bytes=1-2'})
+        self.assertEqual(rv.status_code, 206)
+        self.assertEqual(rv.data, b'ra')
+
+
+class RedirectTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+    URL = '/v1/projects/foo/1.2.3/1/get_zip'
+
+    def setUp(self):
+        super().setUp()
+        self.app.config.update(ASSET_REDIRECT=True,
+                               ASSET_REDIRECT_MIN_SIZE=4,
+                               ASSET_REDIRECT_EXCLUDED_AGENTS=['curl/'])
+        self.database.add('foo', '1.2.3', 1, 'wrap', b'some data')
+        self.stats = api.delivery_stats()
+
+    def delivered(self):
+        stats = api.delivery_stats()
+        return (stats.redirects - self.stats.redirects,
+                stats.proxied - self.stats.proxied)
+
+    def test_redirect(self):
+        rv = self.client.get(self.URL)
+        self.assertEqual(rv.status_code, 302)
+        self.assertEqual(rv.headers['Location'],
+                         'https://github.com/mesonbuild/foo/releases/'
+                         'download/1.2.3-1/patch.zip')
+        self.assertEqual(self.delivered(), (1, 0))
+
+    def test_small_asset(self):
+        self.app.config['ASSET_REDIRECT_MIN_SIZE'] = 1024
+        rv = self.client.get(self.URL)
+        self.assertEqual(rv.data, b'some data')
+        self.assertEqual(self.delivered(), (0, 1))
+
+    def test_excluded_agent(self):
+        rv = self.client.get(self.URL, headers={'User-Agent': 'curl/7.0'})
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(self.delivered(), (0, 1))
+
+    def test_disabled(self):
+        self.app.config['ASSET_REDIRECT'] = False
+        rv = self.client.get('/v1/projects/foo/1.2.3/1/get_wrap')
+        self.assertEqual(rv.data, b'wrap')
+        self.assertEqual(self.delivered(), (0, 1))
+
+    def test_unknown(self):
+        rv = self.client.get('/v1/projects/foo/1.2.3/2/get_zip')
+        self.assertNotOk(rv, 404)
+        self.assertEqual(self.delivered(), (0, 0))
+
+
+class SendfileTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+    URL = '/v1/projects/foo/1.2.3/1/get_zip'
+
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.app.config.update(ASSET_SENDFILE='x-accel-redirect',
+                               ASSET_STORE_DIR=tmpdir.name)
+        self.database.blobs = blobstore.BlobStore(tmpdir.name,
+                                                  max_bytes=1024)
+        self.database.add('foo', '1.2.3', 1, 'wrap', b'some data')
+        self.digest = hashlib.sha256(b'some data').hexdigest()
+        self.stats = api.delivery_stats()
+
+    def offloaded(self):
+        return api.delivery_stats().offloaded - self.stats.offloaded
+
+    def test_accel_redirect(self):
+        rv = self.client.get(self.URL)
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.data, b'')
+        self.assertEqual(rv.headers['X-Accel-Redirect'],
+                         f'/_assets/blobs/{self.digest[:2]}/{self.digest}')
+        self.assertEqual(rv.headers['X-Accel-Expires'], '0')
+        self.assertEqual(rv.mimetype, 'application/zip')
+        self.assertIn('foo-1.2.3-1-wrap.zip',
+                      rv.headers['Content-Disposition'])
+        self.assertEqual(rv.get_etag(), (self.digest, False))
+        self.assertEqual(self.offloaded(), 1)
+
+    def test_sendfile(self):
+        self.app.config['ASSET_SENDFILE'] = 'x-sendfile'
+        rv = self.client.get('/v1/projects/foo/1.2.3/1/get_wrap')
+        self.assertEqual(rv.mimetype, 'text/plain')
+        digest = hashlib.sha256(b'wrap').hexdigest()
+        self.assertEqual(rv.headers['X-Sendfile'],
+                         self.database.blobs.path(digest))
+        self.assertEqual(self.offloaded(), 1)
+
+    def test_not_stored(self):
+        self.database.blobs = None
+        rv = self.client.get(self.URL)
+        self.assertEqual(rv.data, b'some data')
+        self.assertNotIn('X-Accel-Redirect', rv.headers)
+        self.assertEqual(self.offloaded(), 0)
+
+    def test_unknown(self):
+        rv = self.client.get('/v1/projects/foo/1.2.3/2/get_zip')
+        self.assertNotOk(rv, 404)
+        self.assertEqual(self.offloaded(), 0)
+
+
+class GithubHookTest(testing.TestBase):
+
+    BLUEPRINT = api.BP
+    SECRET = 'secret'
+
+    def setUp(self):
+        super().setUp()
+        self.app.config['GITHUB_WEBHOOK_SECRET'] = self.SECRET
+
+    def post(self, event, payload, secret=SECRET):
+        data = json.dumps(payload).encode('utf-8')
+        signature = hmac.new(secret.encode('utf-8'), data,
+                             hashlib.sha256).hexdigest()
+        return self.client.post('/v1/hooks/github', data=data, headers={
+            'X-GitHub-Event': event,
+            'X-Hub-Signature-256': 'sha256=' + signature,
+        })
+
+    @staticmethod
+    def repository(name='foo', owner='mesonbuild'):
+        return dict(name=name, owner=dict(login=owner))
+
+    def test_not_configured(self):
+        del self.app.config['GITHUB_WEBHOOK_SECRET']
+        self.assertNotOk(self.post('ping', {}), 404)
+
+    def test_bad_signature(self):
+        rv = self.post('release', dict(repository=self.repository()),
+                       secret='wrong')
+        self.assertNotOk(rv, 403)
+        self.assertEqual(self.database.invalidated, [])
+
+    def test_ping(self):
+        self.assertOk(self.post('ping', {}))
+
+    def test_other_organization(self):
+        rv = self.post('release', dict(action='published',
+                                       repository=self.repository(
+                                           owner='other')))
+        self.assertNotOk(rv, 400)
+        self.assertEqual(self.database.invalidated, [])
+
+    def test_release_published(self):
+        rv = self.post('release', dict(action='published',
+                                       release=dict(tag_name='1.0-1'),
+                                       repository=self.repository()))
+        self.assertOk(rv)
+        self.assertEqual(self.database.invalidated, [('releases', 'foo')])
+
+    def test_release_edited(self):
+        rv = self.post('release', dict(action='edited',
+                                       release=dict(tag_name='1.0-1'),
+                                       repository=self.repository()))
+        self.assertOk(rv)
+        self.assertEqual(self.database.invalidated, [
+            ('releases', 'foo'),
+            ('release', 'foo', '1.0-1'),
+        ])
+
+    def test_push_metadata(self):
+        rv = self.post('push', dict(
+            commits=[dict(added=[], modified=['metadata.wrap'], removed=[])],
+            repository=self.repository()))
+        self.assertOk(rv)
+        self.assertEqual(self.database.invalidated, [('metadata', 'foo')])
+
+    def test_push_other(self):
+        rv = self.post('push', dict(
+            commits=[dict(added=['meson.build'], modified=[], removed=[])],
+            repository=self.repository()))
+        self.assertOk(rv)
+        self.assertEqual(self.database.invalidated, [])
+
+    def test_repository_created(self):
+        rv = self.post('repository', dict(action='created',
+                                          repository=self.repository()))
+        self.assertOk(rv)
+        self.assertEqual(self.database.invalidated, [
+            ('repository_list',), ('releases', 'foo'), ('metadata', 'foo')])
+
+    def test_repository_renamed(self):
+        rv = self.post('repository', dict(
+            action='renamed', repository=self.repository(),
+            changes=dict(repository=dict(name={'from': 'bar'}))))
+        self.assertOk(rv)
+        self.assertEqual(self.database.invalidated, [
+            ('repository_list',), ('releases', 'foo'), ('metadata', 'foo'),
+            ('releases', 'bar'), ('metadata', 'bar')])
+
+    def test_warns_about_local_caches(self):
+        app = flask.Flask(__name__)
+        app.config['GITHUB_WEBHOOK_SECRET'] = self.SECRET
+        with self.assertLogs(api.__name__, 'WARNING') as logs:
+            app.register_blueprint(api.BP)
+        self.assertIn('release', logs.output[0])
 
 
 if __name__ == '__main__':
@@ -1,3 +1,66 @@
 class Config:
 
     GITHUB_TOKEN = 'change-me-please'
+    # Secret of the GitHub webhook delivering release, push and repository
+    # events to /v1/hooks/github, the endpoint is disabled if not set.
+    GITHUB_WEBHOOK_SECRET = None
+    # TTL of repository and release lists and of project metadata in
+    # seconds, githubdb defaults are used if not set. With the webhook
+    # configured these may be raised to hours or days, but only if all
+    # workers share the caches (CACHE_DIR or CACHE_BACKENDS): the webhook
+    # invalidates the caches of the worker receiving it.
+    CACHE_TTL = None
+    METADATA_TTL = None
+    # Nonexistent projects, releases and assets are remembered for this
+    # many seconds, up to MISSING_CACHE_SIZE entries.
+    MISSING_TTL = 60
+    MISSING_CACHE_SIZE = 10000
+    # Directory of the cache shared by all worker processes,
+    # per-process in-memory caches are used if not set.
+    CACHE_DIR = None
+    # Storage of individual caches, cache name (repo, release, asset,
+    # asset_index, metadata, ticket, missing) -> 'memory', 'disk' (requires
+    # CACHE_DIR) or 'memcached'. Caches not listed are kept on disk if
+    # CACHE_DIR is set and in memory otherwise, assets in the asset store.
+    CACHE_BACKENDS = {}
+    # Size limits in bytes of caches listed in CACHE_BACKENDS.
+    CACHE_BACKEND_BYTES = {}
+    # Unix socket path or host:port of the memcached server.
+    MEMCACHED_ADDRESS = None
+    # Directory of the on-disk asset store, CACHE_DIR/assets by default.
+    ASSET_STORE_DIR = None
+    # Size limit of the asset store.
+    ASSET_STORE_BYTES = 1024 * 1024 * 1024
+    # Answer get_wrap and get_zip with a redirect to the GitHub download
+    # URL instead of sending the asset. Assets smaller than
+    # ASSET_REDIRECT_MIN_SIZE bytes and clients whose User-Agent contains
+    # any of ASSET_REDIRECT_EXCLUDED_AGENTS are still sent directly.
+    ASSET_REDIRECT = False
+    ASSET_REDIRECT_MIN_SIZE = 16 * 1024
+    ASSET_REDIRECT_EXCLUDED_AGENTS = []
+    # Let the front-end server send assets from the asset store:
+    # 'x-accel-redirect' (nginx, see files/wrapdb-assets.conf) answers with
+    # the URI ASSET_SENDFILE_PREFIX + path below ASSET_STORE_DIR,
+    # 'x-sendfile' (Apache, lighttpd) with the absolute path of the file.
+    ASSET_SENDFILE = None
+    ASSET_SENDFILE_PREFIX = '/_assets/'
+    # Seconds clients and proxies may reuse project, version and listing
+    # responses of the API, wraps and zips are cached for a year.
+    API_MAX_AGE = 60
+    # Threads per process running independent GitHub lookups of a request
+    # concurrently, 0 runs them one after another.
+    API_LOOKUP_WORKERS = 8
+    # Renew recently requested repository, release, metadata and ticket
+    # lists in background, serving previous values meanwhile.
+    CACHE_REFRESH = True
+    # Seconds between scans for entries about to expire.
+    CACHE_REFRESH_INTERVAL = 30
+    # Entries expiring within this many seconds are refreshed.
+    CACHE_REFRESH_MARGIN = 120
+    # Entries not requested for this many seconds are left to expire.
+    CACHE_REFRESH_HOT = 24 * 60 * 60
+    # Number of concurrent refreshes per process.
+    CACHE_REFRESH_WORKERS = 2
+    # Reload the whole catalogue in bulk every this many seconds,
+    # 0 disables bulk loading.
+    CACHE_PRELOAD_INTERVAL = 30 * 60
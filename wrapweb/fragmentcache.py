@@ -0,0 +1,87 @@
+"""Cache of rendered UI pages.
+
+Pages are rendered from GithubDB data, which changes at most every few
+minutes. Rendered pages are keyed by template and view arguments and are
+valid while the data version of GithubDB is unchanged, so repeated views
+of unchanged data cost a lookup instead of fetching the data and rendering
+the template. Pages also expire after max_age seconds, so that data which
+expired without this process noticing is fetched again.
+"""
+
+import dataclasses
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable
+
+import cachetools
+import flask
+
+FRAGMENTS_SIZE = 1000
+MAX_AGE = 60
+
+
+@dataclasses.dataclass
+class FragmentStats:
+
+    hits: int = 0
+    # Renders of pages not rendered at the current data version.
+    misses: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class FragmentCache:
+    """Thread-safe LRU mapping (template, args) to rendered page.
+
+    Pages of previous data versions and older than max_age are never
+    returned.
+    """
+
+    def __init__(self, maxsize: int = FRAGMENTS_SIZE,
+                 max_age: float = MAX_AGE, timer=time.monotonic):
+        self._lock = threading.Lock()
+        self._timer = timer
+        self.max_age = max_age
+        # (template, args) -> (version, expires, page)
+        self._fragments = cachetools.LRUCache(maxsize=maxsize)
+        self._stats = FragmentStats()
+
+    def render(self, template: str, args: Hashable,
+               version: Callable[[], int],
+               context: Callable[[], Dict[str, Any]]) -> str:
+        """Returns rendered template.
+
+        Args:
+            args: arguments of the view the page depends on.
+            version: returns version of the data the page is rendered from.
+            context: returns template context, called on misses only.
+        """
+        key = (template, args)
+        current = version()
+        with self._lock:
+            entry = self._fragments.get(key)
+            if (entry is not None and entry[0] == current and
+                    entry[1] > self._timer()):
+                self._stats.hits += 1
+                return entry[2]
+            self._stats.misses += 1
+        # Concurrent misses may render the same page, both results are equal.
+        page = flask.render_template(template, **context())
+        # Fetching the context may have changed the data version, the page
+        # is rendered from the data of the new one.
+        with self._lock:
+            self._fragments[key] = (version(), self._timer() + self.max_age,
+                                    page)
+        return page
+
+    def stats(self) -> FragmentStats:
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fragments.clear()
+            self._stats = FragmentStats()
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+
+import flask
+import jinja2
+
+from mesonwrap import testing as mesonwrap_testing
+from wrapweb import api
+from wrapweb import fragmentcache
+from wrapweb import testing
+from wrapweb import ui
+
+
+class FragmentCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = mesonwrap_testing.FakeTimer()
+        self.fragments = fragmentcache.FragmentCache(maxsize=2, max_age=60,
+                                                     timer=self.timer)
+        self.context = mock.Mock(return_value=dict(projects=['foo']))
+        self.app = flask.Flask(__name__)
+        self.app.jinja_loader = jinja2.DictLoader(
+            {'page.html': '{{ projects|join(",") }}'})
+        ctx = self.app.app_context()
+        ctx.push()
+        self.addCleanup(ctx.pop)
+
+    def render(self, args=(), version=1):
+        return self.fragments.render('page.html', args, lambda: version,
+                                     self.context)
+
+    def test_hit(self):
+        page = self.render()
+        self.assertIn('foo', page)
+        self.assertEqual(self.render(), page)
+        self.context.assert_called_once()
+        stats = self.fragments.stats()
+        self.assertEqual((stats.hits, stats.misses), (1, 1))
+        self.assertEqual(stats.hit_ratio, 0.5)
+
+    def test_key(self):
+        self.render()
+        self.render(args=('foo',))
+        self.render(version=2)
+        self.assertEqual(self.context.call_count, 3)
+        self.assertEqual(self.fragments.stats().hit_ratio, 0.0)
+
+    def test_expired(self):
+        self.render()
+        self.timer.now += 60
+        self.render()
+        self.assertEqual(self.context.call_count, 2)
+
+    def test_version_changed_by_context(self):
+        versions = iter([1, 2, 2])
+        for _ in range(2):
+            self.fragments.render('page.html', (), lambda: next(versions),
+                                  self.context)
+        self.context.assert_called_once()
+
+
+class UiTest(testing.TestBase):
+
+    BLUEPRINT = ui.BP
+
+    def setUp(self):
+        super().setUp()
+        self.app.register_blueprint(api.BP)  # pages link to the API
+        ui._fragments.clear()
+
+    def test_project_rendered_once(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        page = self.client.get('/foo').data
+        with mock.patch.object(self.database, 'get_versions') as versions:
+            self.assertEqual(self.client.get('/foo').data, page)
+        versions.assert_not_called()
+        self.assertEqual(ui.fragment_stats().hits, 1)
+
+    def test_no_such_project(self):
+        self.assertIn(b'No such project', self.client.get('/foo').data)
+
+    def test_changed(self):
+        self.database.add('foo', '1.2.3', 1, '', b'')
+        self.client.get('/async/projects')
+        self.database.add('bar', '1.2.3', 1, '', b'')
+        self.assertIn(b'bar', self.client.get('/async/projects').data)
+        self.assertEqual(ui.fragment_stats().misses, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,246 @@
+"""HTTP validators, Cache-Control and compression of API responses.
+
+ETags are strong and derived from the response content, so they are the
+same in every worker. The ETag of every path is remembered together with
+the data version of GithubDB it was computed at, conditional requests
+matching it are answered with 304 Not Modified without running the view.
+
+Bodies of large, slowly changing responses may be kept as well, together
+with their gzip and brotli encodings, so they are serialized and compressed
+once per data version.
+"""
+
+import dataclasses
+import functools
+import gzip
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import cachetools
+import flask
+
+try:
+    import brotli
+except ImportError:  # optional, responses are gzip encoded only
+    brotli = None
+
+# (project, branch, revision) assets never change.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+MAX_AGE = 60
+VALIDATORS_SIZE = 10000
+BODIES_BYTES = 64 * 1024 * 1024
+# Smaller bodies are not worth compressing.
+COMPRESS_MIN_SIZE = 1024
+IDENTITY = 'identity'
+GZIP = 'gzip'
+BROTLI = 'br'
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class ValidatorCache:
+    """Thread-safe LRU mapping path to ETag valid at a data version."""
+
+    def __init__(self, maxsize: int = VALIDATORS_SIZE, timer=time.monotonic):
+        self._lock = threading.Lock()
+        self._timer = timer
+        # path -> (version, expires, etag)
+        self._entries = cachetools.LRUCache(maxsize=maxsize)
+
+    def get(self, path: str, version: int) -> Optional[str]:
+        with self._lock:
+            entry: Optional[Tuple[int, float, str]] = self._entries.get(path)
+            if entry is None:
+                return None
+            entry_version, expires, etag = entry
+            if entry_version != version or expires <= self._timer():
+                return None
+            return etag
+
+    def put(self, path: str, version: int, etag: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[path] = (version, self._timer() + ttl, etag)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def etag(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _encode(data: bytes) -> Dict[str, bytes]:
+    """Returns data in every content coding worth using."""
+    bodies = {IDENTITY: data}
+    if len(data) < COMPRESS_MIN_SIZE:
+        return bodies
+    # Compressed on the request path whenever the data version changes,
+    # higher levels cost much more CPU for a few percent of size.
+    bodies[GZIP] = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if brotli is not None:
+        bodies[BROTLI] = brotli.compress(data, quality=BROTLI_QUALITY)
+    return bodies
+
+
+@dataclasses.dataclass(frozen=True)
+class Representation:
+    """Encoded bodies of a response."""
+
+    etag: str
+    mimetype: str
+    bodies: Dict[str, bytes]
+
+    @classmethod
+    def create(cls, data: bytes, mimetype: str) -> 'Representation':
+        return cls(etag=etag(data), mimetype=mimetype, bodies=_encode(data))
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+    def negotiate(self, request: flask.Request) -> str:
+        """Returns the best content coding accepted by the client."""
+        accepted = request.accept_encodings
+        best = max(self.bodies, key=lambda encoding: (
+            accepted[encoding],
+            # Prefer the smallest body among equally acceptable.
+            -len(self.bodies[encoding])))
+        if best != IDENTITY and not accepted[best]:
+            return IDENTITY
+        return best
+
+    def etag_of(self, encoding: str) -> str:
+        # Encoded bodies differ, so must their strong ETags.
+        if encoding == IDENTITY:
+            return self.etag
+        return f'{self.etag}-{encoding}'
+
+
+class BodyCache:
+    """Thread-safe LRU mapping path to Representation valid at a version.
+
+    Bounded by total size of the bodies in bytes.
+    """
+
+    def __init__(self, max_bytes: int = BODIES_BYTES, timer=time.monotonic):
+        self._lock = threading.Lock()
+        self._timer = timer
+        # path -> (version, expires, representation)
+        self._entries = cachetools.LRUCache(
+            maxsize=max_bytes, getsizeof=lambda entry: entry[2].size)
+
+    def get(self, path: str, version: int) -> Optional[Representation]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            entry_version, expires, rep = entry
+            if entry_version != version or expires <= self._timer():
+                return None
+            return rep
+
+    def put(self, path: str, version: int, rep: Representation,
+            ttl: float) -> None:
+        with self._lock:
+            try:
+                self._entries[path] = (version, self._timer() + ttl, rep)
+            except ValueError:  # too large
+                self._entries.pop(path, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _not_modified(tag: str, cache_control: str) -> flask.Response:
+    resp = flask.Response(status=304)
+    resp.set_etag(tag)
+    resp.headers['Cache-Control'] = cache_control
+    return resp
+
+
+def _send(rep: Representation, cache_control: str) -> flask.Response:
+    request = flask.request
+    encoding = rep.negotiate(request)
+    tag = rep.etag_of(encoding)
+    if tag in request.if_none_match:
+        resp = _not_modified(tag, cache_control)
+    else:
+        resp = flask.Response(rep.bodies[encoding], mimetype=rep.mimetype)
+        resp.set_etag(tag)
+        resp.headers['Cache-Control'] = cache_control
+        if encoding != IDENTITY:
+            resp.content_encoding = encoding
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+
+def cached(validators: ValidatorCache, data_version: Callable[[], int],
+           max_age: Callable[[], int], immutable: bool = False,
+           endpoint: Optional[str] = None,
+           bodies: Optional[BodyCache] = None, ranges: bool = False):
+    """Decorates view adding ETag and Cache-Control to its responses.
+
+    Views may set a strong ETag themselves, e.g. for streamed responses,
+    otherwise it is computed from the response body.
+
+    Args:
+        validators: remembers ETags of the paths served by the view.
+        data_version: returns version of the data the view depends on.
+        max_age: returns seconds clients and proxies may reuse responses,
+            also bounds the time an ETag is trusted without running
+            the view, ignored for immutable responses.
+        endpoint: the view is only cached while serving this endpoint,
+            calls from other views are passed through.
+        bodies: if set, successful responses are kept encoded and sent
+            in the content coding preferred by the client, validators
+            are not used then.
+        ranges: serve Range requests of responses with Content-Length,
+            including If-Range, with 206 Partial Content.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = flask.request
+            if endpoint is not None and request.endpoint != endpoint:
+                return view(*args, **kwargs)
+            if immutable:
+                ttl = IMMUTABLE_MAX_AGE
+                cache_control = f'public, max-age={ttl}, immutable'
+            else:
+                ttl = max_age()
+                cache_control = f'public, max-age={ttl}'
+            # Immutable responses do not depend on the data version.
+            version = 0 if immutable else data_version()
+            if bodies is not None:
+                rep = bodies.get(request.path, version)
+                if rep is not None:
+                    return _send(rep, cache_control)
+            known = validators.get(request.path, version)
+            if known is not None and known in request.if_none_match:
+                return _not_modified(known, cache_control)
+            resp = flask.make_response(view(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+            if bodies is not None and not resp.is_streamed:
+                rep = Representation.create(resp.get_data(), resp.mimetype)
+                bodies.put(request.path, version, rep, ttl)
+                return _send(rep, cache_control)
+            resp.headers['Cache-Control'] = cache_control
+            tag, weak = resp.get_etag()
+            if tag is None or weak:
+                if resp.is_streamed:
+                    return resp  # do not buffer the stream
+                tag = etag(resp.get_data())
+                resp.set_etag(tag)
+            validators.put(request.path, version, tag, ttl)
+            if ranges:
+                return resp.make_conditional(
+                    request, accept_ranges=True,
+                    complete_length=resp.content_length)
+            return resp.make_conditional(request)
+        return wrapper
+    return decorator
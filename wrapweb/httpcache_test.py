@@ -0,0 +1,73 @@
+import unittest
+
+import flask
+
+from mesonwrap import testing
+from wrapweb import httpcache
+
+
+class ValidatorCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = testing.FakeTimer()
+        self.validators = httpcache.ValidatorCache(timer=self.timer)
+
+    def test_version(self):
+        self.validators.put('/a', version=1, etag='x', ttl=60)
+        self.assertEqual(self.validators.get('/a', version=1), 'x')
+        self.assertIsNone(self.validators.get('/a', version=2))
+        self.assertIsNone(self.validators.get('/b', version=1))
+
+    def test_expires(self):
+        self.validators.put('/a', version=1, etag='x', ttl=60)
+        self.timer.now += 60
+        self.assertIsNone(self.validators.get('/a', version=1))
+
+
+class RepresentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.rep = httpcache.Representation.create(
+            b'x' * httpcache.COMPRESS_MIN_SIZE, 'application/json')
+
+    def negotiate(self, accept_encoding):
+        headers = dict()
+        if accept_encoding is not None:
+            headers['Accept-Encoding'] = accept_encoding
+        with self.app.test_request_context(headers=headers):
+            return self.rep.negotiate(flask.request)
+
+    def test_negotiate(self):
+        self.assertEqual(self.negotiate(None), httpcache.IDENTITY)
+        self.assertEqual(self.negotiate('identity'), httpcache.IDENTITY)
+        self.assertEqual(self.negotiate('gzip, deflate'), httpcache.GZIP)
+        self.assertEqual(self.negotiate('*'), self.negotiate('gzip, br'))
+        self.assertEqual(self.negotiate('gzip;q=0'), httpcache.IDENTITY)
+
+    def test_small(self):
+        rep = httpcache.Representation.create(b'{}', 'application/json')
+        self.assertEqual(list(rep.bodies), [httpcache.IDENTITY])
+
+    def test_etag(self):
+        self.assertEqual(self.rep.etag_of(httpcache.IDENTITY), self.rep.etag)
+        self.assertNotEqual(self.rep.etag_of(httpcache.GZIP), self.rep.etag)
+
+
+class BodyCacheTest(unittest.TestCase):
+
+    def test_max_bytes(self):
+        bodies = httpcache.BodyCache(max_bytes=3)
+        rep = httpcache.Representation.create(b'ab', 'text/plain')
+        bodies.put('/a', version=1, rep=rep, ttl=60)
+        self.assertIs(bodies.get('/a', version=1), rep)
+        self.assertIsNone(bodies.get('/a', version=2))
+        bodies.put('/b', version=1, rep=rep, ttl=60)
+        self.assertIsNone(bodies.get('/a', version=1))
+        bodies.put('/c', version=1, rep=httpcache.Representation.create(
+            b'abcd', 'text/plain'), ttl=60)
+        self.assertIsNone(bodies.get('/c', version=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,311 @@
+"""Preforking HTTP server for deployments without uwsgi.
+
+The master process warms the caches, binds the listening socket and forks
+the workers, which share the warmed caches copy-on-write. Every worker
+serves connections on a bounded thread pool, keeping connections alive
+between requests.
+
+Signals of the master:
+    SIGHUP: graceful reload. The caches are warmed again and new workers
+        are forked, old workers finish requests in progress and exit.
+    SIGTERM, SIGINT: graceful stop.
+Workers exiting unexpectedly are replaced. Requires a POSIX system.
+"""
+
+import concurrent.futures
+import io
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Callable, Optional, Set
+
+import werkzeug.serving
+
+# Idle keep-alive connections are closed after this many seconds, it also
+# bounds the time a write to a stalled client may take.
+KEEPALIVE_TIMEOUT = 15.0
+# Workers exiting sooner after start are replaced after this delay.
+RESPAWN_DELAY = 1.0
+_SIGNALS = {signal.SIGCHLD, signal.SIGHUP, signal.SIGINT, signal.SIGTERM}
+
+_log = logging.getLogger(__name__)
+
+
+class _RequestHandler(werkzeug.serving.WSGIRequestHandler):
+    """Keeps connections alive between requests without a body.
+
+    Relies on internals of werkzeug.serving.WSGIRequestHandler.run_wsgi()
+    of Werkzeug 2.1 to 3.1, covered by prefork_test.py: it always sends
+    "Connection: close", and after the response it reads and discards
+    whatever the client sent meanwhile from self.rfile, so that an unread
+    request body is never taken for the next request.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        super().setup()
+        self._requests = 0
+
+    def handle_one_request(self) -> None:
+        if self._requests and not self.server.await_request(self.connection):
+            self.close_connection = True  # draining
+            return
+        self._requests += 1
+        super().handle_one_request()
+
+    def parse_request(self) -> bool:
+        # The request line is read, the connection is busy.
+        self.server.request_started(self.connection)
+        return super().parse_request()
+
+    def finish(self) -> None:
+        self.server.request_started(self.connection)
+        super().finish()
+
+    def _keep_alive(self) -> bool:
+        return (not self.server.draining and
+                self.headers.get('Content-Length', '0') == '0' and
+                'Transfer-Encoding' not in self.headers)
+
+    def run_wsgi(self) -> None:
+        if not self._keep_alive():
+            super().run_wsgi()
+            return
+        # Nothing is left to discard, the next request must not be.
+        rfile, self.rfile = self.rfile, io.BytesIO()
+        try:
+            super().run_wsgi()
+        finally:
+            self.rfile = rfile
+
+    def send_header(self, keyword: str, value: str) -> None:
+        if (keyword.lower() == 'connection' and value.lower() == 'close' and
+                self._keep_alive()):
+            return
+        super().send_header(keyword, value)
+
+
+class PooledWSGIServer(werkzeug.serving.BaseWSGIServer):
+    """WSGI server handling connections on a bounded thread pool.
+
+    The server stops accepting connections while all threads are busy,
+    leaving them to other workers listening on the same socket.
+    """
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int,
+                 keepalive: float = KEEPALIVE_TIMEOUT, fd: int = None):
+        handler = type('RequestHandler', (_RequestHandler,),
+                       {'timeout': keepalive})
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self._slots = threading.BoundedSemaphore(threads)
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='wrapweb-http')
+        self._lock = threading.Lock()
+        # Keep-alive connections waiting for their next request.
+        self._idle: Set[socket.socket] = set()
+        self.draining = False
+
+    def await_request(self, conn: socket.socket) -> bool:
+        """Marks connection idle, returns False if draining."""
+        with self._lock:
+            if self.draining:
+                return False
+            self._idle.add(conn)
+            return True
+
+    def request_started(self, conn: socket.socket) -> None:
+        with self._lock:
+            self._idle.discard(conn)
+
+    def drain(self) -> None:
+        """Closes idle connections, busy ones after their request."""
+        with self._lock:
+            self.draining = True
+            for conn in self._idle:
+                try:
+                    conn.shutdown(socket.SHUT_RD)  # wakes up the reader
+                except OSError:
+                    pass
+
+    def process_request(self, request, client_address) -> None:
+        self._slots.acquire()
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def wait(self) -> None:
+        """Waits for connections in progress, call after shutdown()."""
+        self._pool.shutdown(wait=True)
+
+
+def _serve_worker(sock: socket.socket, app, threads: int,
+                  keepalive: float) -> None:
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads=threads,
+                              keepalive=keepalive, fd=sock.fileno())
+    sock.close()  # the server uses a duplicate
+
+    def stop(signum, frame):
+        server.drain()
+        # shutdown() waits for serve_forever() of this thread to return.
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master stops us
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.pthread_sigmask(signal.SIG_SETMASK, set())
+    server.serve_forever()
+    server.server_close()
+    server.wait()
+
+
+def _describe(status: int) -> str:
+    """Describes wait status, os.waitstatus_to_exitcode() needs 3.9."""
+    if os.WIFSIGNALED(status):
+        return f'was killed by signal {os.WTERMSIG(status)}'
+    return f'exited with {os.WEXITSTATUS(status)}'
+
+
+class Master:
+
+    def __init__(self, app, host: str, port: int, workers: int,
+                 threads: int, keepalive: float = KEEPALIVE_TIMEOUT,
+                 warm: Optional[Callable[[], None]] = None):
+        """Initialize Master.
+
+        Args:
+            warm: optionally fills caches, called before workers are
+                  forked.
+        """
+        self.app = app
+        self.address = (host, port)
+        self.workers = workers
+        self.threads = threads
+        self.keepalive = keepalive
+        self.warm = warm
+        # pid -> start time of the current generation of workers
+        self._current = dict()
+        # pids of workers of previous generations
+        self._retiring: Set[int] = set()
+        self._stopping = False
+        self._socket = None
+
+    def _warm(self) -> None:
+        if self.warm is None:
+            return
+        start = time.monotonic()
+        try:
+            self.warm()
+        except Exception:
+            # Workers fill the caches on demand.
+            _log.exception('Warming caches failed')
+            return
+        _log.info('Warmed caches in %.1fs', time.monotonic() - start)
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                _serve_worker(self._socket, self.app, self.threads,
+                              self.keepalive)
+                status = 0
+            except Exception:
+                _log.exception('Worker %d failed', os.getpid())
+            finally:
+                os._exit(status)  # never return into the master's loop
+        self._current[pid] = time.monotonic()
+
+    def _reap(self) -> None:
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self._retiring.discard(pid)
+            started = self._current.pop(pid, None)
+            if started is None or self._stopping:
+                continue
+            _log.warning('Worker %d %s, replacing it',
+                         pid, _describe(status))
+            if time.monotonic() - started < RESPAWN_DELAY:
+                time.sleep(RESPAWN_DELAY)
+            self._spawn()
+
+    def reload(self) -> None:
+        """Replaces workers by ones forked after warming caches again."""
+        self._warm()
+        old = set(self._current)
+        self._current.clear()
+        for _ in range(self.workers):
+            self._spawn()
+        self._retire(old)
+
+    def _retire(self, pids) -> None:
+        for pid in pids:
+            self._retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def stop(self) -> None:
+        """Stops workers gracefully and waits for them."""
+        self._stopping = True
+        self._retire(list(self._current))
+        self._current.clear()
+        while self._retiring:
+            pid, _ = os.wait()
+            self._retiring.discard(pid)
+
+    def run(self) -> None:
+        host, port = self.address
+        self._socket = socket.socket(
+            werkzeug.serving.select_address_family(host, port),
+            socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(self.address)
+        self._socket.listen(1024)
+        _log.info('Listening on %s:%d', *self._socket.getsockname()[:2])
+        # Signals are handled by the loop below, not at random points.
+        signal.pthread_sigmask(signal.SIG_BLOCK, _SIGNALS)
+        try:
+            self._warm()
+            for _ in range(self.workers):
+                self._spawn()
+            while True:
+                signum = signal.sigwait(_SIGNALS)
+                if signum == signal.SIGCHLD:
+                    self._reap()
+                elif signum == signal.SIGHUP:
+                    _log.info('Reloading')
+                    self.reload()
+                else:
+                    _log.info('Stopping')
+                    self.stop()
+                    return
+        finally:
+            self._socket.close()
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+
+
+def serve(app, host: str, port: int, workers: int, threads: int,
+          keepalive: float = KEEPALIVE_TIMEOUT,
+          warm: Optional[Callable[[], None]] = None) -> None:
+    """Serves app until SIGTERM or SIGINT, see module docstring."""
+    Master(app, host, port, workers=workers, threads=threads,
+           keepalive=keepalive, warm=warm).run()
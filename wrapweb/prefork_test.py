@@ -0,0 +1,167 @@
+import http.client
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+import flask
+
+from mesonwrap import tempfile
+from wrapweb import prefork
+
+_MASTER = '''
+import logging, os, sys
+import flask
+from wrapweb import prefork
+logging.basicConfig(level=logging.INFO)
+app = flask.Flask('test')
+warmed = []
+
+
+@app.route('/')
+def index():
+    return f'{os.getpid()} {len(warmed)}'
+
+
+prefork.serve(app, '127.0.0.1', 0, workers=2, threads=2, keepalive=60,
+              warm=lambda: warmed.append(None))
+'''
+
+
+class PooledWSGIServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+
+        @self.app.route('/', methods=['GET', 'POST'])
+        def index():
+            return 'body:' + flask.request.get_data(as_text=True)
+
+        self.server = prefork.PooledWSGIServer('127.0.0.1', 0, self.app,
+                                               threads=2, keepalive=5)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.addCleanup(self.stop)
+        self.conn = http.client.HTTPConnection('127.0.0.1',
+                                               self.server.server_port,
+                                               timeout=5)
+        self.addCleanup(self.conn.close)
+
+    def stop(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.conn.close()
+        self.server.wait()
+
+    def request(self, method, body=None):
+        self.conn.request(method, '/', body=body)
+        rv = self.conn.getresponse()
+        return rv, rv.read()
+
+    def test_keepalive(self):
+        rv, body = self.request('GET')
+        self.assertEqual(body, b'body:')
+        self.assertIsNone(rv.getheader('Connection'))
+        sock = self.conn.sock
+        rv, body = self.request('GET')
+        self.assertEqual(body, b'body:')
+        self.assertIs(self.conn.sock, sock)
+
+    def test_body_closes(self):
+        rv, body = self.request('POST', body=b'data')
+        self.assertEqual(body, b'body:data')
+        self.assertEqual(rv.getheader('Connection'), 'close')
+        rv, body = self.request('GET')  # reconnects
+        self.assertEqual(body, b'body:')
+
+
+class DescribeTest(unittest.TestCase):
+
+    @staticmethod
+    def status(code):
+        child = subprocess.Popen([sys.executable, '-c', code])
+        _, status = os.waitpid(child.pid, 0)
+        child.returncode = 0  # reaped above
+        return status
+
+    def test_exited(self):
+        self.assertEqual(prefork._describe(self.status('exit(3)')),
+                         'exited with 3')
+
+    def test_killed(self):
+        status = self.status('import os, signal; '
+                             'os.kill(os.getpid(), signal.SIGKILL)')
+        self.assertEqual(prefork._describe(status),
+                         f'was killed by signal {signal.SIGKILL:d}')
+
+
+class MasterTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.log = os.path.join(tmpdir.name, 'log')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with open(self.log, 'w') as log:
+            self.master = subprocess.Popen(
+                [sys.executable, '-c', _MASTER], stderr=log,
+                env=dict(os.environ, PYTHONPATH=root))
+        self.addCleanup(self.kill)
+        self.port = int(self.wait_for(
+            lambda: re.search(r'Listening on [^:]+:(\d+)',
+                              open(self.log).read())).group(1))
+
+    def kill(self):
+        if self.master.poll() is None:
+            self.master.kill()
+            self.master.wait()
+
+    @staticmethod
+    def wait_for(predicate, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            result = predicate()
+            if result:
+                return result
+            time.sleep(0.05)
+        raise AssertionError('Timed out')
+
+    def get(self, conn=None):
+        """Returns (worker pid, times caches were warmed)."""
+        conn = conn or http.client.HTTPConnection('127.0.0.1', self.port,
+                                                  timeout=5)
+        conn.request('GET', '/')
+        pid, warmed = conn.getresponse().read().split()
+        return int(pid), int(warmed)
+
+    @staticmethod
+    def exited(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        return False
+
+    def test_reload_and_stop(self):
+        idle = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        self.addCleanup(idle.close)
+        old, warmed = self.get(idle)  # kept alive
+        self.assertEqual(warmed, 1)
+        self.master.send_signal(signal.SIGHUP)
+        new, warmed = self.wait_for(lambda: (
+            lambda rv: rv if rv[1] == 2 else None)(self.get()))
+        self.assertNotEqual(new, old)
+        # The old worker closes the idle connection and exits.
+        self.wait_for(lambda: self.exited(old))
+        self.master.send_signal(signal.SIGTERM)
+        self.assertEqual(self.master.wait(timeout=10), 0)
+        self.assertTrue(self.exited(new))
+
+
+if __name__ == '__main__':
+    unittest.main()
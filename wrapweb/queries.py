@@ -0,0 +1,139 @@
+"""Queries of wrap data shared by the API and the UI.
+
+Results are typed, JSON is produced only by the API views.
+"""
+
+import concurrent.futures
+import dataclasses
+import functools
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import flask
+
+from mesonwrap import githubdb
+
+_log = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class Version:
+
+    branch: str
+    revision: int
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'branch': self.branch, 'revision': self.revision}
+
+
+@dataclasses.dataclass(frozen=True)
+class Project:
+
+    name: str
+    # Sorted, latest first.
+    versions: List[Version]
+    # homepage and description, if set
+    metadata: Dict[str, str]
+
+    @property
+    def latest(self) -> Optional[Version]:
+        return self.versions[0] if self.versions else None
+
+
+# pid -> executor of concurrent GithubDB lookups
+_executors: Dict[int, concurrent.futures.ThreadPoolExecutor] = dict()
+_executors_lock = threading.Lock()
+
+
+def _executor() -> Optional[concurrent.futures.ThreadPoolExecutor]:
+    """Returns executor shared by all requests of this process.
+
+    Threads are not inherited by forked processes, neither is the executor.
+    Returns None if concurrent lookups are disabled.
+    """
+    workers = flask.current_app.config.get('API_LOOKUP_WORKERS', 8)
+    if not workers:
+        return None
+    pid = os.getpid()
+    with _executors_lock:
+        executor = _executors.get(pid)
+        if executor is None:
+            executor = _executors[pid] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='wrapweb-lookup')
+        return executor
+
+
+def _gather(*lookups: Callable[[], Any]) -> List[Any]:
+    """Runs independent lookups concurrently, returns their results.
+
+    On a cold cache a request costs the slowest lookup, not their sum.
+    """
+    executor = _executor()
+    if executor is None or not lookups:
+        return [lookup() for lookup in lookups]
+    futures = [executor.submit(lookup) for lookup in lookups[1:]]
+    # The request thread would wait anyway, let it do one of the lookups.
+    first = lookups[0]()
+    return [first] + [future.result() for future in futures]
+
+
+def _metadata_fields(metadata) -> Dict[str, str]:
+    md = dict()
+    if metadata is not None:
+        for field in ['homepage', 'description']:
+            if metadata.has(field):
+                md[field] = getattr(metadata, field)
+    return md
+
+
+def _versions(matches: List[githubdb.Version]) -> List[Version]:
+    return [Version(branch, revision) for branch, revision in matches]
+
+
+def project_names(db, prefix: str = '') -> List[str]:
+    """Returns sorted names of projects starting with prefix."""
+    return db.name_search(prefix)
+
+
+def latest_version(db, project: str) -> Optional[Version]:
+    latest = db.get_latest_version(project)
+    if latest is None:
+        return None
+    return Version(*latest)
+
+
+def project(db, name: str) -> Optional[Project]:
+    """Returns project, None if there is no such project."""
+    metadata, matches = _gather(
+        lambda: db.get_metadata(name),
+        lambda: db.get_versions(name))
+    # On a cold cache has_project() lists all repositories, it is only
+    # needed to tell projects without releases from nonexistent ones.
+    if not matches and not db.has_project(name):
+        return None
+    return Project(name=name, versions=_versions(matches),
+                   metadata=_metadata_fields(metadata))
+
+
+def _catalogue_entry(db, name: str) -> Project:
+    return Project(name=name, versions=_versions(db.get_versions(name)),
+                   metadata=_metadata_fields(db.get_metadata(name)))
+
+
+def catalogue(db) -> List[Project]:
+    """Returns every project, sorted by name.
+
+    Unless bulk loading is disabled, a catalogue never loaded in bulk is
+    loaded first, which costs a few GraphQL requests instead of two REST
+    requests per project.
+    """
+    if (flask.current_app.config.get('CACHE_PRELOAD_INTERVAL') and
+            db.catalogue_age() is None):
+        try:
+            db.load_catalogue()
+        except Exception as e:  # projects are looked up one by one
+            _log.warning('Loading catalogue failed: %s', e)
+    return _gather(*[functools.partial(_catalogue_entry, db, name)
+                     for name in db.name_search('')])
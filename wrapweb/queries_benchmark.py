@@ -0,0 +1,66 @@
+"""Compares UI data access through API views and through queries.
+
+Run with python3 -m wrapweb.queries_benchmark [--projects N].
+
+Before queries, ui.py called API views and parsed their JSON responses
+back, which is measured as "json round trip".
+"""
+
+import argparse
+import json
+import timeit
+from unittest import mock
+
+import flask
+
+from wrapweb import api
+from wrapweb import queries
+from wrapweb import testing
+
+
+def _database(projects: int, versions: int) -> testing.FakeDatabase:
+    db = testing.FakeDatabase()
+    for i in range(projects):
+        for revision in range(1, versions + 1):
+            db.add(f'project{i:05d}', '1.0.0', revision, '', b'')
+        db.set_metadata(f'project{i:05d}', description=f'Project {i}')
+    return db
+
+
+def _round_trip(view, *args):
+    return json.loads(view(*args).get_data().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--projects', type=int, default=5000)
+    parser.add_argument('--versions', type=int, default=10)
+    parser.add_argument('--number', type=int, default=50)
+    args = parser.parse_args()
+    db = _database(args.projects, args.versions)
+    app = flask.Flask(__name__)
+    app.config['API_LOOKUP_WORKERS'] = 0  # measure serialization only
+    cases = [
+        ('project list',
+         lambda: _round_trip(api.get_projectlist),
+         lambda: queries.project_names(db)),
+        ('project',
+         lambda: _round_trip(api.get_project_info, 'project00042'),
+         lambda: queries.project(db, 'project00042')),
+    ]
+    print(f'{args.projects} projects, {args.versions} versions each, '
+          'microseconds per request')
+    print(f'{"":14} {"json round trip":>16} {"queries":>10} {"saving":>10}')
+    with mock.patch.object(api, '_database', return_value=db), \
+            app.test_request_context('/'):
+        for name, before, after in cases:
+            before_us = (timeit.timeit(before, number=args.number) /
+                         args.number * 1e6)
+            after_us = (timeit.timeit(after, number=args.number) /
+                        args.number * 1e6)
+            print(f'{name:14} {before_us:16.1f} {after_us:10.1f} '
+                  f'{before_us - after_us:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
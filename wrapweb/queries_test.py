@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+import flask
+
+from wrapweb import queries
+from wrapweb import testing
+
+
+class QueriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = testing.FakeDatabase()
+        self.db.add('foo', '1.2.3', 2, '', b'')
+        self.db.add('foo', '1.2.3', 1, '', b'')
+        self.db.add('foobar', '1.0.0', 1, '', b'')
+        self.db.set_metadata('foo', homepage='https://example.com')
+        ctx = flask.Flask(__name__).app_context()
+        ctx.push()
+        self.addCleanup(ctx.pop)
+
+    def test_project_names(self):
+        self.assertEqual(queries.project_names(self.db), ['foo', 'foobar'])
+        self.assertEqual(queries.project_names(self.db, 'foob'), ['foobar'])
+
+    def test_latest_version(self):
+        self.assertEqual(queries.latest_version(self.db, 'foo'),
+                         queries.Version('1.2.3', 2))
+        self.assertIsNone(queries.latest_version(self.db, 'bar'))
+
+    def test_project(self):
+        self.assertEqual(queries.project(self.db, 'foo'), queries.Project(
+            name='foo',
+            versions=[queries.Version('1.2.3', 2),
+                      queries.Version('1.2.3', 1)],
+            metadata={'homepage': 'https://example.com'}))
+        self.assertIsNone(queries.project(self.db, 'bar'))
+
+    def test_project_with_versions_not_listed(self):
+        with mock.patch.object(self.db, 'has_project') as has_project:
+            self.assertIsNotNone(queries.project(self.db, 'foo'))
+        has_project.assert_not_called()
+
+    def test_catalogue(self):
+        catalogue = queries.catalogue(self.db)
+        self.assertEqual([p.name for p in catalogue], ['foo', 'foobar'])
+        self.assertEqual(catalogue[1].latest, queries.Version('1.0.0', 1))
+        self.assertEqual(catalogue[1].metadata, {})
+        self.assertEqual(self.db.catalogue_loads, 0)  # preload disabled
+
+    def test_catalogue_loaded_in_bulk(self):
+        flask.current_app.config['CACHE_PRELOAD_INTERVAL'] = 60
+        queries.catalogue(self.db)
+        queries.catalogue(self.db)
+        self.assertEqual(self.db.catalogue_loads, 1)
+
+    def test_empty_catalogue(self):
+        self.assertEqual(queries.catalogue(testing.FakeDatabase()), [])
+
+    def test_to_json(self):
+        self.assertEqual(queries.Version('1.2.3', 1).to_json(),
+                         {'branch': '1.2.3', 'revision': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
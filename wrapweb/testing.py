@@ -1,11 +1,13 @@
 from collections import defaultdict
 import dataclasses
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 import unittest
 from unittest import mock
 
 import flask
 
+from mesonwrap import blobstore
+from mesonwrap import githubdb
 from mesonwrap import ini
 from wrapweb import api
 
@@ -29,16 +31,34 @@ class FakeDatabase:
         self._projects = defaultdict(lambda: defaultdict(dict))
         # Dict[project -> metadata]
         self._metadata = dict()
+        # [(method, args)]
+        self.invalidated = []
+        self.organization = 'mesonbuild'
+        self.version = 0
+        # blobstore.BlobStore returned assets are put into, if set.
+        self.blobs = None
+        self.catalogue_loads = 0
 
     def add(self, name: str, version: str, revision: int,
             wrapfile_content: str, zip: bytes) -> None:
+        self.version += 1
         self._projects[name][version][revision] = (
             FakeRelease(name, version, revision,
                         wrapfile_content, zip))
 
     def set_metadata(self, name: str, **kwargs):
+        self.version += 1
         self._metadata[name] = kwargs
 
+    def data_version(self) -> int:
+        return self.version
+
+    def load_catalogue(self) -> None:
+        self.catalogue_loads += 1
+
+    def catalogue_age(self) -> Optional[float]:
+        return 0.0 if self.catalogue_loads else None
+
     def get_metadata(self, name: str) -> Optional[ini.WrapMeta]:
         meta = self._metadata.get(name)
         if not meta:
@@ -55,6 +75,9 @@ class FakeDatabase:
         return sorted([repo for repo in self._projects
                        if repo.startswith(text)])
 
+    def has_project(self, project: str) -> bool:
+        return project in self._projects
+
     def get_versions(self, project: str) -> List[Version]:
         if project not in self._projects:
             return []
@@ -72,12 +95,55 @@ class FakeDatabase:
             return None
         return results[0]
 
+    def _release(self, project, branch, revision) -> Optional[FakeRelease]:
+        return self._projects.get(project, {}).get(branch, {}).get(revision)
+
     def get_wrap(self, project, branch, revision) -> Optional[str]:
-        return self._projects[project][branch][revision].wrapfile_content
+        release = self._release(project, branch, revision)
+        return release.wrapfile_content if release is not None else None
 
     def get_zip(self, project, branch, revision) -> Optional[bytes]:
-        return self._projects[project][branch][revision].zip
+        release = self._release(project, branch, revision)
+        return release.zip if release is not None else None
+
+    def get_asset(self, project, branch, revision,
+                  label) -> Optional[Union[bytes, blobstore.Blob]]:
+        release = self._release(project, branch, revision)
+        if release is None:
+            return None
+        content = {
+            githubdb.UPSTREAM_WRAP_LABEL: release.wrapfile_content.encode(),
+            githubdb.PATCH_ZIP_LABEL: release.zip,
+        }[label]
+        if self.blobs is None:
+            return content
+        return self.blobs.put((project, branch, revision, label), content)
+
+    def get_asset_info(self, project, branch, revision,
+                       label) -> Optional[githubdb.AssetInfo]:
+        release = self._release(project, branch, revision)
+        if release is None:
+            return None
+        content = {
+            githubdb.UPSTREAM_WRAP_LABEL: release.wrapfile_content.encode(),
+            githubdb.PATCH_ZIP_LABEL: release.zip,
+        }[label]
+        return githubdb.AssetInfo(
+            url=f'https://github.com/mesonbuild/{project}/releases/'
+                f'download/{branch}-{revision}/{label}',
+            size=len(content))
+
+    def invalidate_repository_list(self) -> None:
+        self.invalidated.append(('repository_list',))
+
+    def invalidate_releases(self, project: str) -> None:
+        self.invalidated.append(('releases', project))
+
+    def invalidate_release(self, project: str, tag: str) -> None:
+        self.invalidated.append(('release', project, tag))
 
+    def invalidate_metadata(self, project: str) -> None:
+        self.invalidated.append(('metadata', project))
 
 
 class TestBase(unittest.TestCase):
@@ -97,6 +163,8 @@ class TestBase(unittest.TestCase):
         self.app.testing = True  # propagate exceptions
         self.database = FakeDatabase()
         self._patch_object(api, '_database', return_value=self.database)
+        api._validators.clear()
+        api._bodies.clear()
         self.client = self.app.test_client()
         self.client.__enter__()
 
@@ -12,17 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-
 import flask
 
 from wrapweb import api
+from wrapweb import fragmentcache
+from wrapweb import queries
 
 BP = flask.Blueprint('ui', __name__)
+_fragments = fragmentcache.FragmentCache()
+
+
+def fragment_stats() -> fragmentcache.FragmentStats:
+    """Returns hits and misses of rendered pages of this process."""
+    return _fragments.stats()
 
 
-def response_to_json(resp):
-    return json.loads(resp.get_data().decode('utf-8'))
+def _render(template: str, *args, context) -> str:
+    """Renders template unless rendered at the current data version."""
+    return _fragments.render(template, args,
+                             lambda: api._database().data_version(), context)
 
 
 @BP.route('/', methods=['GET'])
@@ -32,19 +40,17 @@ def index():
 
 @BP.route('/async/projects', methods=['GET'])
 def async_projects():
-    j = response_to_json(api.get_projectlist())
-    return flask.render_template(
-        'async_projects.html',
-        projects=j['projects'])
+    def context():
+        return dict(projects=queries.project_names(api._database()))
+    return _render('async_projects.html', context=context)
 
 
 @BP.route('/<project>', methods=['GET'])
 def project_info(project):
-    j = response_to_json(api.get_project_info(project))
-    return flask.render_template(
-        'project.html',
-        project=project,
-        resp=j)
+    def context():
+        return dict(project=project,
+                    info=queries.project(api._database(), project))
+    return _render('project.html', project, context=context)
 
 
 @BP.route('/tickets', methods=['GET'])
@@ -54,10 +60,9 @@ def tickets():
 
 @BP.route('/async/tickets', methods=['GET'])
 def async_tickets():
-    tickets = api._database().get_tickets()
-    return flask.render_template(
-        'async_tickets.html',
-        tickets=tickets)
+    def context():
+        return dict(tickets=api._database().get_tickets())
+    return _render('async_tickets.html', context=context)
 
 
 # This is called when user opens get_wrap handler and CSS override is not